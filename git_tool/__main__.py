@@ -2,27 +2,60 @@ import typer
 
 from git_tool.ci.subcommands.feature_add import feature_add_by_add
 from git_tool.ci.subcommands.feature_add_from_staged import features_from_staging_area
+from git_tool.ci.subcommands.feature_backfill import feature_backfill
 from git_tool.ci.subcommands.feature_blame import feature_blame
 from git_tool.ci.subcommands.feature_commit import feature_commit
 from git_tool.ci.subcommands.feature_commit_msg import feature_commit_msg
+from git_tool.ci.subcommands.feature_compact import feature_compact
 from git_tool.ci.subcommands.feature_commits import app as feature_commits
+from git_tool.ci.subcommands.feature_dedupe import feature_dedupe
+from git_tool.ci.subcommands.feature_export import feature_export
+from git_tool.ci.subcommands.feature_impact import feature_impact
 from git_tool.ci.subcommands.feature_info import inspect_feature
 from git_tool.ci.subcommands.feature_info_all import all_feature_info
+from git_tool.ci.subcommands.feature_log import feature_log
+from git_tool.ci.subcommands.feature_maintenance import feature_maintenance
+from git_tool.ci.subcommands.feature_metadata_diff import feature_metadata_diff
+from git_tool.ci.subcommands.feature_multi import feature_multi
 from git_tool.ci.subcommands.feature_pre_commit import feature_pre_commit
+from git_tool.ci.subcommands.feature_push import feature_push
+from git_tool.ci.subcommands.feature_query import feature_query
+from git_tool.ci.subcommands.feature_stats import app as feature_stats
 from git_tool.ci.subcommands.feature_status import feature_status
 
 
 app = typer.Typer(name="feature", no_args_is_help=True)   # "git feature --help" does not work, but "git-feature --help" does
 app.command(name="add", help="Stage files and associate them with the provided features.")(feature_add_by_add)
 app.command(name="add-from-staged", help="Associate staged files with features.")(features_from_staging_area)
+app.command(
+    name="backfill",
+    help="Create facts for existing commits from their feature annotations.",
+    context_settings={"ignore_unknown_options": True},
+)(feature_backfill)
 app.command(name="blame", help="Display features associated with file lines.")(feature_blame)
 app.command(name="commit", help="Associate an existing commit with one or more features.")(feature_commit)
 app.command(name="commit-msg", help="Generate feature information for the commit message.")(feature_commit_msg)
+app.command(name="compact", help="Collapse old metadata commits into periodic snapshots.")(feature_compact)
 app.add_typer(feature_commits, name="commits", help="Use with the subcommand 'list' or 'missing' to show commits with or without associated features.")
+app.command(name="dedupe", help="Remove duplicate facts from the metadata branch.")(feature_dedupe)
+app.command(name="export", help="Export all facts into a Parquet, Arrow, CSV or JSONL file.")(feature_export)
+app.command(name="impact", help="Show the features affected by the changes of a revision range.")(feature_impact)
 app.command(name="info", help="Show information of a specific feature.")(inspect_feature)
 app.command(name="info-all", help="List all available features in the project.")(all_feature_info)
+app.command(
+    name="log",
+    help="Show the git log of all commits associated with a feature.",
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+)(feature_log)
+app.command(name="maintenance", help="Repack the metadata branch and rebuild the indexes for fast reads.")(feature_maintenance)
+app.command(name="metadata-diff", help="Show facts added or removed between two metadata revisions.")(feature_metadata_diff)
+app.command(name="multi", help="Run a query in several repositories and merge the results.")(feature_multi)
 app.command(name="pre-commit", help="Check if all staged changes are properly associated with features.")(feature_pre_commit)
+app.command(name="push", help="Push queued feature information to the remote.")(feature_push)
+app.command(name="query", help="Answer JSON lines queries, with --batch many over one session.")(feature_query)
+app.add_typer(feature_stats, name="stats", help="Use with the subcommand 'cochange' to show statistics about features across commits.")
 app.command(name="status", help="Display unstaged and staged changes with associated features.")(feature_status)
 
 
-app()
+if __name__ == "__main__":
+    app()
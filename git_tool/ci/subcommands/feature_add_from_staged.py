@@ -2,6 +2,7 @@ import typer
 
 from git_tool.feature_data.git_status_per_feature import (
     get_features_for_file,
+    get_features_for_staged_hunks,
     get_files_by_git_change,
 )
 from git_tool.feature_data.models_and_context.feature_state import (
@@ -38,8 +39,24 @@ def read_features_from_staged(type: str = "Union") -> list[str]:
     """
     typer.echo("Using staged files")
 
+    feature_sets = []
+    files_with_hunks = set()
+    for hunk, features in get_features_for_staged_hunks():
+        files_with_hunks.add(hunk.path)
+        end_line = hunk.new_start + max(hunk.new_count, 1) - 1
+        typer.echo(
+            f"{hunk.path}:{hunk.new_start}-{end_line}: "
+            f"{', '.join(features) or '-'}"
+        )
+        feature_sets.append(set(features))
+    # files without line changes, e.g. binary files, are still looked up per
+    # file
     staged_files = get_files_by_git_change().get("staged_files", [])
-    feature_sets = [set(get_features_for_file(f)) for f in staged_files]
+    feature_sets += [
+        set(get_features_for_file(f))
+        for f in staged_files
+        if f not in files_with_hunks
+    ]
 
     if not feature_sets:
         return []
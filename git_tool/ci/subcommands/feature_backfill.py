@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import List
+
+import typer
+
+from git_tool.feature_data.add_feature_data.backfill import (
+    BACKFILL_CHUNK_SIZE,
+    BackfillProgress,
+    backfill_facts,
+)
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    MetadataWriteConflictException,
+)
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.utils.fast_import_utils import FastImportException
+
+app = typer.Typer()
+
+
+def _report(progress: BackfillProgress):
+    typer.echo(
+        f"{progress.analysed}/{progress.total} commits, "
+        f"{progress.facts} facts, {progress.commits_per_second:.1f} commits/s",
+        err=True,
+    )
+
+
+@app.command(name="backfill")
+def feature_backfill(
+    revisions: List[str] = typer.Argument(
+        ..., help="Commit range as git log takes it, e.g. v1.0..main or --all."
+    ),
+    jobs: int = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Worker processes. Defaults to the number of CPUs.",
+    ),
+    chunk_size: int = typer.Option(
+        BACKFILL_CHUNK_SIZE,
+        help="Commits per worker task and per metadata commit.",
+    ),
+    checkpoint: Path = typer.Option(
+        None,
+        help="File of the analysed commits. "
+        "Defaults to one per range in the tool state.",
+    ),
+):
+    """
+    Create facts for existing commits from the feature annotations they added or
+    changed. Commits that already have facts are skipped, an interrupted run
+    continues where it stopped.
+    """
+    try:
+        with repo_context() as repo:
+            result = backfill_facts(
+                repo,
+                revisions,
+                jobs=jobs,
+                chunk_size=chunk_size,
+                checkpoint=checkpoint,
+                progress=_report,
+            )
+    except (FastImportException, MetadataWriteConflictException) as e:
+        typer.echo(
+            f"Backfill stopped: {e}. Run it again to continue.", err=True
+        )
+        raise typer.Exit(code=1)
+    typer.echo(
+        f"Analysed {result.analysed} commits in {result.elapsed:.1f}s, "
+        f"wrote facts for {result.facts}, "
+        f"skipped {result.skipped} with facts or from an earlier run."
+    )
+
+
+if __name__ == "__main__":
+    app()
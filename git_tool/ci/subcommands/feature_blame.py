@@ -1,9 +1,15 @@
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
 import typer
 from git import Repo
-from git_tool.feature_data.read_feature_data.parse_data import get_features_touched_by_commit
+from git_tool.feature_data.analyze_feature_data.line_attribution import (
+    CommitInfo,
+    FileAttribution,
+    get_features_for_commits,
+    get_file_attribution,
+)
 from git_tool.feature_data.models_and_context.repo_context import (
     repo_context,
 )
@@ -19,66 +25,83 @@ def read_file_lines(file_path: Path) -> list[str]:
         return f.readlines()
 
 
+def _format_date(info: CommitInfo) -> str:
+    sign = -1 if info.author_tz.startswith("-") else 1
+    offset = timedelta(
+        hours=int(info.author_tz[1:3]), minutes=int(info.author_tz[3:5])
+    )
+    return datetime.fromtimestamp(
+        info.author_time, tz=timezone(sign * offset)
+    ).strftime("%Y-%m-%d")
+
+
 def get_line_to_blame_mapping(
-    repo: Repo, file_path: Path, start_line: int, end_line: int
+    attribution: FileAttribution,
+    lines: list[str],
+    start_line: int,
+    end_line: int,
 ) -> dict[int, tuple[str, str]]:
     """
     Returns a mapping of line numbers to (commit hash, blame line).
     """
-    blame_output = repo.git.blame(
-        "-L", f"{start_line},{end_line}", "--date=short", str(file_path)
-    )
-
     line_to_blame = {}
-    line_number = start_line
-
-    for line in blame_output.splitlines():
-        if line.startswith(":"):
-            continue
-        blame_part = line.split(" ", 1)
-        short_hash = blame_part[0]
-        blame_text = blame_part[1] if len(blame_part) > 1 else ""
-        full_hash = repo.git.rev_parse(short_hash)
-        line_to_blame[line_number] = (short_hash, blame_text)
-        line_number += 1
-
+    for line_number in range(start_line, end_line + 1):
+        commit = attribution.lines[line_number - 1].commit
+        info = attribution.commits[commit]
+        content = lines[line_number - 1].rstrip("\n")
+        line_to_blame[line_number] = (
+            commit,
+            f"({info.author} {_format_date(info)} {line_number}) {content}",
+        )
     return line_to_blame
 
 
-def get_commit_to_features_mapping(line_to_commit: dict[int, tuple[str, str]]) -> dict[str, str]:
+def get_commit_to_features_mapping(
+    repo: Repo, line_to_commit: dict[int, tuple[str, str]]
+) -> dict[str, str]:
     """
     Returns a mapping of commit hashes to features.
     """
     unique_commits = {commit for commit, _ in line_to_commit.values()}
 
     commit_to_features = {
-        commit_id: ", ".join(get_features_touched_by_commit(commit_id))
-        for commit_id in unique_commits
+        commit_id: ", ".join(features)
+        for commit_id, features in get_features_for_commits(
+            repo, unique_commits
+        ).items()
+        if features
     }
 
     return commit_to_features
 
 
 def get_line_to_features_mapping(
-    repo: Repo, file_path: Path, start_line: int, end_line: int
+    repo: Repo,
+    file_path: Path,
+    lines: list[str],
+    start_line: int,
+    end_line: int,
 ) -> tuple[dict[int, Any], dict[int, tuple[str, str]]]:
     """
     Returns a mapping of line numbers to features.
     """
-    # Get the commit for each line using 'git blame'
-    line_to_blame = get_line_to_blame_mapping(repo, file_path, start_line, end_line)
-    # for debugging: print("Step 1: ", line_to_blame)
+    # Get the commit for each line, reusing the cached attribution of unchanged
+    # lines
+    attribution = get_file_attribution(
+        repo, file_path.resolve().relative_to(repo.working_dir).as_posix()
+    )
+    line_to_blame = get_line_to_blame_mapping(
+        attribution, lines, start_line, end_line
+    )
 
     # Get the features for each commit
-    commit_to_features = get_commit_to_features_mapping(line_to_blame)
-    # for debugging: print("Step 2: ", commit_to_features)
+    commit_to_features = get_commit_to_features_mapping(repo, line_to_blame)
 
     # Map each line to its corresponding feature
     line_to_features = {
         line: commit_to_features.get(commit_hash, "UNKNOWN")
         for line, (commit_hash, _) in line_to_blame.items()
     }
-    # for debugging: print("Step 3: ", line_to_features)
 
     return line_to_features, line_to_blame
 
@@ -104,7 +127,7 @@ def print_feature_blame_output(
         commit_hash, blame_text = line_to_blame.get(i)
         blame_text = blame_text.replace("(", "", 1)
         feature = line_to_features.get(i, "UNKNOWN")
-        typer.echo(f"{feature:<15} ({commit_hash} {blame_text}")
+        typer.echo(f"{feature:<15} ({commit_hash[:8]} {blame_text}")
 
 
 @app.command(help="Display features associated with file lines.", no_args_is_help=True, name=None)
@@ -151,7 +174,7 @@ def feature_blame(
 
     with repo_context() as repo:  # Use repo_context for the git operations
         feature_to_line_mapping = get_line_to_features_mapping(
-            repo, file_path, start_line, end_line
+            repo, file_path, lines, start_line, end_line
         )
 
     print_feature_blame_output(
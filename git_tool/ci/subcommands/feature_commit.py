@@ -4,6 +4,10 @@ import typer
 from git_tool.feature_data.add_feature_data.add_data import (
     add_fact_to_metadata_branch,
 )
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    MetadataWriteConflictException,
+    MetadataWriteFailedException,
+)
 from git_tool.feature_data.models_and_context.fact_model import (
     ChangeHolder,
     FeatureFactModel,
@@ -12,8 +16,16 @@ from git_tool.feature_data.models_and_context.feature_state import (
     read_staged_featureset,
     reset_staged_featureset,
 )
-from git_tool.feature_data.models_and_context.repo_context import repo_context, sync_feature_branch
-
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    repo_context,
+)
+from git_tool.feature_data.sync_feature_data.outbox import (
+    flush_outbox_in_background,
+    is_outbox_due,
+    queue_fact_for_push,
+)
+from git_tool.feature_data.utils.object_names import get_resolver
 
 app = typer.Typer(
     help="Associate an existing commit with one or more features",
@@ -36,7 +48,11 @@ def feature_commit(
         help="Manually specify feature names. Each feature-name needs to be prefixed with --features <name>\
             If this option is provided, staged feature information will be ignored.",
     ),
-    upload: bool = typer.Option(True, help="Set whether feature information are also directly uploaded to remote.")
+    upload: bool = typer.Option(
+        True,
+        help="Set whether feature information are queued for upload to remote. \
+        Queued information is pushed in batches, see git feature push.",
+    ),
 ):
     """
     Associate feature information with a regular git commit.
@@ -48,11 +64,12 @@ def feature_commit(
     # typer.echo("Step 2: Select feature information")
     # test commit
     with repo_context() as repo:
-        try:
-            commit_obj = repo.commit(commit_id)
-        except:
+        # facts are always stored under the full id, whatever name was given
+        resolved_id = get_resolver(repo).resolve_commit(commit_id)
+        if resolved_id is None:
             typer.echo("Invalid commit.", err=True)
             return
+        commit_obj = repo.commit(resolved_id)
     if not features:
         staged_features = read_staged_featureset()
         typer.echo(f"Selecting features {staged_features}")
@@ -65,7 +82,7 @@ def feature_commit(
     # typer.echo("Step 3: Add a feature meta commit on meta data branch")
     with repo_context() as repo:
         feature_fact = FeatureFactModel(
-            commit=commit_id,
+            commit=resolved_id,
             authors=[commit_obj.author.name],
             date=datetime.now(),
             features=staged_features,
@@ -74,15 +91,35 @@ def feature_commit(
             ),
         )
         # Add the fact to the metadata branch
-        add_fact_to_metadata_branch(fact=feature_fact, commit_ref=commit_obj)
-        typer.echo(f"Features {features} assigned to {commit_id}")
-        
-        if upload:
-            sync_feature_branch()
+        try:
+            written = add_fact_to_metadata_branch(
+                fact=feature_fact, commit_ref=commit_obj
+            )
+        except (
+            MetadataWriteConflictException,
+            MetadataWriteFailedException,
+        ) as e:
+            typer.echo(f"Error: {e}", err=True)
+            raise typer.Exit(code=1)
+        if written is None:
+            typer.echo(
+                f"No new feature information written for {commit_id}", err=True
+            )
+        else:
+            typer.echo(f"Features {features} assigned to {commit_id}")
+
+        if upload and written is not None:
+            queue_fact_for_push(
+                repo,
+                get_resolver(repo).resolve_commit(
+                    f"refs/heads/{FEATURE_BRANCH_NAME}"
+                ),
+            )
+            if is_outbox_due(repo):
+                flush_outbox_in_background(repo)
     # typer.echo("Step 4: Cleanup all information/ internal state stuff")
     reset_staged_featureset()
-        
-    
+
     # typer.echo("Feature commit process completed successfully.")
 
 
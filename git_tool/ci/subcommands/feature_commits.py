@@ -8,6 +8,7 @@ from git_tool.feature_data.models_and_context.repo_context import (
     get_commit_title,
     repo_context,
 )
+from git_tool.feature_data.utils.object_names import get_resolver
 
 app = typer.Typer(
     no_args_is_help=True, help="Manage commits with feature associations."
@@ -32,16 +33,15 @@ def find_commits_with_feature(
 
     typer.echo("Commits with feature association:")
     with repo_context() as repo:
+        resolved = get_resolver(repo).resolve_commits(feature_commits)
         for commit in feature_commits:
-            try:
-                commit_obj = repo.commit(commit)
-            except:
+            if commit not in resolved:
                 typer.echo(f"Could not work with {commit}", err=True)
                 continue
             if message:
-                typer.echo(f"{commit_obj.hexsha}: {get_commit_title(commit)}")
+                typer.echo(f"{resolved[commit]}: {get_commit_title(commit)}")
             else:
-                typer.echo(commit_obj.hexsha)  # Output the full commit hash
+                typer.echo(resolved[commit])  # Output the full commit hash
 
 
 @app.command(name="missing")
@@ -73,15 +73,13 @@ def find_commits_without_feature(
 
     typer.echo("Commits without feature association:")
     with repo_context() as repo:
+        resolved = get_resolver(repo).resolve_commits(commits_without_feature)
         for commit in commits_without_feature:
-            try:
-                commit_obj = repo.commit(commit)
-            except:
-                commit_obj = {"hexsha": "ERROR"}
+            commit_id = resolved.get(commit, "ERROR")
             if message:
-                typer.echo(f"{commit_obj.hexsha}: {get_commit_title(commit)}")
+                typer.echo(f"{commit_id}: {get_commit_title(commit)}")
             else:
-                typer.echo(commit_obj.hexsha)  # Output the full commit hash
+                typer.echo(commit_id)  # Output the full commit hash
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import typer
+
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.sync_feature_data.compaction import (
+    PERIOD_FORMATS,
+    compact_metadata_branch,
+)
+from git_tool.feature_data.sync_feature_data.outbox import (
+    OutboxLockedException,
+    PushRejectedException,
+)
+
+app = typer.Typer()
+
+
+@app.command(
+    name="compact",
+    help="Collapse old metadata commits into periodic snapshots.",
+)
+def feature_compact(
+    keep_recent: int = typer.Option(
+        100,
+        help="Number of most recent metadata commits that are kept unchanged.",
+    ),
+    period: str = typer.Option(
+        "month",
+        help=(
+            "Time span collapsed into one snapshot, one of "
+            f"{', '.join(PERIOD_FORMATS)}."
+        ),
+    ),
+):
+    """
+    Rewrite the history of the metadata branch into one snapshot commit per
+    period. The content of the branch stays identical. The compacted branch is
+    pushed to origin right away, other clones pick it up the next time they push
+    feature information.
+    """
+    if period not in PERIOD_FORMATS:
+        typer.echo(
+            f"Unknown period {period}. Use one of {', '.join(PERIOD_FORMATS)}.",
+            err=True,
+        )
+        raise typer.Exit(code=1)
+    with repo_context() as repo:
+        try:
+            result = compact_metadata_branch(
+                repo, keep_recent=keep_recent, period=period
+            )
+        except OutboxLockedException:
+            typer.echo(
+                "Another push or compaction is running. Try again later.",
+                err=True,
+            )
+            raise typer.Exit(code=1)
+        except PushRejectedException as e:
+            typer.echo(f"Compaction aborted: {e}", err=True)
+            raise typer.Exit(code=1)
+    if result.commits_before == result.commits_after:
+        typer.echo(f"Nothing to compact ({result.commits_before} commits).")
+    else:
+        typer.echo(
+            f"Compacted {result.commits_before} commits into "
+            f"{result.commits_after} commits."
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,40 @@
+import typer
+
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    MetadataWriteConflictException,
+)
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.sync_feature_data.dedupe import (
+    dedupe_metadata_branch,
+)
+
+app = typer.Typer()
+
+
+@app.command(name="dedupe")
+def feature_dedupe(
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only list the duplicate facts."
+    ),
+):
+    """
+    Remove facts that repeat an older fact for the same feature and commit. The
+    removal is pushed with the next git feature push.
+    """
+    with repo_context() as repo:
+        try:
+            result = dedupe_metadata_branch(repo, dry_run=dry_run)
+        except MetadataWriteConflictException as e:
+            typer.echo(f"Dedupe aborted: {e}. Try again.", err=True)
+            raise typer.Exit(code=1)
+    if dry_run:
+        for path in result.duplicates:
+            typer.echo(path)
+    typer.echo(
+        f"{len(result.duplicates)} of {result.facts} facts are duplicates"
+        + ("." if dry_run or not result.duplicates else ", removed them.")
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import typer
+
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.read_feature_data.export_data import (
+    EXPORT_BATCH_SIZE,
+    EXPORT_FORMATS,
+    ExportDependencyMissingException,
+    export_facts,
+    infer_export_format,
+)
+
+app = typer.Typer()
+
+
+@app.command(name="export")
+def feature_export(
+    output: Path = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help=(
+            "File to write. Defaults to feature-facts with the extension "
+            "of the format."
+        ),
+    ),
+    export_format: str = typer.Option(
+        None,
+        "--format",
+        help=(
+            f"One of {', '.join(EXPORT_FORMATS)}. Defaults to the format "
+            "of the --output extension, else to parquet if pyarrow is "
+            "installed, csv otherwise."
+        ),
+    ),
+    batch_size: int = typer.Option(
+        EXPORT_BATCH_SIZE,
+        help="Facts read and written at once, i.e. rows per row group.",
+    ),
+):
+    """
+    Export all facts of the metadata branch into one table for offline
+    analytics.
+    """
+    try:
+        export_format = infer_export_format(output, export_format)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    output = output or Path(f"feature-facts{EXPORT_FORMATS[export_format]}")
+    try:
+        with repo_context() as repo:
+            result = export_facts(repo, output, export_format, batch_size)
+    except ExportDependencyMissingException as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(f"Exported {result.rows} facts to {output}")
+    if result.skipped:
+        typer.echo(
+            f"Skipped {result.skipped} fact files that could not be parsed",
+            err=True,
+        )
+
+
+if __name__ == "__main__":
+    app()
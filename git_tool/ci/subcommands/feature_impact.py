@@ -0,0 +1,62 @@
+import json
+
+import typer
+from git import GitCommandError
+
+from git_tool.feature_data.analyze_feature_data.impact import (
+    get_impact,
+    impact_to_json,
+)
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+
+app = typer.Typer()
+
+
+@app.command(name="impact", no_args_is_help=True)
+def feature_impact(
+    revision_range: str = typer.Argument(
+        ...,
+        help="Changes to check, <base>..<head> or <base>...<head>. "
+        "A single revision is compared with HEAD.",
+    ),
+    as_json: bool = typer.Option(
+        False, "--json", help="Print the affected features as JSON."
+    ),
+    history: bool = typer.Option(
+        True,
+        help="Also report features of earlier commits that changed the files.",
+    ),
+):
+    """
+    Show the features affected by the changes of a revision range, with the
+    files and lines responsible.
+    """
+    with repo_context() as repo:
+        try:
+            impact = get_impact(repo, revision_range, use_history=history)
+        except GitCommandError:
+            typer.echo(
+                f"Error: {revision_range} is not a valid revision range.",
+                err=True,
+            )
+            raise typer.Exit(code=1)
+    if as_json:
+        typer.echo(json.dumps(impact_to_json(impact), indent=2))
+        return
+    if not impact:
+        typer.echo("No features affected.")
+        return
+    for entry in impact:
+        typer.echo(entry.feature)
+        for file in entry.files:
+            lines = ", ".join(
+                str(start) if start == end else f"{start}-{end}"
+                for start, end in file.lines
+            )
+            typer.echo(
+                f"    {file.path}" + (f": lines {lines}" if lines else "")
+            )
+
+
+if __name__ == "__main__":
+    app()
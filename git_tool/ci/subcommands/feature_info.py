@@ -6,7 +6,7 @@ from git_tool.feature_data.analyze_feature_data.feature_utils import (
 )
 from git_tool.feature_data.git_helper import (
     get_author_for_commit,
-    get_branches_for_commit,
+    get_branches_for_commits,
     get_files_for_commit,
 )
 from git_tool.feature_data.git_status_per_feature import get_commits_for_feature
@@ -51,20 +51,17 @@ def inspect_feature(
     ),
 ):
     typer.echo(f"Collecting information for feature {feature}")
-    try:
-        commit_ids = [x.hexsha for x in get_commits_for_feature(feature)]
+    commit_ids = get_commits_for_feature(feature)
+    if commit_ids:
         print_list_w_indent(commit_ids)
-    except Exception:
-        commit_ids = []
+    else:
         typer.echo(f"No commit-ids for feature {feature} found")
     if branches:
         typer.echo("Branches (* indicates current branch)")
         branches = set(
-            [
-                branch
-                for c in commit_ids
-                for branch in get_branches_for_commit(c)
-            ]
+            branch
+            for commit_branches in get_branches_for_commits(commit_ids).values()
+            for branch in commit_branches
         )
         print_list_w_indent(branches)
     if authors:
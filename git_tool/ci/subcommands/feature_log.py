@@ -0,0 +1,34 @@
+import typer
+
+from git_tool.feature_data.read_feature_data.parse_data import (
+    FeatureNotFoundException,
+    get_feature_log,
+)
+
+app = typer.Typer()
+
+
+@app.command(
+    name="log",
+    help="Show the git log of all commits associated with a feature.",
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+    no_args_is_help=True,
+)
+def feature_log(
+    ctx: typer.Context,
+    feature: str = typer.Argument(..., help="Feature whose commits are shown"),
+):
+    """
+    Show the commits of a feature like git log does. All further arguments are
+    passed to git log, e.g. revision ranges, --since, --author or -n.
+    """
+    try:
+        exit_code = get_feature_log(feature, ctx.args)
+    except FeatureNotFoundException:
+        typer.echo(f"No commit-ids for feature {feature} found", err=True)
+        raise typer.Exit(code=1)
+    raise typer.Exit(code=exit_code)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,63 @@
+import subprocess
+
+import typer
+from git import GitCommandError
+
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.sync_feature_data.maintenance import (
+    MaintenanceLockedException,
+    ReadLatency,
+    run_maintenance,
+)
+
+app = typer.Typer()
+
+
+def _format_latency(latency: ReadLatency) -> str:
+    return (
+        f"ls-tree {latency.ls_tree * 1000:.1f} ms, "
+        f"cat-file {latency.cat_file * 1000:.1f} ms "
+        f"for {latency.objects} objects"
+    )
+
+
+@app.command(name="maintenance")
+def feature_maintenance(
+    auto: bool = typer.Option(
+        False,
+        "--auto",
+        help="Only run if there are many packs or loose objects, for hooks.",
+    ),
+):
+    """
+    Repack the metadata branch into a dedicated pack with a multi-pack-index,
+    write the commit-graph with Bloom filters and rebuild the feature and path
+    indexes.
+    """
+    with repo_context() as repo:
+        try:
+            result = run_maintenance(repo, auto=auto)
+        except MaintenanceLockedException:
+            if auto:
+                return
+            typer.echo(
+                "Another maintenance is running. Try again later.", err=True
+            )
+            raise typer.Exit(code=1)
+        except (GitCommandError, subprocess.CalledProcessError) as e:
+            typer.echo(f"Maintenance failed: {e}", err=True)
+            raise typer.Exit(code=1)
+    if result is None:
+        typer.echo("Nothing to do.")
+        return
+    typer.echo(f"Packed {result.packed_objects} metadata objects.")
+    typer.echo(
+        f"Packs: {result.packs_before} -> {result.packs_after}, "
+        f"loose objects: {result.loose_before} -> {result.loose_after}"
+    )
+    typer.echo(f"Read latency before: {_format_latency(result.before)}")
+    typer.echo(f"Read latency after:  {_format_latency(result.after)}")
+
+
+if __name__ == "__main__":
+    app()
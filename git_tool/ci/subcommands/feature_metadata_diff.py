@@ -0,0 +1,67 @@
+import json
+
+import typer
+from git import GitCommandError
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    repo_context,
+)
+from git_tool.feature_data.read_feature_data.metadata_diff import (
+    read_metadata_diff,
+)
+
+app = typer.Typer()
+
+
+@app.command(name="metadata-diff", no_args_is_help=True)
+def feature_metadata_diff(
+    old: str = typer.Argument(
+        ...,
+        help=(
+            "Old revision of the metadata branch, e.g. "
+            "origin/feature-metadata"
+        ),
+    ),
+    new: str = typer.Argument(
+        FEATURE_BRANCH_NAME, help="New revision of the metadata branch."
+    ),
+    as_json: bool = typer.Option(
+        False, "--json", help="Print the changes as JSON."
+    ),
+):
+    """
+    Show the facts that were added or removed between two revisions of the
+    metadata branch.
+    """
+    with repo_context() as repo:
+        try:
+            diff = read_metadata_diff(repo, old, new)
+        except GitCommandError:
+            typer.echo(
+                f"Error: {old} or {new} is not a revision of the metadata "
+                "branch.",
+                err=True,
+            )
+            raise typer.Exit(code=1)
+    if as_json:
+        typer.echo(
+            json.dumps(
+                {
+                    "old": diff.old,
+                    "new": diff.new,
+                    "added": [fact._asdict() for fact in diff.added],
+                    "removed": [fact._asdict() for fact in diff.removed],
+                },
+                indent=2,
+            )
+        )
+        return
+    for fact in diff.removed:
+        typer.echo(f"- {fact.feature} {fact.commit} {fact.fact}")
+    for fact in diff.added:
+        typer.echo(f"+ {fact.feature} {fact.commit} {fact.fact}")
+
+
+if __name__ == "__main__":
+    app()
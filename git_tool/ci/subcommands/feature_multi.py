@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import typer
+
+from git_tool.feature_data.analyze_feature_data.multi_repo import (
+    QUERIES,
+    MultiRepositoryReport,
+    run_multi_repository_query,
+)
+
+app = typer.Typer()
+
+
+def print_report(report: MultiRepositoryReport) -> None:
+    for repository in report.repositories:
+        typer.echo(repository.repository)
+        if repository.error is not None:
+            typer.echo(f"\tError: {repository.error}")
+        elif report.query == "info-all":
+            for feature in repository.result:
+                typer.echo(f"\t{feature}")
+        elif report.query == "commits-missing":
+            typer.echo(
+                f"\t{len(repository.result)} commits without feature "
+                "association"
+            )
+        elif report.query == "cochange":
+            typer.echo(f"\t{len(repository.result)} feature pairs")
+    typer.echo("All repositories")
+    if report.query == "info-all":
+        for feature, repositories in sorted(report.merged.items()):
+            typer.echo(f"\t{feature} ({repositories} repositories)")
+    elif report.query == "commits-missing":
+        typer.echo(f"\t{report.merged} commits without feature association")
+    elif report.query == "cochange":
+        for feature_a, feature_b, count in report.merged:
+            typer.echo(f"\t{feature_a},{feature_b},{count}")
+
+
+@app.command(name="multi", no_args_is_help=True)
+def feature_multi(
+    query: str = typer.Argument(
+        ..., help=f"Query to run, one of {', '.join(QUERIES)}."
+    ),
+    repositories: list[str] = typer.Argument(
+        None, help="Paths of the repositories."
+    ),
+    repositories_file: Path = typer.Option(
+        None,
+        "--repositories-file",
+        "-r",
+        help="File with one repository path per line.",
+    ),
+    jobs: int = typer.Option(
+        None,
+        "--jobs",
+        "-j",
+        help="Number of worker processes. Defaults to the number of cores.",
+    ),
+    json: bool = typer.Option(
+        False, "--json", help="Print the report as JSON."
+    ),
+):
+    """
+    Run a query in several repositories in parallel and merge the results into
+    one report.
+    """
+    if query not in QUERIES:
+        typer.echo(
+            f"Unknown query {query}. Use one of {', '.join(QUERIES)}.", err=True
+        )
+        raise typer.Exit(code=1)
+    paths = list(repositories or [])
+    if repositories_file:
+        paths += [
+            line.strip()
+            for line in repositories_file.read_text(
+                encoding="utf-8"
+            ).splitlines()
+            if line.strip()
+        ]
+    if not paths:
+        typer.echo("No repositories given.", err=True)
+        raise typer.Exit(code=1)
+    report = run_multi_repository_query(paths, query, jobs=jobs)
+    if json:
+        typer.echo(report.model_dump_json(indent=2))
+    else:
+        print_report(report)
+    if any(repository.error for repository in report.repositories):
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -1,6 +1,6 @@
 import typer
 
-from git_tool.feature_data.git_status_per_feature import get_files_by_git_change
+from git_tool.feature_data.git_status_per_feature import has_staged_changes
 from git_tool.feature_data.models_and_context.feature_state import (
     read_staged_featureset,
 )
@@ -15,9 +15,7 @@ def feature_pre_commit():
     Checks if all staged changes are properly associated with features.
     Returns an error if any issues are found.
     """
-    changes = get_files_by_git_change()
-
-    if len(changes["staged_files"]) == 0:
+    if not has_staged_changes():
         typer.echo("Error: No staged changes found.")
         raise typer.Exit(code=1)
 
@@ -0,0 +1,47 @@
+import typer
+
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.sync_feature_data.outbox import (
+    OutboxLockedException,
+    PushRejectedException,
+    flush_outbox,
+    read_outbox,
+)
+
+app = typer.Typer()
+
+
+@app.command(name="push", help="Push queued feature information to the remote.")
+def feature_push(
+    quiet: bool = typer.Option(
+        False, "--quiet", "-q", help="Only report errors."
+    ),
+):
+    """
+    Push all facts from the outbox with one push. Usually this happens
+    automatically once the outbox is due, use this command to upload feature
+    information right away.
+    """
+    with repo_context() as repo:
+        if not read_outbox(repo):
+            if not quiet:
+                typer.echo("No queued feature information.")
+            return
+        try:
+            pushed = flush_outbox(repo)
+        except OutboxLockedException:
+            if not quiet:
+                typer.echo("Another push is already running.")
+            return
+        except PushRejectedException as e:
+            typer.echo(
+                f"Warning: Feature Updates could not be pushed to remote: {e}",
+                err=True,
+            )
+            raise typer.Exit(code=1)
+    if not quiet:
+        typer.echo(f"Pushed {pushed} queued feature facts.")
+
+
+if __name__ == "__main__":
+    app()
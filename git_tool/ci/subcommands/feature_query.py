@@ -0,0 +1,47 @@
+import sys
+
+import typer
+
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.read_feature_data.query_session import (
+    QuerySession,
+    serve_queries,
+)
+
+app = typer.Typer()
+
+
+def _write_line(line: str):
+    # flushed per answer, so scripts can use the session as a coprocess
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+@app.command(name="query")
+def feature_query(
+    request: str = typer.Argument(
+        None,
+        help="One JSON request, e.g. "
+        '\'{"type": "features-of-commit", "commit": "HEAD"}\'.',
+    ),
+    batch: bool = typer.Option(
+        False,
+        "--batch",
+        help="Read JSON lines requests from stdin and answer each on stdout.",
+    ),
+):
+    """
+    Answer machine-readable queries as JSON lines. Request types:
+    features-of-commit, commits-of-feature, features-of-path, name-to-uuid and
+    uuid-to-name.
+    """
+    if batch == (request is not None):
+        typer.echo("Pass either one request or --batch.", err=True)
+        raise typer.Exit(code=1)
+    with repo_context() as repo:
+        session = QuerySession(repo)
+        serve_queries(session, sys.stdin if batch else [request], _write_line)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+import typer
+
+from git_tool.feature_data.analyze_feature_data.cochange import (
+    AnalyticsDependencyMissingException,
+    get_cochange_matrix,
+    write_cochange_csv,
+    write_cochange_npz,
+)
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+
+app = typer.Typer(
+    no_args_is_help=True, help="Statistics about features across commits."
+)
+
+
+@app.command(name="cochange")
+def feature_stats_cochange(
+    revision_range: str = typer.Argument(
+        None,
+        help=(
+            "Only count commits in this range, e.g. main..HEAD. Defaults "
+            "to all commits with feature information."
+        ),
+    ),
+    output: Path = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="File to write to. CSV is written to stdout if omitted.",
+    ),
+    output_format: str = typer.Option(
+        "csv", "--format", help="Output format, 'csv' or 'npz'."
+    ),
+    cache: bool = typer.Option(
+        True, help="Reuse and update the cached matrix of this repository."
+    ),
+):
+    """
+    Count for each pair of features how many commits touched both of them.
+    The diagonal holds the number of commits per feature.
+    """
+    if output_format not in ("csv", "npz"):
+        typer.echo("Unknown format. Use 'csv' or 'npz'.", err=True)
+        raise typer.Exit(code=1)
+    if output_format == "npz" and output is None:
+        typer.echo("NPZ output needs --output.", err=True)
+        raise typer.Exit(code=1)
+    try:
+        with repo_context() as repo:
+            matrix = get_cochange_matrix(repo, use_cache=cache)
+            if revision_range:
+                cochange = matrix.restrict_to_range(repo, revision_range)
+            else:
+                cochange = matrix.cochange
+    except AnalyticsDependencyMissingException as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+
+    if output_format == "npz":
+        write_cochange_npz(matrix.features, cochange, output)
+    elif output is None:
+        write_cochange_csv(matrix.features, cochange, sys.stdout)
+    else:
+        with output.open(mode="w", encoding="utf-8", newline="") as f:
+            write_cochange_csv(matrix.features, cochange, f)
+
+
+if __name__ == "__main__":
+    app()
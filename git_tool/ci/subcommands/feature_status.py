@@ -1,4 +1,6 @@
 from collections import defaultdict
+from pathlib import Path
+
 import typer
 
 from git_tool.feature_data.git_status_per_feature import (
@@ -8,6 +10,8 @@ from git_tool.feature_data.git_status_per_feature import (
 from git_tool.feature_data.models_and_context.feature_state import (
     read_staged_featureset,
 )
+from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.status_watch import watch_status
 
 WITHOUT_FEATURE = "Without Feature"
 
@@ -23,7 +27,25 @@ app = typer.Typer(
 def feature_status(
     help: bool = typer.Option(
         None, "--help", "-h", is_eager=True, help="Show this message and exit."
-    )
+    ),
+    watch: bool = typer.Option(
+        False,
+        "--watch",
+        help="Keep running and print every status change as a JSON line.",
+    ),
+    socket: Path = typer.Option(
+        None,
+        "--socket",
+        help="With --watch, also serve the JSON lines on this unix socket.",
+    ),
+    poll: bool = typer.Option(
+        False,
+        "--poll",
+        help="With --watch, poll git status instead of using inotify.",
+    ),
+    interval: float = typer.Option(
+        2.0, "--interval", help="With --watch, seconds between two polls."
+    ),
 ):
     """
     Displays the current status of files in the working directory, showing staged, unstaged, and untracked changes along with their associated features.
@@ -33,6 +55,20 @@ def feature_status(
         typer.echo(app.rich_help_panel)
         raise typer.Exit()
 
+    if watch:
+        try:
+            with repo_context() as repo:
+                watch_status(
+                    repo,
+                    get_features_for_file,
+                    typer.echo,
+                    socket_path=socket,
+                    poll_interval=interval,
+                    use_inotify=not poll,
+                )
+        except KeyboardInterrupt:
+            raise typer.Exit()
+
     changes = get_files_by_git_change()
 
     def group_files_by_feature(files: list[str]):
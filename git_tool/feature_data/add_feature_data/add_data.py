@@ -4,16 +4,23 @@ needed to add a FeatureFact to the respective metadata branch.
 """
 
 import hashlib
-import os
-import tempfile
+import json
 from pathlib import Path
+from typing import Iterable, Optional
 
+import git
 from git import Commit
 
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    write_fact_commits,
+)
 from git_tool.feature_data.analyze_feature_data.feature_utils import (
     get_uuid_for_featurename,
 )
 from git_tool.feature_data.models_and_context.fact_model import FeatureFactModel
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
 from git_tool.feature_data.models_and_context.repo_context import (
     FEATURE_BRANCH_NAME,
     repo_context,
@@ -21,32 +28,61 @@ from git_tool.feature_data.models_and_context.repo_context import (
 from git_tool.feature_data.utils.fast_import_utils import (
     AccumulatedCommitData,
     FastImportCommitData,
-    to_fast_import_format,
 )
+from git_tool.feature_data.utils.git_streams import iter_tree_names
+
+FACT_HASH_LENGTH = 7
 
 
-def generate_fact_file_path(fact: FeatureFactModel) -> list[Path]:
+def fact_content_hash(fact: FeatureFactModel) -> str:
+    """
+    SHA-1 of the canonical JSON of a fact without its date. Facts that say the
+    same about a commit get the same hash, no matter when they were written or
+    in which order their lists are.
+    """
+    content = fact.model_dump(mode="json", exclude={"date"})
+    content["authors"] = sorted(content["authors"])
+    content["features"] = sorted(content["features"])
+    for changes in ("code_changes", "constraint_changes"):
+        content["changes"][changes] = sorted(
+            content["changes"][changes],
+            key=lambda change: json.dumps(change, sort_keys=True),
+        )
+    canonical = json.dumps(
+        content, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def generate_fact_file_path(
+    fact: FeatureFactModel, feature_uuids: Optional[list[str]] = None
+) -> list[Path]:
     """
     The fact file is stored in the folder <feature-uuid>/<commit-hash>/<fact-filename>
     Each of these information is computed in this function
 
     Args:
         fact (FeatureFactModel): Information used to derive path
+        feature_uuids (Optional[list[str]]): Already known uuids of
+            fact.features, in that order
 
     Returns:
         list[str]: All paths where the associated fact needs to be stored
     """
-    feature_uuids = [
-        get_uuid_for_featurename(feature) for feature in fact.features
-    ]
-    fact_json = fact.model_dump_json()
-    sha1_hash = hashlib.sha1(fact_json.encode("utf-8")).hexdigest()
+    if feature_uuids is None:
+        feature_uuids = [
+            get_uuid_for_featurename(feature) for feature in fact.features
+        ]
+    # the same fact written again gets the same file name suffix, see
+    # find_recorded_facts
+    content_hash = fact_content_hash(fact)
 
     paths = [
         Path(uuid)
         .joinpath(Path(fact.commit))
         .joinpath(
-            f'{fact.date.isoformat(timespec="minutes").replace(":", "-")}-{sha1_hash[:7]}'
+            f'{fact.date.isoformat(timespec="minutes").replace(":", "-")}'
+            f"-{content_hash[:FACT_HASH_LENGTH]}"
         )
         .as_posix()
         for uuid in feature_uuids
@@ -54,6 +90,44 @@ def generate_fact_file_path(fact: FeatureFactModel) -> list[Path]:
     return paths
 
 
+def find_recorded_facts(
+    repo: git.Repo, paths: Iterable[str], branch_name: str = FEATURE_BRANCH_NAME
+) -> set[str]:
+    """
+    Fact files whose fact is already on the branch: a file with the same content
+    hash exists in the same <feature>/<commit> folder. The feature index rules
+    out most paths without reading the branch.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        paths (Iterable[str]): Paths from generate_fact_file_path
+        branch_name (str): Metadata branch
+
+    Returns:
+        set[str]: The given paths that need not be written
+    """
+    index = get_feature_index(repo, branch_name)
+    by_folder: dict[str, list[str]] = {}
+    for path in paths:
+        feature, commit, _ = str(path).rsplit("/", 2)
+        if index.has_feature(commit, feature):
+            by_folder.setdefault(f"{feature}/{commit}/", []).append(str(path))
+    if not by_folder:
+        return set()
+    recorded_hashes = {
+        name.rpartition("/")[0] + "/" + name.rpartition("-")[2]
+        for name in iter_tree_names(
+            repo, f"refs/heads/{branch_name}", paths=by_folder
+        )
+    }
+    return {
+        path
+        for folder, folder_paths in by_folder.items()
+        for path in folder_paths
+        if folder + path.rpartition("-")[2] in recorded_hashes
+    }
+
+
 def generate_fact_commit_data(
     fact: FeatureFactModel,
     branch_name: str = FEATURE_BRANCH_NAME,
@@ -81,30 +155,36 @@ def add_fact_to_metadata_branch(
     fact: FeatureFactModel,
     branch_name: str = FEATURE_BRANCH_NAME,
     commit_ref: Commit = None,
-):
+) -> Optional[AccumulatedCommitData]:
     """
-    Create a new commit by creating a temporary file using the fast-import format.
-    The commit data is derived from the fact information.
+    Create a new commit on the metadata branch using the fast-import format.
+    The commit data is derived from the fact information. Concurrent writers
+    are serialized, see metadata_writer. Fact files that are already recorded
+    are left out, nothing is written if the whole fact is.
     :param fact Structured information used to generate the commit content
-    :param branch-name reference for git which is used to determine the branch that a commit is added to
-    :param commit_ref Optional parameter that can include more informatino for the commit content, specifying which commit the metadata describes
-
+    :param branch-name reference for git which is used to determine the branch
+        that a commit is added to
+    :param commit_ref Optional parameter that can include more informatino for
+        the commit content, specifying which commit the metadata describes
+    :return The written commit data, None if nothing was written because the
+        fact is recorded already
+    :raises MetadataWriteConflictException: the branch kept moving while the
+        fact was written
+    :raises MetadataWriteFailedException: git fast-import rejected the fact
     """
     commit_data = generate_fact_commit_data(fact, branch_name, commit_ref)
-    fast_import_content = to_fast_import_format(commits=[commit_data])
-    try:
-        with tempfile.NamedTemporaryFile(
-            delete=False, mode="w", encoding="utf-8", newline="\n"
-        ) as temp_file:
-            temp_file.write(fast_import_content)
-            temp_file_path = temp_file.name
-
-        with repo_context() as repo:
-            with open(temp_file_path, "r") as file:
-                repo.git.fast_import(istream=file)
-    except Exception as e:
-        print("error\n", e)
-    finally:
-        if temp_file_path:
-            os.remove(temp_file_path)
+    with repo_context() as repo:
+        recorded = find_recorded_facts(
+            repo,
+            [str(file.file_path) for file in commit_data.add_files],
+            branch_name,
+        )
+        commit_data.add_files = [
+            file
+            for file in commit_data.add_files
+            if str(file.file_path) not in recorded
+        ]
+        if not commit_data.add_files:
+            return None
+        write_fact_commits(repo, [commit_data])
     return commit_data
@@ -0,0 +1,454 @@
+"""
+Backfill of facts for commits that were made before the tool was adopted.
+
+The commits of a range are split into chunks that worker processes analyse in
+parallel. A worker reads the patches of its chunk with one git log -p -U0 run
+and the changed files through one cat-file process, and intersects the changed
+lines with the &begin[]/&end[] annotations of the new file versions. The facts
+of every chunk stream into one fast-import process as one metadata commit. From
+time to time the written chain is published: under the metadata write lock the
+facts others wrote meanwhile are merged in and the branch is moved with a
+compare-and-swap update-ref. Published commits are appended to a checkpoint
+file, so an interrupted backfill continues where it stopped. Commits that
+already have facts are skipped.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import git
+
+from git_tool.feature_data.add_feature_data.add_data import (
+    generate_fact_file_path,
+)
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    MetadataWriteConflictException,
+    _branch_tip,
+    drain_write_queue,
+    metadata_write_lock,
+)
+from git_tool.feature_data.analyze_feature_data.line_attribution import (
+    PATCH_PREFIX_ARGS,
+    iter_patch_files,
+    parse_hunk_headers,
+)
+from git_tool.feature_data.git_status_per_feature import _affected_lines
+from git_tool.feature_data.models_and_context.fact_model import (
+    ChangeDetail,
+    ChangeHolder,
+    ChangeType,
+    FeatureFactModel,
+)
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.sync_feature_data.outbox import (
+    _deleted_since,
+    _missing_files,
+)
+from git_tool.feature_data.utils.fast_import_utils import FastImportWriter
+from git_tool.feature_data.utils.git_streams import (
+    BlobReader,
+    iter_git_records,
+    iter_log_commits,
+)
+from git_tool.feature_data.utils.interval_index import IntervalIndex
+from git_tool.finding_features import extract_annotation_ranges
+
+BACKFILL_REF = "refs/feature-tool/backfill"
+BACKFILL_CHUNK_SIZE = 100
+BACKFILL_PUBLISH_EVERY = 10
+ANNOTATION_MARKER = b"&begin["
+
+
+class BackfilledCommit(NamedTuple):
+    commit: str
+    author: str
+    date: datetime
+    features: list[str]
+    changes: list[ChangeDetail]
+
+
+class BackfillProgress(NamedTuple):
+    analysed: int
+    total: int
+    facts: int
+    elapsed: float
+
+    @property
+    def commits_per_second(self) -> float:
+        return self.analysed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BackfillResult(NamedTuple):
+    analysed: int
+    skipped: int
+    facts: int
+    elapsed: float
+
+
+def _iter_patches(
+    repo: git.Repo, commits: list[str]
+) -> Iterable[tuple[str, str, str, str]]:
+    """
+    (commit, author, committer date, patch) from one git log -p -U0 run.
+    """
+    for record in iter_git_records(
+        repo,
+        "log",
+        "--no-walk=unsorted",
+        "--stdin",
+        "-p",
+        "-U0",
+        "--no-renames",
+        "--no-color",
+        "--no-ext-diff",
+        *PATCH_PREFIX_ARGS,
+        "--format=%x00%H%n%an%n%cI",
+        stdin_lines=commits,
+    ):
+        commit, author, date, *patch = record.split("\n", 3)
+        yield commit, author, date, patch[0] if patch else ""
+
+
+def analyse_commits(
+    repo: git.Repo, commits: list[str]
+) -> list[BackfilledCommit]:
+    """
+    Features of the annotations whose lines the given commits added or changed.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        commits (list[str]): Full ids of commits without merges
+
+    Returns:
+        list[BackfilledCommit]: One entry per commit, features are empty if it
+            touched no annotation
+    """
+    reader = BlobReader(repo)
+    results = []
+    try:
+        for commit, author, date, patch in _iter_patches(repo, commits):
+            # removals have no new lines to attribute
+            changed = [
+                (
+                    "A" if old_path is None else "M",
+                    new_path,
+                    parse_hunk_headers(section),
+                )
+                for old_path, new_path, section in iter_patch_files(patch)
+                if new_path is not None and "\n" not in new_path
+            ]
+            changed = [entry for entry in changed if entry[2]]
+            contents = reader.read(
+                [f"{commit}:{path}" for _, path, _ in changed]
+            )
+            features: set[str] = set()
+            changes = []
+            for (status, path, hunks), content in zip(changed, contents):
+                if content is None or ANNOTATION_MARKER not in content:
+                    continue
+                annotations = IntervalIndex(
+                    (
+                        annotation.start_line,
+                        annotation.end_line,
+                        annotation.name,
+                    )
+                    for annotation in extract_annotation_ranges(
+                        content.decode("utf-8", errors="replace")
+                    )
+                )
+                file_features = {
+                    feature
+                    for _, _, new_start, new_count in hunks
+                    for feature in annotations.overlapping(
+                        *_affected_lines(new_start, new_count)
+                    )
+                }
+                if file_features:
+                    features |= file_features
+                    changes.append(
+                        ChangeDetail(
+                            change_type=(
+                                ChangeType.ADDED
+                                if status == "A"
+                                else ChangeType.MODIFIED
+                            ),
+                            description=path,
+                        )
+                    )
+            results.append(
+                BackfilledCommit(
+                    commit,
+                    author,
+                    datetime.fromisoformat(date),
+                    sorted(features),
+                    changes,
+                )
+            )
+    finally:
+        reader.close()
+    return results
+
+
+def _analyse_chunk(
+    repo_path: str, commits: list[str]
+) -> list[BackfilledCommit]:
+    return analyse_commits(git.Repo(repo_path), commits)
+
+
+def _to_fact(result: BackfilledCommit) -> FeatureFactModel:
+    return FeatureFactModel(
+        commit=result.commit,
+        authors=[result.author],
+        # the commit date keeps the fact file names stable when a backfill is
+        # repeated
+        date=result.date,
+        features=result.features,
+        changes=ChangeHolder(
+            code_changes=result.changes, constraint_changes=[], name_change=None
+        ),
+    )
+
+
+class _BackfillPublisher:
+    """
+    Chain of backfill commits written by one fast-import run and published to
+    the metadata branch from time to time.
+    """
+
+    def __init__(self, repo: git.Repo, branch: str):
+        self.repo = repo
+        self.branch = branch
+        self.identity = repo.git.var("GIT_COMMITTER_IDENT").rsplit(" ", 2)[0]
+        self.published = _branch_tip(repo, branch)
+        self.head = self.published
+        self.writer = FastImportWriter(repo, force=True)
+
+    def _committer(self) -> str:
+        return f"{self.identity} {int(time.time())} +0000"
+
+    def add(self, facts: list[FeatureFactModel]):
+        files = []
+        for fact in facts:
+            content = fact.model_dump_json().encode("utf-8")
+            # the feature folders are named by the feature names, like
+            # get_uuid_for_featurename returns them, but without opening the
+            # repository of the working directory per feature
+            files += [
+                ("644", path, content)
+                for path in generate_fact_file_path(fact, fact.features)
+            ]
+        self.head = self.writer.write_commit(
+            BACKFILL_REF,
+            self._committer(),
+            f"Backfill facts for {len(facts)} commits",
+            parent=self.head,
+            files=files,
+        )
+
+    def publish(self, max_attempts: int = 5):
+        """
+        Move the branch to the written chain. Facts written to the branch since
+        the last publish are merged in: fact files are never changed, so the
+        merged tree is the union of both.
+
+        Raises:
+            MetadataWriteConflictException: The branch moved during every one of
+                max_attempts updates
+        """
+        if self.head == self.published:
+            return
+        head = self.writer.checkpoint(self.head)
+        with metadata_write_lock(self.repo):
+            drain_write_queue(self.repo)
+            for _ in range(max_attempts):
+                tip = _branch_tip(self.repo, self.branch)
+                if tip is not None and tip != self.published:
+                    mark = self.writer.write_commit(
+                        BACKFILL_REF,
+                        self._committer(),
+                        f"Merge {self.branch} into backfill",
+                        parent=head,
+                        merges=[tip],
+                        existing_files=[
+                            (mode, oid, path)
+                            for path, (mode, oid) in _missing_files(
+                                self.repo, head, tip
+                            ).items()
+                        ],
+                        # e.g. duplicates that were removed from the branch
+                        # since the last merge
+                        removed_paths=sorted(
+                            _deleted_since(
+                                self.repo,
+                                head,
+                                tip,
+                                iter_git_records(
+                                    self.repo,
+                                    "diff-tree",
+                                    "-r",
+                                    "-z",
+                                    "--name-only",
+                                    "--diff-filter=A",
+                                    tip,
+                                    head,
+                                ),
+                            )
+                        ),
+                    )
+                    head = self.writer.checkpoint(mark)
+                    self.published = tip
+                try:
+                    self.repo.git.update_ref(
+                        f"refs/heads/{self.branch}", head, tip or ""
+                    )
+                except git.GitCommandError:
+                    continue
+                self.published = self.head = head
+                return
+        raise MetadataWriteConflictException(
+            f"{self.branch} kept moving during the backfill"
+        )
+
+    def close(self):
+        self.publish()
+        self.writer.close()
+        if self.writer.marks:
+            self.repo.git.update_ref("-d", BACKFILL_REF)
+
+    def abort(self):
+        self.writer.abort()
+
+
+def default_checkpoint_file(repo: git.Repo, revisions: list[str]) -> Path:
+    """
+    Checkpoint file of a backfill of the given revisions in the tool state.
+    """
+    key = hashlib.sha1("\0".join(revisions).encode("utf-8")).hexdigest()[:12]
+    return get_state_dir(repo).joinpath(f"backfill-{key}.done")
+
+
+def _read_checkpoint(checkpoint: Path) -> set[str]:
+    if not checkpoint.exists():
+        return set()
+    return set(checkpoint.read_text(encoding="utf-8").split())
+
+
+def _append_checkpoint(checkpoint: Path, commits: list[str]):
+    if not commits:
+        return
+    with checkpoint.open(mode="a", encoding="utf-8") as f:
+        f.write("".join(f"{commit}\n" for commit in commits))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def backfill_facts(
+    repo: git.Repo,
+    revisions: list[str],
+    jobs: Optional[int] = None,
+    chunk_size: int = BACKFILL_CHUNK_SIZE,
+    checkpoint: Optional[Path] = None,
+    progress: Optional[Callable[[BackfillProgress], None]] = None,
+    branch: str = FEATURE_BRANCH_NAME,
+) -> BackfillResult:
+    """
+    Write facts for all commits of a range that have none yet, derived from
+    their annotations.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        revisions (list[str]): Revisions and ranges as git log takes them, e.g.
+            ["v1.0..main"]
+        jobs (Optional[int]): Worker processes, defaults to the number of CPUs
+        chunk_size (int): Commits per worker task and per metadata commit
+        checkpoint (Optional[Path]): File of the analysed commits, defaults to
+            one per range in the tool state
+        progress (Optional[Callable[[BackfillProgress], None]]): Called after
+            every chunk
+        branch (str): Metadata branch
+
+    Returns:
+        BackfillResult: Counts of the run
+    """
+    started = time.monotonic()
+    checkpoint = checkpoint or default_checkpoint_file(repo, revisions)
+    done = _read_checkpoint(checkpoint)
+    index = get_feature_index(repo, branch)
+    commits = []
+    skipped = 0
+    for commit in iter_log_commits(
+        repo,
+        "--reverse",
+        "--no-merges",
+        # only matter if the revisions contain --all, --branches or --glob
+        f"--exclude=refs/heads/{branch}",
+        "--exclude=refs/feature-tool/*",
+        *revisions,
+        "--",
+    ):
+        if commit in done or index.row_of(commit) is not None:
+            skipped += 1
+        else:
+            commits.append(commit)
+    chunks = [
+        commits[start : start + chunk_size]
+        for start in range(0, len(commits), chunk_size)
+    ]
+    analysed = facts = 0
+    unpublished: list[str] = []
+    jobs = min(jobs or os.cpu_count() or 1, max(len(chunks), 1))
+    # fork keeps the already imported modules, spawn is the fallback on
+    # platforms without it
+    start_method = (
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context(start_method)
+    ) as executor:
+        results = executor.map(_analyse_chunk, repeat(repo.working_dir), chunks)
+        # the workers exist now, they must not inherit the pipe to fast-import
+        publisher = _BackfillPublisher(repo, branch)
+        try:
+            for number, chunk_results in enumerate(results, start=1):
+                chunk_facts = [
+                    _to_fact(result)
+                    for result in chunk_results
+                    if result.features
+                ]
+                if chunk_facts:
+                    publisher.add(chunk_facts)
+                unpublished += [result.commit for result in chunk_results]
+                analysed += len(chunk_results)
+                facts += len(chunk_facts)
+                if number % BACKFILL_PUBLISH_EVERY == 0:
+                    publisher.publish()
+                    _append_checkpoint(checkpoint, unpublished)
+                    unpublished = []
+                if progress is not None:
+                    progress(
+                        BackfillProgress(
+                            analysed,
+                            len(commits),
+                            facts,
+                            time.monotonic() - started,
+                        )
+                    )
+            publisher.close()
+        except BaseException:
+            publisher.abort()
+            raise
+    _append_checkpoint(checkpoint, unpublished)
+    return BackfillResult(analysed, skipped, facts, time.monotonic() - started)
@@ -0,0 +1,308 @@
+"""
+Serialized writes to the metadata branch.
+
+Several processes may write facts at the same time, e.g. commits in different
+worktrees or the shards of a backfill. Every writer appends its fact commits to
+a queue file in the tool state and then takes the per-repository write lock. The
+lock holder drains the whole queue: all queued commits are written by one
+fast-import run on top of the current branch tip and the branch is moved with a
+compare-and-swap update-ref. If the branch moved in between (push rebase,
+compaction) the commits are rebuilt on the new tip and the update is retried.
+Writers that find their commits already drained by an earlier lock holder are
+done at once, so parallel writers share one fast-import run instead of queueing
+behind each other. Commits that fast-import rejects are moved to a separate
+file, so they neither block later writes nor are written twice.
+"""
+
+import os
+from typing import Iterator, NamedTuple, Optional
+
+import git
+from pydantic import ValidationError
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    get_state_dir,
+)
+from git_tool.feature_data.utils.fast_import_utils import (
+    AccumulatedCommitData,
+    FastImportException,
+    FastImportWriter,
+)
+from git_tool.feature_data.utils.file_lock import file_lock
+
+WRITE_LOCK_FILE_NAME = "metadata.lock"
+WRITE_QUEUE_FILE_NAME = "metadata-queue"
+IN_FLIGHT_FILE_NAME = "metadata-queue.inflight"
+FAILED_FILE_NAME = "metadata-queue.failed"
+WRITE_REF = "refs/feature-tool/write"
+
+
+class MetadataWriteConflictException(Exception): ...
+
+
+class MetadataWriteFailedException(Exception): ...
+
+
+def metadata_write_lock(repo: git.Repo):
+    """
+    Exclusive lock for writing the metadata branch of this repository. Waits
+    until it is free.
+    """
+    return file_lock(get_state_dir(repo).joinpath(WRITE_LOCK_FILE_NAME))
+
+
+def enqueue_fact_commits(repo: git.Repo, commits: list[AccumulatedCommitData]):
+    """
+    Append fact commits to the write queue. They are written by the next
+    drain_write_queue.
+    """
+    queue_file = get_state_dir(repo).joinpath(WRITE_QUEUE_FILE_NAME)
+    lines = "".join(commit.model_dump_json() + "\n" for commit in commits)
+    # the queue lock is only held for the append, not while writing the branch
+    with file_lock(queue_file.with_suffix(".lock")):
+        with queue_file.open(mode="a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _take_queue(repo: git.Repo) -> list[str]:
+    """
+    Move the queue into the in-flight file and return everything in flight, one
+    JSON line per commit. Commits of a drain that crashed before its ref update
+    are still in flight and are written again.
+    """
+    state_dir = get_state_dir(repo)
+    queue_file = state_dir.joinpath(WRITE_QUEUE_FILE_NAME)
+    in_flight_file = state_dir.joinpath(IN_FLIGHT_FILE_NAME)
+    with file_lock(queue_file.with_suffix(".lock")):
+        if queue_file.exists():
+            with in_flight_file.open(mode="a", encoding="utf-8") as f:
+                f.write(queue_file.read_text(encoding="utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            queue_file.unlink()
+    if not in_flight_file.exists():
+        return []
+    return [
+        line
+        for line in in_flight_file.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+
+
+def _set_in_flight(repo: git.Repo, lines: list[str]):
+    """
+    Replace the in-flight file with the commits that are not written yet.
+    """
+    in_flight_file = get_state_dir(repo).joinpath(IN_FLIGHT_FILE_NAME)
+    if not lines:
+        in_flight_file.unlink(missing_ok=True)
+        return
+    temp_file = in_flight_file.with_suffix(".tmp")
+    with temp_file.open(mode="w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, in_flight_file)
+
+
+def _quarantine(repo: git.Repo, lines: list[str]):
+    with get_state_dir(repo).joinpath(FAILED_FILE_NAME).open(
+        mode="a", encoding="utf-8"
+    ) as f:
+        f.write("".join(line + "\n" for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _branch_tip(repo: git.Repo, branch: str) -> Optional[str]:
+    try:
+        return repo.git.rev_parse("--verify", "--quiet", f"refs/heads/{branch}")
+    except git.GitCommandError:
+        return None
+
+
+def _write_commits(
+    repo: git.Repo, commits: list[AccumulatedCommitData], parent: Optional[str]
+) -> str:
+    """
+    Write the commits as one chain on top of parent to WRITE_REF with one
+    fast-import run.
+    """
+    with FastImportWriter(repo, force=True, export_marks=True) as writer:
+        for commit in commits:
+            parent = writer.add_commit(commit, parent=parent, ref=WRITE_REF)
+    return writer.marks[parent]
+
+
+def _write_branch(
+    repo: git.Repo,
+    branch: str,
+    commits: list[AccumulatedCommitData],
+    max_attempts: int,
+) -> str:
+    for _ in range(max_attempts):
+        tip = _branch_tip(repo, branch)
+        new_tip = _write_commits(repo, commits, tip)
+        try:
+            # an empty old value means the branch must not exist yet
+            repo.git.update_ref(f"refs/heads/{branch}", new_tip, tip or "")
+        except git.GitCommandError:
+            continue
+        return new_tip
+    raise MetadataWriteConflictException(
+        f"{branch} kept moving while writing {len(commits)} fact commits"
+    )
+
+
+class DrainResult(NamedTuple):
+    # new tip of every written branch
+    tips: dict[str, str]
+    # JSON lines of the commits that can never be written, moved to
+    # FAILED_FILE_NAME
+    failed: list[str]
+
+
+def _write_one_by_one(
+    repo: git.Repo,
+    branch: str,
+    entries: list[tuple[str, AccumulatedCommitData]],
+    max_attempts: int,
+) -> Iterator[tuple[str, bool]]:
+    """
+    Write the entries with one fast-import run each, to find the ones that
+    fast-import rejects.
+
+    Raises:
+        MetadataWriteConflictException: The branch moved during every one of
+            max_attempts updates. Entries yielded before are written.
+
+    Yields:
+        tuple[str, bool]: Line of the entry, whether it was written or rejected
+    """
+    for line, commit in entries:
+        try:
+            _write_branch(repo, branch, [commit], max_attempts)
+        except FastImportException:
+            yield line, False
+            continue
+        yield line, True
+
+
+def _is_valid_branch(repo: git.Repo, branch: str) -> bool:
+    try:
+        repo.git.check_ref_format(f"refs/heads/{branch}")
+    except git.GitCommandError:
+        return False
+    return True
+
+
+def drain_write_queue(repo: git.Repo, max_attempts: int = 5) -> DrainResult:
+    """
+    Write all queued fact commits to their branches. Must be called with the
+    write lock held. The commits of a branch leave the in-flight file as soon
+    as they are written. Commits that can never be written, e.g. because
+    fast-import rejects them, are moved to FAILED_FILE_NAME instead of blocking
+    every later write.
+
+    Raises:
+        MetadataWriteConflictException: A branch moved during every one of
+            max_attempts updates, its unwritten commits stay in flight. The
+            other branches are written.
+
+    Returns:
+        DrainResult: New tips and the commits that were moved aside
+    """
+    pending = _take_queue(repo)
+    if not pending:
+        return DrainResult({}, [])
+    by_branch: dict[str, list[tuple[str, AccumulatedCommitData]]] = {}
+    failed: list[str] = []
+    for line in pending:
+        try:
+            commit = AccumulatedCommitData.model_validate_json(line)
+        except ValidationError:
+            failed.append(line)
+            continue
+        if not _is_valid_branch(repo, commit.branch_name):
+            failed.append(line)
+            continue
+        by_branch.setdefault(commit.branch_name, []).append((line, commit))
+    if failed:
+        _quarantine(repo, failed)
+        pending = [line for line in pending if line not in failed]
+        _set_in_flight(repo, pending)
+    tips: dict[str, str] = {}
+    conflict: Optional[MetadataWriteConflictException] = None
+    for branch, entries in by_branch.items():
+        written: list[str] = []
+        rejected: list[str] = []
+        try:
+            try:
+                _write_branch(
+                    repo,
+                    branch,
+                    [commit for _, commit in entries],
+                    max_attempts,
+                )
+                written = [line for line, _ in entries]
+            except FastImportException:
+                for line, ok in _write_one_by_one(
+                    repo, branch, entries, max_attempts
+                ):
+                    (written if ok else rejected).append(line)
+        except MetadataWriteConflictException as e:
+            conflict = e
+        if rejected:
+            _quarantine(repo, rejected)
+            failed += rejected
+        if written:
+            tips[branch] = repo.git.rev_parse(f"refs/heads/{branch}")
+        done = set(written + rejected)
+        pending = [line for line in pending if line not in done]
+        _set_in_flight(repo, pending)
+    repo.git.update_ref("-d", WRITE_REF)
+    if conflict is not None:
+        raise conflict
+    return DrainResult(tips, failed)
+
+
+def write_fact_commits(
+    repo: git.Repo, commits: list[AccumulatedCommitData]
+) -> dict[str, str]:
+    """
+    Append fact commits to their branches without losing concurrent writes.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        commits (list[AccumulatedCommitData]): Fact commits in the order they
+            are written
+
+    Raises:
+        MetadataWriteConflictException: A branch moved during every update
+        MetadataWriteFailedException: The commits can never be written, they
+            were moved to FAILED_FILE_NAME
+
+    Returns:
+        dict[str, str]: Tips of the branches of the commits after they were
+            written
+    """
+    enqueue_fact_commits(repo, commits)
+    lines = {commit.model_dump_json() for commit in commits}
+    with metadata_write_lock(repo):
+        # an earlier lock holder may already have written our commits, or
+        # moved them aside
+        drain_write_queue(repo)
+        failed_file = get_state_dir(repo).joinpath(FAILED_FILE_NAME)
+        if failed_file.exists() and lines.intersection(
+            failed_file.read_text(encoding="utf-8").splitlines()
+        ):
+            raise MetadataWriteFailedException(
+                f"git fast-import rejected the fact commits, they were moved "
+                f"to {failed_file}"
+            )
+        return {
+            commit.branch_name: repo.git.rev_parse(
+                f"refs/heads/{commit.branch_name}"
+            )
+            for commit in commits
+        }
@@ -0,0 +1,361 @@
+"""
+Feature co-change analytics: how often are two features touched by the same
+commit.
+
+The commit-feature relation is read from the folder structure of the metadata
+branch (<feature>/<commit>/<fact>), so no fact blobs have to be read. Features
+are interned to integer ids and the relation is kept as a sparse incidence
+matrix A (commits x features). The co-change matrix is A.T @ A, its diagonal
+holds the number of commits per feature.
+
+The matrix is cached inside the git dir together with the metadata tip it was
+built from, so new facts only update the affected rows instead of rebuilding
+everything.
+"""
+
+import csv
+import subprocess
+from pathlib import Path
+from typing import IO, Iterable, Optional
+
+import git
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional dependency, install git_tool[analytics]
+    np = None
+    sparse = None
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.read_feature_data.metadata_diff import (
+    read_metadata_diff,
+)
+from git_tool.feature_data.utils.git_streams import iter_tree_names
+from git_tool.feature_data.utils.object_names import get_resolver
+
+COCHANGE_CACHE_FILE_NAME = "cochange.npz"
+
+
+class AnalyticsDependencyMissingException(Exception): ...
+
+
+def _require_analytics_dependencies():
+    if np is None or sparse is None:
+        raise AnalyticsDependencyMissingException(
+            "Co-change analytics need numpy and scipy. Install them with "
+            "'pip install git_tool[analytics]'."
+        )
+
+
+def _resolve_commit_names(
+    repo: git.Repo, names: Iterable[str]
+) -> dict[str, str]:
+    """
+    Map abbreviated commit folder names to full object ids with one cat-file
+    round-trip. Names that are not commits of this repository are left out.
+    """
+    return get_resolver(repo).resolve_many(names, object_type="commit")
+
+
+def _resolve_tip(repo: git.Repo, tip: str) -> str:
+    oid = get_resolver(repo).resolve(tip, object_type="commit")
+    if oid is None:
+        raise git.GitCommandError(
+            ["git", "rev-parse", tip], 128, f"unknown revision {tip}"
+        )
+    return oid
+
+
+def _pairs_from_paths(
+    repo: git.Repo, paths: Iterable[str]
+) -> list[tuple[str, str]]:
+    """
+    Turn metadata paths <feature>/<commit>[/...] into unique (feature, full
+    commit id) pairs.
+    """
+    pairs = set()
+    for path in paths:
+        parts = path.split("/")
+        if len(parts) >= 2:
+            pairs.add((parts[0], parts[1]))
+    short_names = {commit for _, commit in pairs if len(commit) != 40}
+    resolved = _resolve_commit_names(repo, short_names)
+    return [
+        (feature, commit if len(commit) == 40 else resolved[commit])
+        for feature, commit in pairs
+        if len(commit) == 40 or commit in resolved
+    ]
+
+
+def read_feature_commit_pairs(
+    repo: git.Repo, tip: str
+) -> list[tuple[str, str]]:
+    """
+    All (feature, commit) pairs of a metadata revision from one ls-tree call
+    over its trees.
+    """
+    return _pairs_from_paths(
+        repo,
+        (
+            path
+            for path in iter_tree_names(
+                repo, tip, recursive=True, directories_only=True
+            )
+            if path.count("/") == 1
+        ),
+    )
+
+
+def read_changed_feature_commit_pairs(
+    repo: git.Repo, old_tip: str, new_tip: str
+) -> Optional[list[tuple[str, str]]]:
+    """
+    (feature, commit) pairs that got new facts between two metadata revisions.
+
+    Returns:
+        Optional[list[tuple[str, str]]]: The new pairs or None if facts were
+            removed, in which case the relation has to be rebuilt.
+    """
+    diff = read_metadata_diff(repo, old_tip, new_tip)
+    if diff.removed:
+        return None
+    return _pairs_from_paths(repo, (fact.path for fact in diff.added))
+
+
+def _row_key(commit: str) -> bytes:
+    # numpy drops trailing NUL bytes of "S20" values, so the lookup keys do the
+    # same
+    return bytes.fromhex(commit).rstrip(b"\0")
+
+
+class CoChangeMatrix:
+    """
+    Sparse feature x feature co-occurrence counts over the commits of the
+    metadata branch.
+    """
+
+    def __init__(self, features, commits, incidence, tip: str):
+        _require_analytics_dependencies()
+        self.features: list[str] = list(features)
+        self.feature_ids: dict[str, int] = {
+            f: i for i, f in enumerate(self.features)
+        }
+        self.commits = commits  # np.ndarray of 20 byte object ids, one per row
+        self.commit_rows: dict[bytes, int] = {
+            c: i for i, c in enumerate(commits.tolist())
+        }
+        self.incidence = incidence.tocsr()  # commits x features, 0/1
+        self.cochange = (self.incidence.T @ self.incidence).tocsr()
+        self.tip = tip
+
+    @classmethod
+    def from_pairs(
+        cls, pairs: list[tuple[str, str]], tip: str
+    ) -> "CoChangeMatrix":
+        _require_analytics_dependencies()
+        features = sorted({feature for feature, _ in pairs})
+        feature_ids = {f: i for i, f in enumerate(features)}
+        commit_ids: dict[bytes, int] = {}
+        rows = np.fromiter(
+            (
+                commit_ids.setdefault(bytes.fromhex(commit), len(commit_ids))
+                for _, commit in pairs
+            ),
+            dtype=np.int64,
+            count=len(pairs),
+        )
+        cols = np.fromiter(
+            (feature_ids[feature] for feature, _ in pairs),
+            dtype=np.int64,
+            count=len(pairs),
+        )
+        commits = np.array(list(commit_ids), dtype="S20")
+        incidence = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (rows, cols)),
+            shape=(len(commits), len(features)),
+        )
+        incidence.data[:] = 1
+        return cls(features, commits, incidence, tip)
+
+    @classmethod
+    def from_metadata(
+        cls, repo: git.Repo, tip: str = FEATURE_BRANCH_NAME
+    ) -> "CoChangeMatrix":
+        tip = _resolve_tip(repo, tip)
+        return cls.from_pairs(read_feature_commit_pairs(repo, tip), tip)
+
+    def add_pairs(self, pairs: list[tuple[str, str]], tip: str):
+        """
+        Add new (feature, commit) pairs and update the co-change counts of the
+        affected commits only.
+        """
+        for feature, _ in pairs:
+            if feature not in self.feature_ids:
+                self.feature_ids[feature] = len(self.features)
+                self.features.append(feature)
+        new_commits = []
+        for _, commit in pairs:
+            key = _row_key(commit)
+            if key not in self.commit_rows:
+                self.commit_rows[key] = len(self.commit_rows)
+                new_commits.append(key)
+        if new_commits:
+            self.commits = np.concatenate(
+                [self.commits, np.array(new_commits, dtype="S20")]
+            )
+        shape = (len(self.commits), len(self.features))
+        self.incidence.resize(shape)
+        self.cochange.resize((shape[1], shape[1]))
+
+        rows = np.array(
+            [self.commit_rows[_row_key(c)] for _, c in pairs], dtype=np.int64
+        )
+        cols = np.array([self.feature_ids[f] for f, _ in pairs], dtype=np.int64)
+        affected = np.unique(rows)
+        before = self.incidence[affected]
+        delta = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=shape
+        )
+        self.incidence = self.incidence.maximum(delta).tocsr()
+        after = self.incidence[affected]
+        self.cochange = (
+            self.cochange - before.T @ before + after.T @ after
+        ).tocsr()
+        self.cochange.eliminate_zeros()
+        self.tip = tip
+
+    def update(
+        self, repo: git.Repo, tip: str = FEATURE_BRANCH_NAME
+    ) -> "CoChangeMatrix":
+        """
+        Bring the matrix to the given metadata revision.
+
+        Returns:
+            CoChangeMatrix: self, or a rebuilt matrix if facts were removed on
+                the branch
+        """
+        tip = _resolve_tip(repo, tip)
+        if tip == self.tip:
+            return self
+        pairs = read_changed_feature_commit_pairs(repo, self.tip, tip)
+        if pairs is None:
+            return CoChangeMatrix.from_metadata(repo, tip)
+        self.add_pairs(pairs, tip)
+        return self
+
+    def restrict_to_range(self, repo: git.Repo, revision_range: str):
+        """
+        Co-change counts over the commits of a revision range like main..HEAD.
+        """
+        walk = subprocess.Popen(
+            ["git", "rev-list", revision_range],
+            cwd=repo.working_dir,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            return self.restrict_to_commits(
+                line.rstrip("\n") for line in walk.stdout
+            )
+        finally:
+            walk.stdout.close()
+            if walk.wait() != 0:
+                raise git.GitCommandError(
+                    ["git", "rev-list", revision_range], walk.returncode
+                )
+
+    def restrict_to_commits(self, commits: Iterable[str]):
+        """
+        Co-change counts over a subset of commits, e.g. the result of git
+        rev-list <range>.
+
+        Returns:
+            scipy.sparse.csr_matrix: features x features
+        """
+        wanted = np.fromiter((bytes.fromhex(c) for c in commits), dtype="S20")
+        mask = np.isin(self.commits, wanted)
+        selected = self.incidence[mask]
+        return (selected.T @ selected).tocsr()
+
+    def save(self, path: Path):
+        incidence = self.incidence.tocoo()
+        np.savez_compressed(
+            path,
+            tip=np.array(self.tip),
+            features=np.array(self.features, dtype=str),
+            commits=self.commits,
+            rows=incidence.row,
+            cols=incidence.col,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CoChangeMatrix":
+        _require_analytics_dependencies()
+        with np.load(path) as data:
+            features = data["features"].tolist()
+            commits = data["commits"]
+            incidence = sparse.csr_matrix(
+                (
+                    np.ones(len(data["rows"]), dtype=np.int32),
+                    (data["rows"], data["cols"]),
+                ),
+                shape=(len(commits), len(features)),
+            )
+            return cls(features, commits, incidence, str(data["tip"]))
+
+
+def get_cochange_matrix(
+    repo: git.Repo, tip: str = FEATURE_BRANCH_NAME, use_cache: bool = True
+) -> CoChangeMatrix:
+    """
+    Load the cached co-change matrix of this repository and update it to tip,
+    or build it from scratch if there is no usable cache.
+    """
+    _require_analytics_dependencies()
+    cache_file = get_state_dir(repo).joinpath(COCHANGE_CACHE_FILE_NAME)
+    matrix = None
+    if use_cache and cache_file.exists():
+        try:
+            matrix = CoChangeMatrix.load(cache_file).update(repo, tip)
+        except (OSError, ValueError, KeyError, git.GitCommandError):
+            # corrupt cache or the cached tip is gone after a compaction
+            matrix = None
+    if matrix is None:
+        matrix = CoChangeMatrix.from_metadata(repo, tip)
+    if use_cache:
+        matrix.save(cache_file)
+    return matrix
+
+
+def write_cochange_csv(features: list[str], cochange, out: IO[str]):
+    """
+    Write the upper triangle (including the diagonal) as
+    feature_a,feature_b,commits rows.
+    """
+    upper = sparse.triu(cochange).tocoo()
+    writer = csv.writer(out)
+    writer.writerow(["feature_a", "feature_b", "commits"])
+    writer.writerows(
+        (features[row], features[col], int(count))
+        for row, col, count in zip(upper.row, upper.col, upper.data)
+    )
+
+
+def write_cochange_npz(features: list[str], cochange, path: Path):
+    """
+    Write the matrix in CSR form together with the feature names, readable with
+    numpy alone.
+    """
+    cochange = cochange.tocsr()
+    np.savez_compressed(
+        path,
+        features=np.array(features, dtype=str),
+        data=cochange.data,
+        indices=cochange.indices,
+        indptr=cochange.indptr,
+        shape=np.array(cochange.shape),
+    )
@@ -12,10 +12,18 @@ from git import Commit
 from git_tool.feature_data.models_and_context.fact_model import (
     get_fact_from_featurefile,
 )
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
 from git_tool.feature_data.models_and_context.repo_context import (
     FEATURE_BRANCH_NAME,
     repo_context,
 )
+from git_tool.feature_data.utils.git_streams import (
+    iter_log_commits,
+    iter_tree_names,
+)
+from git_tool.feature_data.utils.object_names import get_resolver
 
 
 class FeatureNameNotFoundException(Exception): ...
@@ -32,15 +40,9 @@ def get_associated_files(feature_uuid: str) -> Generator[str, None, None]:
         Generator[str, None, None]: Iterator over all filenames associated with the feature
     """
     with repo_context() as repo:
-        # repo.git always allows to execute git commands, see
-        # https://gitpython.readthedocs.io/en/stable/tutorial.html#using-git-directly
-        result: str = repo.git.ls_tree(
-            "-r", "--name_only", FEATURE_BRANCH_NAME, feature_uuid
+        yield from iter_tree_names(
+            repo, FEATURE_BRANCH_NAME, [feature_uuid], recursive=True
         )
-        files: list[str] = (
-            result.split()
-        )  # outputs one string. Filenames are separated by whitespace-like delimiters
-        return files
 
 
 def get_featurename_from_uuid(
@@ -64,7 +66,7 @@ def get_featurename_from_uuid(
     names: list[tuple[datetime, str]] = []
     for file in feature_files:
         fact = get_fact_from_featurefile(file)
-        if fact.changes.name_change:
+        if fact is not None and fact.changes.name_change:
             names.append((fact.date, fact.changes.name_change.feature_name))
     if len(names) == 0:
         raise FeatureNameNotFoundException
@@ -101,10 +103,11 @@ def get_current_branchname() -> str:
     with repo_context() as repo:
         return repo.active_branch
 
+
 # Usages: FEATURE INFO
 def get_commits_for_feature_on_other_branches(
     feature_commits: set[str],
-    current_branch: str = get_current_branchname(),
+    current_branch: Optional[str] = None,
     other_branch: str = "",
 ) -> set[Commit]:
     """
@@ -113,16 +116,19 @@ def get_commits_for_feature_on_other_branches(
     Args:
         repo: The Git repository object.
         feature_commits: A set of commit IDs associated with the feature.
-        current_branch: The name of the current branch.
+        current_branch: The name of the current branch. Defaults to the checked
+            out branch.
         other_branch: Optional limitatation of the branch that should be compared to
 
     Returns:
         A set of commit IDs that are on other branches but not on the current branch.
     """
+    if current_branch is None:
+        current_branch = str(get_current_branchname())
     with repo_context() as repo:
         # Normalize the feature commits to full hashes if they are not already
         feature_commits = set(
-            repo.git.rev_parse(commit) for commit in feature_commits
+            get_resolver(repo).resolve_commits(feature_commits).values()
         )
         if other_branch:
             other_branches = [other_branch]
@@ -135,14 +141,13 @@ def get_commits_for_feature_on_other_branches(
         updatable_commits = set()
 
         for branch in other_branches:
-            branch_commits = set(
-                repo.git.log(
-                    f"{current_branch}..{branch}", "--pretty=%H"
-                ).split("\n")
+            updatable_commits.update(
+                commit
+                for commit in iter_log_commits(
+                    repo, f"{current_branch}..{branch}"
+                )
+                if commit in feature_commits
             )
-            relevant_commits = branch_commits.intersection(feature_commits)
-            if relevant_commits:
-                updatable_commits.update(relevant_commits)
 
         updatable_commit_objects = {
             repo.commit(commit_hash) for commit_hash in updatable_commits
@@ -160,31 +165,19 @@ def get_all_features() -> list[str]:
         list[str]: List of folder names (features) at the top level.
     """
     with repo_context() as repo:
-        folder_string = repo.git.ls_tree(
-            "-d", "--name-only", FEATURE_BRANCH_NAME
+        return list(
+            iter_tree_names(repo, FEATURE_BRANCH_NAME, directories_only=True)
         )
-        folders = folder_string.splitlines()
-        return folders
 
 # Usages: FEATURE COMMITS
 def get_commits_with_feature() -> list[str]:
     """
-    Return a list of short ids of commits that are assoicated
+    Return a list of the full ids of commits that are assoicated
     with at least one feature.
 
     Returns:
         list[str]
     """
-    all_features = get_all_features()
-    commit_ids = set()
-
     with repo_context() as repo:
-        for feature in all_features:
-            feature_files = repo.git.ls_tree(
-                "-d", "--name-only", f"{FEATURE_BRANCH_NAME}:{feature}"
-            ).splitlines()
-
-            for commit_folder in feature_files:
-                commit_id = commit_folder
-                commit_ids.add(commit_id)
-    return list(commit_ids)
+        index = get_feature_index(repo)
+        return [index.commit_of_row(row) for row in range(len(index))]
@@ -0,0 +1,233 @@
+"""
+Features affected by the changes between two revisions, e.g. of a pull request
+in CI.
+
+The changed paths come from one git diff --name-only -z run. Every path gets the
+features of the commits with facts that changed it before, from the path index.
+git grep finds the changed files whose new version has annotations, only these
+are read through one cat-file process and their changed lines, from git diff
+-U0, are intersected with the annotated line ranges. The cost depends on the
+number of changed files, not on the size of the history.
+"""
+
+from typing import NamedTuple
+
+import git
+
+from git_tool.feature_data.analyze_feature_data.line_attribution import (
+    PATCH_PREFIX_ARGS,
+    iter_patch_files,
+    parse_hunk_headers,
+)
+from git_tool.feature_data.git_status_per_feature import (
+    _affected_lines,
+    get_feature_name_from_folder,
+)
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.path_index import get_path_index
+from git_tool.feature_data.utils.git_streams import BlobReader, iter_git_records
+from git_tool.feature_data.utils.interval_index import IntervalIndex
+from git_tool.finding_features import extract_annotation_ranges
+
+ANNOTATION_MARKER = b"&begin["
+PATHSPEC_BATCH_SIZE = 1000
+
+
+class ImpactedFile(NamedTuple):
+    path: str
+    # changed lines of the new version inside annotations of the feature,
+    # inclusive ranges
+    lines: list[tuple[int, int]]
+    # the feature has facts for earlier commits that changed the file
+    history: bool
+
+
+class FeatureImpact(NamedTuple):
+    feature: str
+    files: list[ImpactedFile]
+
+
+def split_revision_range(revision_range: str) -> tuple[str, str]:
+    """
+    Base and head of "<base>..<head>" or "<base>...<head>", a missing head is
+    HEAD. With three dots the base is the merge base, like git diff does it.
+    """
+    if "..." in revision_range:
+        base, _, head = revision_range.partition("...")
+    else:
+        base, _, head = revision_range.partition("..")
+    return base or "HEAD", head or "HEAD"
+
+
+def _annotated_changed_lines(
+    repo: git.Repo,
+    diff_args: list[str],
+    head: str,
+    paths: list[str],
+) -> dict[str, dict[str, list[tuple[int, int]]]]:
+    """
+    path -> feature -> changed lines of the head version inside annotations of
+    the feature.
+    """
+    # git grep searches the files in parallel, only files with annotations are
+    # read
+    candidates = []
+    for start in range(0, len(paths), PATHSPEC_BATCH_SIZE):
+        candidates += [
+            name[len(head) + 1 :]
+            for name in iter_git_records(
+                repo,
+                "--literal-pathspecs",
+                "grep",
+                "-l",
+                "-z",
+                "-F",
+                "-e",
+                ANNOTATION_MARKER.decode(),
+                head,
+                "--",
+                *paths[start : start + PATHSPEC_BATCH_SIZE],
+                ok_codes=(0, 1),
+            )
+        ]
+    annotations: dict[str, IntervalIndex] = {}
+    reader = BlobReader(repo)
+    try:
+        batch = [path for path in candidates if "\n" not in path]
+        for path, content in zip(
+            batch, reader.read([f"{head}:{path}" for path in batch])
+        ):
+            if content is None:
+                continue
+            ranges = extract_annotation_ranges(
+                content.decode("utf-8", errors="replace")
+            )
+            if ranges:
+                annotations[path] = IntervalIndex(
+                    (
+                        a.start_line,
+                        a.end_line,
+                        (a.name, a.start_line, a.end_line),
+                    )
+                    for a in ranges
+                )
+    finally:
+        reader.close()
+
+    lines: dict[str, dict[str, list[tuple[int, int]]]] = {}
+    annotated = sorted(annotations)
+    for start in range(0, len(annotated), PATHSPEC_BATCH_SIZE):
+        batch = annotated[start : start + PATHSPEC_BATCH_SIZE]
+        patch = repo.git.execute(
+            [
+                "git",
+                "--literal-pathspecs",
+                "diff",
+                "-U0",
+                "--no-color",
+                "--no-ext-diff",
+                *PATCH_PREFIX_ARGS,
+                *diff_args,
+                "--",
+                *batch,
+            ]
+        )
+        for _, path, section in iter_patch_files(patch):
+            index = annotations.get(path)
+            if index is None:
+                continue
+            for _, _, new_start, new_count in parse_hunk_headers(section):
+                changed_start, changed_end = _affected_lines(
+                    new_start, new_count
+                )
+                for feature, first, last in index.overlapping(
+                    changed_start, changed_end
+                ):
+                    lines.setdefault(path, {}).setdefault(feature, []).append(
+                        (max(changed_start, first), min(changed_end, last))
+                    )
+    return lines
+
+
+def _merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def get_impact(
+    repo: git.Repo, revision_range: str, use_history: bool = True
+) -> list[FeatureImpact]:
+    """
+    Features affected by the changes of a revision range, with the files and
+    lines responsible.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        revision_range (str): "<base>..<head>" or "<base>...<head>"
+        use_history (bool): Also count features of earlier commits that changed
+            the files
+
+    Raises:
+        git.GitCommandError: A revision is unknown
+
+    Returns:
+        list[FeatureImpact]: Affected features sorted by name, their files
+            sorted by path
+    """
+    base, head = split_revision_range(revision_range)
+    diff_args = [
+        "--no-renames",
+        revision_range if ".." in revision_range else f"{base}..{head}",
+    ]
+    paths = list(
+        iter_git_records(repo, "diff", "--name-only", "-z", *diff_args)
+    )
+    impact: dict[str, dict[str, ImpactedFile]] = {}
+
+    if use_history:
+        feature_index = get_feature_index(repo)
+        path_index = get_path_index(repo, feature_index)
+        for path in paths:
+            for folder in path_index.features_of_path(path, feature_index):
+                feature = get_feature_name_from_folder(folder)
+                impact.setdefault(feature, {})[path] = ImpactedFile(
+                    path, [], True
+                )
+
+    for path, features in _annotated_changed_lines(
+        repo, diff_args, head, paths
+    ).items():
+        for feature, ranges in features.items():
+            known = impact.setdefault(feature, {}).get(path)
+            impact[feature][path] = ImpactedFile(
+                path, _merge_ranges(ranges), known is not None and known.history
+            )
+
+    return [
+        FeatureImpact(feature, [files[path] for path in sorted(files)])
+        for feature, files in sorted(impact.items())
+    ]
+
+
+def impact_to_json(impact: list[FeatureImpact]) -> list[dict]:
+    return [
+        {
+            "feature": entry.feature,
+            "files": [
+                {
+                    "path": file.path,
+                    "lines": [list(lines) for lines in file.lines],
+                    "history": file.history,
+                }
+                for file in entry.files
+            ],
+        }
+        for entry in impact
+    ]
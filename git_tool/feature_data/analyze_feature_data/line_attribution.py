@@ -0,0 +1,339 @@
+"""
+Per-line commit and feature attribution for git feature blame, cached in the
+tool state.
+
+The line -> commit attribution of a file is stored keyed by its path and the
+blob oid of its content, together with HEAD it was computed against and a copy
+of the content. The blob is only hashed, not written, so blaming leaves no
+objects behind. When the file changed, the copy of the previous content is
+diffed against the file and only the changed line ranges are blamed again with
+git blame --incremental; unchanged lines keep their attribution. The commit ->
+feature relation comes from the feature index, which is tied to the tip of the
+metadata branch, so new facts invalidate only that part.
+"""
+
+import codecs
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import git
+
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.utils.object_names import get_resolver
+
+BLAME_CACHE_DIR_NAME = "blame"
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# lines of a hunk carry a prefix, so only file headers start with "diff "
+FILE_HEADER = re.compile(r"^diff ", re.MULTILINE)
+# fixes the a/ and b/ prefixes iter_patch_files expects, whatever the config
+PATCH_PREFIX_ARGS = ["--src-prefix=a/", "--dst-prefix=b/"]
+
+
+class CommitInfo(NamedTuple):
+    author: str
+    author_time: int
+    author_tz: str
+
+
+class LineAttribution(NamedTuple):
+    commit: str
+    original_line: int
+
+
+class FileAttribution(NamedTuple):
+    path: str
+    blob: str
+    head: str
+    lines: list[LineAttribution]
+    commits: dict[str, CommitInfo]
+
+
+def _cache_dir(repo: git.Repo) -> Path:
+    cache_dir = get_state_dir(repo).joinpath(BLAME_CACHE_DIR_NAME)
+    cache_dir.mkdir(exist_ok=True)
+    return cache_dir
+
+
+def _cache_file(repo: git.Repo, path: str) -> Path:
+    return _cache_dir(repo).joinpath(
+        hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json"
+    )
+
+
+def _content_file(repo: git.Repo, path: str) -> Path:
+    return _cache_file(repo, path).with_suffix(".content")
+
+
+def _load_attribution(repo: git.Repo, path: str) -> Optional[FileAttribution]:
+    cache_file = _cache_file(repo, path)
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("path") != path:
+        return None
+    return FileAttribution(
+        path=data["path"],
+        blob=data["blob"],
+        head=data["head"],
+        lines=[LineAttribution(*line) for line in data["lines"]],
+        commits={
+            commit: CommitInfo(*info)
+            for commit, info in data["commits"].items()
+        },
+    )
+
+
+def _store_attribution(repo: git.Repo, attribution: FileAttribution):
+    used = {line.commit for line in attribution.lines}
+    data = {
+        "path": attribution.path,
+        "blob": attribution.blob,
+        "head": attribution.head,
+        "lines": attribution.lines,
+        "commits": {
+            c: info for c, info in attribution.commits.items() if c in used
+        },
+    }
+    _cache_file(repo, attribution.path).write_text(
+        json.dumps(data), encoding="utf-8"
+    )
+
+
+def parse_incremental_blame(
+    output: str,
+) -> tuple[dict[int, LineAttribution], dict[str, CommitInfo]]:
+    """
+    Parse the output of git blame --incremental.
+
+    Returns:
+        tuple[dict[int, LineAttribution], dict[str, CommitInfo]]: final line
+            number -> attribution
+        and the author information of all commits that appear
+    """
+    lines: dict[int, LineAttribution] = {}
+    headers: dict[str, dict[str, str]] = {}
+    commit = None
+    for row in output.splitlines():
+        key, _, value = row.partition(" ")
+        if commit is None:
+            commit = key
+            original, final, count = (int(x) for x in value.split(" "))
+            for offset in range(count):
+                lines[final + offset] = LineAttribution(
+                    commit, original + offset
+                )
+            headers.setdefault(commit, {})
+        elif key == "filename":
+            commit = None
+        else:
+            headers[commit][key] = value
+    commits = {
+        commit: CommitInfo(
+            fields.get("author", ""),
+            int(fields.get("author-time", 0)),
+            fields.get("author-tz", "+0000"),
+        )
+        for commit, fields in headers.items()
+        if "author" in fields
+    }
+    return lines, commits
+
+
+def blame_line_ranges(
+    repo: git.Repo,
+    path: str,
+    ranges: Optional[list[tuple[int, int]]] = None,
+    revision: Optional[str] = None,
+) -> tuple[dict[int, LineAttribution], dict[str, CommitInfo]]:
+    """
+    Blame path, restricted to the given inclusive line ranges. Without a
+    revision the working tree version is blamed. All ranges are answered by one
+    git blame --incremental call.
+    """
+    range_args = [f"-L{start},{end}" for start, end in ranges or []]
+    revision_args = [revision] if revision else []
+    output = repo.git.blame(
+        "--incremental", *range_args, *revision_args, "--", path
+    )
+    return parse_incremental_blame(output)
+
+
+def parse_hunk_headers(output: str) -> list[tuple[int, int, int, int]]:
+    """
+    Hunks of a unified diff as (old start, old count, new start, new count).
+    """
+    hunks = []
+    for row in output.splitlines():
+        match = HUNK_HEADER.match(row)
+        if match:
+            old_start, old_count, new_start, new_count = match.groups()
+            hunks.append(
+                (
+                    int(old_start),
+                    int(old_count or 1),
+                    int(new_start),
+                    int(new_count or 1),
+                )
+            )
+    return hunks
+
+
+def _patch_header_path(name: str) -> Optional[str]:
+    # git ends names with whitespace by a tab and quotes unusual ones C-style
+    if name.endswith("\t"):
+        name = name[:-1]
+    if name == "/dev/null":
+        return None
+    if name.startswith('"'):
+        name = codecs.escape_decode(name[1:-1].encode("utf-8"))[0].decode(
+            "utf-8", errors="surrogateescape"
+        )
+    return name[2:]
+
+
+def iter_patch_files(
+    patch: str,
+) -> Iterator[tuple[Optional[str], Optional[str], str]]:
+    """
+    (old path, new path, section) of every file of a patch with hunks. The
+    paths come from the --- and +++ lines of the section itself, None stands
+    for /dev/null. The patch has to use the a/ and b/ prefixes, see
+    PATCH_PREFIX_ARGS.
+    """
+    starts = [match.start() for match in FILE_HEADER.finditer(patch)]
+    for start, end in zip(starts, starts[1:] + [len(patch)]):
+        section = patch[start:end]
+        paths = {}
+        for row in section.partition("\n@@ ")[0].split("\n"):
+            if row.startswith(("--- ", "+++ ")):
+                paths[row[0]] = _patch_header_path(row[4:])
+        # binary files, mode changes and pure renames have no hunks
+        if "+" in paths:
+            yield paths["-"], paths["+"], section
+
+
+def changed_line_ranges(
+    repo: git.Repo, old_file: Path, new_file: Path
+) -> list[tuple[int, int, int, int]]:
+    """
+    Hunks between two files as (old start, old count, new start, new count),
+    without context lines.
+    """
+    # exits with 1 if the files differ
+    output = repo.git.diff(
+        "--no-index",
+        "-U0",
+        "--no-color",
+        "--no-ext-diff",
+        "--",
+        str(old_file),
+        str(new_file),
+        with_exceptions=False,
+    )
+    return parse_hunk_headers(output)
+
+
+def _reuse_unchanged_lines(
+    previous: list[LineAttribution],
+    hunks: list[tuple[int, int, int, int]],
+    line_count: int,
+) -> tuple[dict[int, LineAttribution], list[tuple[int, int]]]:
+    """
+    Carry the attribution of lines outside the hunks over to their new line
+    numbers.
+
+    Returns:
+        tuple[dict[int, LineAttribution], list[tuple[int, int]]]: reused lines
+            and the new line ranges that have to be blamed again
+    """
+    reused = {}
+    to_blame = []
+    old_line, new_line = 1, 1
+    for old_start, old_count, new_start, new_count in hunks + [
+        (len(previous), 0, line_count, 0)
+    ]:
+        # with count 0 the start is the line before the insertion or deletion
+        new_end = new_start if new_count else new_start + 1
+        while new_line < new_end and old_line <= len(previous):
+            reused[new_line] = previous[old_line - 1]
+            old_line += 1
+            new_line += 1
+        if new_count:
+            to_blame.append((new_start, new_start + new_count - 1))
+            new_line = new_start + new_count
+        old_line = (old_start if old_count else old_start + 1) + old_count
+    return reused, to_blame
+
+
+def get_file_attribution(repo: git.Repo, path: str) -> FileAttribution:
+    """
+    Line -> commit attribution of the working tree version of a file, computed
+    incrementally.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        path (str): Path of the file relative to the repository root
+
+    Returns:
+        FileAttribution: One LineAttribution per line and the author information
+            of the commits
+    """
+    blob = repo.git.hash_object("--", path)
+    head = get_resolver(repo).resolve("HEAD")
+    cached = _load_attribution(repo, path)
+    if cached is not None and cached.head == head and cached.blob == blob:
+        return cached
+
+    file = Path(repo.working_dir).joinpath(path)
+    content = file.read_bytes()
+    content_file = _content_file(repo, path)
+    if cached is not None and cached.head == head and content_file.exists():
+        line_count = content.count(b"\n") + (
+            not content.endswith(b"\n") and bool(content)
+        )
+        hunks = changed_line_ranges(repo, content_file, file)
+        lines, to_blame = _reuse_unchanged_lines(
+            cached.lines, hunks, line_count
+        )
+        commits = dict(cached.commits)
+    else:
+        lines, to_blame, commits = {}, None, {}
+    if to_blame is None or to_blame:
+        blamed, blamed_commits = blame_line_ranges(repo, path, to_blame)
+        lines.update(blamed)
+        commits.update(blamed_commits)
+
+    attribution = FileAttribution(
+        path=path,
+        blob=blob,
+        head=head,
+        lines=[lines[number] for number in sorted(lines)],
+        commits=commits,
+    )
+    _store_attribution(repo, attribution)
+    content_file.write_bytes(content)
+    return attribution
+
+
+def get_features_for_commits(
+    repo: git.Repo, commits: set[str], branch: str = FEATURE_BRANCH_NAME
+) -> dict[str, list[str]]:
+    """
+    Features with facts for each of the given full commit ids, read from the
+    feature index of the current tip of the metadata branch.
+
+    Returns:
+        dict[str, list[str]]: commit -> sorted feature names, commits without
+            facts map to []
+    """
+    return get_feature_index(repo, branch).features_of_commits(commits)
@@ -0,0 +1,151 @@
+"""
+Run feature queries over many repositories at once. Each repository is analysed
+in its own worker process, which activates that repository for repo_context (see
+set_repo_path) and answers the query in one session. The results of all
+repositories are merged into one report.
+"""
+
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from pydantic import BaseModel
+
+from git_tool.feature_data.analyze_feature_data.cochange import (
+    AnalyticsDependencyMissingException,
+    get_cochange_matrix,
+)
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    get_all_commits,
+    repo_context,
+    set_repo_path,
+)
+from git_tool.feature_data.read_feature_data.parse_data import (
+    _get_feature_uuids,
+)
+
+
+class RepositoryResult(BaseModel):
+    repository: str
+    result: Any = None
+    error: Optional[str] = None
+
+
+class MultiRepositoryReport(BaseModel):
+    query: str
+    repositories: list[RepositoryResult]
+    merged: Any
+
+
+def _query_info_all() -> list[str]:
+    return [uuid for uuid in _get_feature_uuids() if uuid]
+
+
+def _query_commits_missing() -> list[str]:
+    with repo_context() as repo:
+        index = get_feature_index(repo)
+    return [
+        commit for commit in get_all_commits() if index.row_of(commit) is None
+    ]
+
+
+def _query_cochange() -> list[tuple[str, str, int]]:
+    with repo_context() as repo:
+        matrix = get_cochange_matrix(repo)
+    cochange = matrix.cochange.tocoo()
+    return [
+        (matrix.features[row], matrix.features[col], int(count))
+        for row, col, count in zip(cochange.row, cochange.col, cochange.data)
+        if row <= col
+    ]
+
+
+def _merge_info_all(results: list[list[str]]) -> dict[str, int]:
+    """
+    Feature -> number of repositories that know the feature
+    """
+    return dict(
+        Counter(feature for result in results for feature in set(result))
+    )
+
+
+def _merge_commits_missing(results: list[list[str]]) -> int:
+    return sum(len(result) for result in results)
+
+
+def _merge_cochange(
+    results: list[list[tuple[str, str, int]]],
+) -> list[tuple[str, str, int]]:
+    counts = Counter()
+    for result in results:
+        for feature_a, feature_b, count in result:
+            counts[(feature_a, feature_b)] += count
+    return [(a, b, count) for (a, b), count in sorted(counts.items())]
+
+
+QUERIES: dict[str, tuple[Callable[[], Any], Callable[[list[Any]], Any]]] = {
+    "info-all": (_query_info_all, _merge_info_all),
+    "commits-missing": (_query_commits_missing, _merge_commits_missing),
+    "cochange": (_query_cochange, _merge_cochange),
+}
+
+
+def run_query_in_repository(repo_path: str, query: str) -> RepositoryResult:
+    """
+    Answer one query for one repository. Runs inside a worker process.
+    """
+    set_repo_path(repo_path)
+    run, _ = QUERIES[query]
+    try:
+        return RepositoryResult(repository=repo_path, result=run())
+    except AnalyticsDependencyMissingException as e:
+        return RepositoryResult(repository=repo_path, error=str(e))
+    except Exception as e:
+        return RepositoryResult(
+            repository=repo_path, error=f"{type(e).__name__}: {e}"
+        )
+
+
+def run_multi_repository_query(
+    repo_paths: list[str], query: str, jobs: Optional[int] = None
+) -> MultiRepositoryReport:
+    """
+    Run a query in all repositories in parallel and merge the results.
+
+    Args:
+        repo_paths (list[str]): Paths of the repositories
+        query (str): One of QUERIES
+        jobs (Optional[int]): Number of worker processes, defaults to the number
+            of cores
+
+    Returns:
+        MultiRepositoryReport: Per repository results in the given order and the
+            merged result
+    """
+    if query not in QUERIES:
+        raise ValueError(f"Unknown query {query}. Use one of {list(QUERIES)}")
+    repo_paths = [os.path.abspath(path) for path in repo_paths]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(repo_paths), 1))
+    # fork keeps the already imported modules, spawn is the fallback on
+    # platforms without it
+    start_method = (
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context(start_method)
+    ) as executor:
+        results = list(
+            executor.map(
+                run_query_in_repository, repo_paths, [query] * len(repo_paths)
+            )
+        )
+    _, merge = QUERIES[query]
+    merged = merge([r.result for r in results if r.error is None])
+    return MultiRepositoryReport(
+        query=query, repositories=results, merged=merged
+    )
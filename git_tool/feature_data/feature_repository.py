@@ -0,0 +1,194 @@
+"""
+Python API for using the tool in-process instead of running one git feature
+command per question. A FeatureRepository opens the repository once and keeps
+one QuerySession, so the feature index, the path index and the object name
+resolver are shared by all calls and follow the metadata branch when it moves.
+Results are typed and returned as iterators, nothing is printed and nothing is
+fetched unless fetch is called.
+
+    with FeatureRepository("/path/to/repo") as features:
+        for commit in features.commits_of_feature("login"):
+            ...
+"""
+
+from typing import Iterator, Optional
+
+import git
+from pydantic import ValidationError
+
+from git_tool.feature_data.git_status_per_feature import (
+    StatusEntry,
+    get_feature_name_from_folder,
+    iter_status_entries,
+)
+from git_tool.feature_data.models_and_context.fact_model import FeatureFactModel
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_repo_path,
+    metadata_fetch_args,
+)
+from git_tool.feature_data.read_feature_data.query_session import QuerySession
+from git_tool.feature_data.sync_feature_data.partial_fetch import (
+    prefetch_fact_blobs,
+)
+from git_tool.feature_data.utils.git_streams import (
+    BlobReader,
+    iter_tree_entries,
+)
+from git_tool.feature_data.utils.object_names import FULL_OID
+
+FACT_READ_BATCH_SIZE = 1000
+
+
+class UnknownRevisionException(Exception): ...
+
+
+class FeatureRepository:
+    def __init__(
+        self, repo_path: Optional[str] = None, branch: str = FEATURE_BRANCH_NAME
+    ):
+        """
+        Args:
+            repo_path (Optional[str]): Working tree or git directory, REPO_PATH
+                if not given
+            branch (str): Metadata branch
+        """
+        self.repo = git.Repo(
+            repo_path or get_repo_path(), search_parent_directories=True
+        )
+        self.branch = branch
+        self.session = QuerySession(self.repo, branch)
+
+    def __enter__(self) -> "FeatureRepository":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.repo.close()
+
+    def fetch(self, remote_name: str = "origin"):
+        """
+        Fetch the metadata branch from the remote, like the automatic refresh of
+        the commands.
+
+        Raises:
+            git.GitCommandError: The fetch failed
+        """
+        self.repo.git.fetch(
+            "--quiet", *metadata_fetch_args(self.repo, remote_name, self.branch)
+        )
+
+    def resolve_commit(self, revision: str) -> str:
+        """
+        Full id of a commit, e.g. of "HEAD~2" or an abbreviated id.
+
+        Raises:
+            UnknownRevisionException: The revision does not name a commit
+        """
+        if FULL_OID.match(revision):
+            return revision
+        commit = self.session.resolver.resolve_commit(revision)
+        if commit is None:
+            raise UnknownRevisionException(f"Unknown commit {revision}")
+        return commit
+
+    def features(self) -> Iterator[str]:
+        """
+        Uuids of all features with facts, sorted.
+        """
+        yield from self.session.feature_index.features
+
+    def feature_name(self, feature_uuid: str) -> str:
+        return get_feature_name_from_folder(feature_uuid)
+
+    def feature_uuid(self, name: str) -> Optional[str]:
+        return self.session.folders_by_name.get(name)
+
+    def commits_of_feature(self, feature_uuid: str) -> Iterator[str]:
+        """
+        Full ids of the commits with facts for the feature, sorted by id.
+        """
+        yield from self.session.feature_index.commits_of_feature(feature_uuid)
+
+    def features_of_commit(self, revision: str) -> Iterator[str]:
+        """
+        Uuids of the features with facts for the commit, sorted.
+
+        Raises:
+            UnknownRevisionException: The revision does not name a commit
+        """
+        yield from self.session.feature_index.features_of_commit(
+            self.resolve_commit(revision)
+        )
+
+    def features_of_path(self, path: str) -> Iterator[str]:
+        """
+        Uuids of the features with facts for commits that changed the path,
+        sorted.
+        """
+        yield from self.session.path_index.features_of_path(
+            path, self.session.feature_index
+        )
+
+    def facts(
+        self, feature_uuid: Optional[str] = None, revision: Optional[str] = None
+    ) -> Iterator[FeatureFactModel]:
+        """
+        Facts of the metadata branch, all of them or of one feature and/or one
+        commit. Fact files that are no valid facts are skipped.
+
+        Raises:
+            UnknownRevisionException: The revision does not name a commit
+        """
+        index = self.session.feature_index
+        if not index.features:
+            return
+        folders: list[str] = []
+        if revision is not None:
+            commit = self.resolve_commit(revision)
+            features = (
+                [feature_uuid]
+                if feature_uuid is not None
+                else index.features_of_commit(commit)
+            )
+            folders = [
+                f"{feature}/{commit}"
+                for feature in features
+                if index.has_feature(commit, feature)
+            ]
+            if not folders:
+                return
+        elif feature_uuid is not None:
+            folders = [feature_uuid]
+        files = [
+            entry.oid
+            for entry in iter_tree_entries(
+                self.repo, index.tip, folders, recursive=True
+            )
+            if entry.object_type == "blob"
+        ]
+        prefetch_fact_blobs(
+            self.repo, folders or list(index.features), self.branch
+        )
+        reader = BlobReader(self.repo)
+        try:
+            for start in range(0, len(files), FACT_READ_BATCH_SIZE):
+                for content in reader.read(
+                    files[start : start + FACT_READ_BATCH_SIZE]
+                ):
+                    try:
+                        yield FeatureFactModel.model_validate_json(
+                            content or b""
+                        )
+                    except ValidationError:
+                        continue
+        finally:
+            reader.close()
+
+    def status(self, untracked: bool = True) -> Iterator[StatusEntry]:
+        """
+        Changes of the working tree and the index, see iter_status_entries.
+        """
+        yield from iter_status_entries(self.repo, untracked=untracked)
@@ -9,6 +9,7 @@ from git_tool.feature_data.models_and_context.repo_context import (
     get_current_branch,
     repo_context,
 )
+from git_tool.feature_data.utils.git_streams import iter_log_commits
 
 
 def get_commits_for_file(
@@ -21,10 +22,8 @@ def get_commits_for_file(
     with repo_context() as repo:
         if branch_name is None:
             branch_name = get_current_branch()
-        commit_id_only = "--pretty=format:%H"
         try:
-            commits = repo.git.log(branch_name, commit_id_only, "--", file_name)
-            return commits.split("\n")
+            return list(iter_log_commits(repo, branch_name, "--", file_name))
         except Exception:
             # this happens for example if no commits exists
             return []
@@ -1,14 +1,135 @@
+import subprocess
+from functools import lru_cache
+from typing import Iterable
+
+import git
+
 from git_tool.feature_data.models_and_context.repo_context import repo_context
+from git_tool.feature_data.utils.git_streams import iter_git_records
+from git_tool.feature_data.utils.object_names import get_resolver
 
 
-def get_branches_for_commit(commit_id: str) -> set[str]:
+def _branch_tips(repo: git.Repo) -> tuple[tuple[str, str], ...]:
     """
-    Get all branches that contain the given commit.
+    (tip, name) of all local branches, the current branch is marked with "* "
+    like in git branch.
+    """
+    try:
+        current = repo.git.symbolic_ref("--quiet", "--short", "HEAD")
+    except git.GitCommandError:
+        current = None
+    output = repo.git.for_each_ref(
+        "--format=%(objectname) %(refname:short)", "refs/heads"
+    )
+    tips = []
+    for line in output.splitlines():
+        tip, _, name = line.partition(" ")
+        tips.append((tip, f"* {name}" if name == current else name))
+    return tuple(sorted(tips))
+
+
+@lru_cache(maxsize=32)
+def _walk_containment(
+    git_dir: str, tips: tuple[tuple[str, str], ...], commits: frozenset[str]
+) -> dict[str, frozenset[str]]:
+    """
+    One topological walk from all tips. Every branch is a bit, the bits of a
+    commit are the union of the bits of its children, which --topo-order always
+    emits first. The walk stops as soon as the last wanted commit was reached.
+    With a commit-graph git computes the topological order incrementally from
+    generation numbers, so only that part of the history is visited.
+    """
+    tip_bits: dict[str, int] = {}
+    for bit, (tip, _) in enumerate(tips):
+        tip_bits[tip] = tip_bits.get(tip, 0) | (1 << bit)
+    pending: dict[str, int] = {}
+    found: dict[str, int] = {}
+    process = subprocess.Popen(
+        [
+            "git",
+            "--git-dir",
+            git_dir,
+            "rev-list",
+            "--topo-order",
+            "--parents",
+            "--stdin",
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        process.stdin.write("".join(f"{tip}\n" for tip in tip_bits))
+        process.stdin.close()
+        for line in process.stdout:
+            commit, *parents = line.split()
+            bits = pending.pop(commit, 0) | tip_bits.get(commit, 0)
+            if commit in commits:
+                found[commit] = bits
+                if len(found) == len(commits):
+                    break
+            for parent in parents:
+                pending[parent] = pending.get(parent, 0) | bits
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+    return {
+        commit: frozenset(
+            name
+            for bit, (_, name) in enumerate(tips)
+            if found.get(commit, 0) >> bit & 1
+        )
+        for commit in commits
+    }
+
+
+def branches_containing(
+    repo: git.Repo, commit_ids: Iterable[str]
+) -> dict[str, set[str]]:
     """
+    Local branches that contain each of the given commits, answered by one walk
+    over the history. Results are cached per set of branch tips and set of
+    commits.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        commit_ids (Iterable[str]): Commits, abbreviated ids are allowed
 
+    Returns:
+        dict[str, set[str]]: commit id as given -> branch names, unknown commits
+            map to an empty set
+    """
+    commit_ids = set(commit_ids)
+    resolved = get_resolver(repo).resolve_commits(commit_ids)
+    containment = _walk_containment(
+        repo.git_dir, _branch_tips(repo), frozenset(resolved.values())
+    )
+    return {
+        commit_id: (
+            set(containment[resolved[commit_id]])
+            if commit_id in resolved
+            else set()
+        )
+        for commit_id in commit_ids
+    }
+
+
+# Usages: FEATURE INFO
+def get_branches_for_commits(commit_ids: Iterable[str]) -> dict[str, set[str]]:
+    """
+    Get all branches that contain the given commits.
+    """
     with repo_context() as repo:
-        branches = repo.git.branch("--contains", commit_id).split("\n")
-        return {branch.strip() for branch in branches}
+        return branches_containing(repo, commit_ids)
+
+
+def get_branches_for_commit(commit_id: str) -> set[str]:
+    """
+    Get all branches that contain the given commit.
+    """
+    return get_branches_for_commits([commit_id])[commit_id]
 
 
 def get_author_for_commit(commit_id: str) -> str:
@@ -24,4 +145,8 @@ def get_files_for_commit(commit_id: str) -> list[str]:
     Get the list of files modified by the given commit.
     """
     with repo_context() as repo:
-        return repo.git.show("--name-only", "--pretty=", commit_id).split("\n")
+        return list(
+            iter_git_records(
+                repo, "show", "-z", "--name-only", "--format=", commit_id
+            )
+        )
@@ -1,14 +1,31 @@
+import subprocess
 from collections import namedtuple
-from typing import List, TypedDict
-
-from git import Commit, GitCommandError
+from functools import lru_cache
+from typing import Generator, List, NamedTuple, Optional, TypedDict
+
+from git import GitCommandError
+from git_tool.feature_data.analyze_feature_data.line_attribution import (
+    PATCH_PREFIX_ARGS,
+    blame_line_ranges,
+    get_features_for_commits,
+    iter_patch_files,
+    parse_hunk_headers,
+)
 from git_tool.feature_data.file_based_git_info import get_commits_for_file
 
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
 from git_tool.feature_data.models_and_context.repo_context import (
-    FEATURE_BRANCH_NAME,
-    branch_folder_list,
     repo_context,
 )
+from git_tool.feature_data.utils.git_streams import iter_git_records
+from git_tool.feature_data.utils.interval_index import IntervalIndex
+from git_tool.feature_data.utils.object_names import get_resolver
+from git_tool.finding_features import (
+    FeatureAnnotation,
+    extract_annotation_ranges,
+)
 
 
 class GitChanges(TypedDict):
@@ -23,46 +40,186 @@ class GitChanges(TypedDict):
 
 GitStatusEntry = namedtuple("GitStatusEntry", ["status", "file_path"])
 
+
+class StatusEntry(NamedTuple):
+    """
+    One entry of git status --porcelain=v2. Unchanged sides are "." like in
+    git's output.
+    """
+
+    kind: str  # "ordinary", "renamed", "unmerged", "untracked" or "ignored"
+    index_status: str
+    worktree_status: str
+    path: str
+    original_path: Optional[str] = None  # source of a rename or copy
+
+    @property
+    def staged(self) -> bool:
+        return (
+            self.kind not in ("untracked", "ignored")
+            and self.index_status != "."
+        )
+
+    @property
+    def unstaged(self) -> bool:
+        return (
+            self.kind not in ("untracked", "ignored")
+            and self.worktree_status != "."
+        )
+
+    @property
+    def untracked(self) -> bool:
+        return self.kind == "untracked"
+
+
+STATUS_KINDS = {
+    "1": "ordinary",
+    "2": "renamed",
+    "u": "unmerged",
+    "?": "untracked",
+    "!": "ignored",
+}
+# number of space separated fields before the path, per entry type
+STATUS_FIELDS_BEFORE_PATH = {"1": 8, "2": 9, "u": 10, "?": 1, "!": 1}
+
+
+@lru_cache(maxsize=None)
+def _has_builtin_fsmonitor() -> bool:
+    result = subprocess.run(
+        ["git", "version", "--build-options"], capture_output=True, text=True
+    )
+    return "fsmonitor--daemon" in result.stdout
+
+
+def _status_performance_config(repo) -> list[str]:
+    """
+    Config for git status on large working trees: the untracked cache avoids
+    scanning unchanged directories for untracked files, the builtin fsmonitor
+    avoids lstat() on every tracked file. A fsmonitor configured by the user
+    always wins.
+    """
+    config = ["-c", "core.untrackedCache=true"]
+    try:
+        repo.git.config("--get", "core.fsmonitor")
+    except GitCommandError:
+        if _has_builtin_fsmonitor():
+            config += ["-c", "core.fsmonitor=true"]
+    return config
+
+
+def iter_status_entries(
+    repo, untracked: bool = True, paths: Optional[List[str]] = None
+) -> Generator[StatusEntry, None, None]:
+    """
+    Stream the entries of git status --porcelain=v2 -z. Paths are returned
+    verbatim, including spaces, newlines and non-ASCII characters, and renames
+    are detected. Stopping the iteration early stops git status.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        untracked (bool): Whether untracked files are listed, skipping them is
+            considerably faster
+        paths (Optional[List[str]]): Only report these paths, taken literally.
+            git then only looks at them instead of the whole working tree.
+
+    Yields:
+        StatusEntry: typed status entries in git's order
+    """
+    pathspec = ["--", *paths] if paths is not None else []
+    records = iter_git_records(
+        repo,
+        "--literal-pathspecs",
+        *_status_performance_config(repo),
+        "status",
+        "--porcelain=v2",
+        "-z",
+        "--find-renames",
+        f"--untracked-files={'normal' if untracked else 'no'}",
+        *pathspec,
+    )
+    for record in records:
+        entry_type = record[:1]
+        if entry_type not in STATUS_KINDS:
+            continue
+        fields = record.split(" ", STATUS_FIELDS_BEFORE_PATH[entry_type])
+        path = fields[-1]
+        if entry_type in ("?", "!"):
+            yield StatusEntry(STATUS_KINDS[entry_type], ".", ".", path)
+            continue
+        index_status, worktree_status = fields[1][0], fields[1][1]
+        original_path = next(records) if entry_type == "2" else None
+        yield StatusEntry(
+            STATUS_KINDS[entry_type],
+            index_status,
+            worktree_status,
+            path,
+            original_path,
+        )
+
+
+# Usages: PRE-COMMIT
+def has_staged_changes() -> bool:
+    """
+    Check for staged changes. Stops at the first staged entry and does not look
+    for untracked files.
+    """
+    with repo_context() as repo:
+        return any(
+            entry.staged for entry in iter_status_entries(repo, untracked=False)
+        )
+
+
 # Usages: FEATURE ADD, ADD-FROM-STAGED, PRE-COMMIT, STATUS
 def get_files_by_git_change() -> GitChanges:
     """
-    Retrieves files sorted by the type of git change (staged, unstaged, untracked).
-    Can be used in combination with finding feature annotations for files to help
-    figure out which features are already staged.
+    Retrieves files sorted by the type of git change (staged, unstaged,
+    untracked). Can be used in combination with finding feature annotations for
+    files to help figure out which features are already staged. Renamed files
+    are listed with their new path.
 
     Returns:
         Dict[str, List[str]]: A dictionary with keys 'staged_files', 'unstaged_files',
         and 'untracked_files', each containing a list of file paths.
     """
-
-    def convert_to_status_entry(short_status_line: str) -> GitStatusEntry:
-        return GitStatusEntry(short_status_line[:2], short_status_line[3:])
-
     with repo_context() as repo:
-        result = repo.git.status("-s")
-        lines = list(map(convert_to_status_entry, result.split("\n")))
         changes: GitChanges = {
             "staged_files": [],
             "unstaged_files": [],
             "untracked_files": [],
         }
-        for entry in lines:
-            if entry.status and entry.status[0] != " " and entry.status != "??":
-                changes["staged_files"].append(entry.file_path)
-            if entry.status and entry.status[1] != " " and entry.status != "??":
-                changes["unstaged_files"].append(entry.file_path)
-            if entry.status == "??":
-                changes["untracked_files"].append(entry.file_path)
+        for entry in iter_status_entries(repo):
+            if entry.staged:
+                changes["staged_files"].append(entry.path)
+            if entry.unstaged:
+                changes["unstaged_files"].append(entry.path)
+            if entry.untracked:
+                changes["untracked_files"].append(entry.path)
 
         return dict(changes)
 
 
-def find_annotations_for_file(file: str):
+def find_annotations_for_file(
+    file: str, content: Optional[str] = None
+) -> List[FeatureAnnotation]:
     """
-    Parse file for comment-based feature hints and search for file and folder annotations.
-    This makes use of the feature-annotation system. Not documented further here.
+    Parse file for comment-based feature hints (&begin[feature] ...
+    &end[feature]). File and folder annotations are not supported by the
+    feature-annotation system yet.
+
+    Args:
+        file (str): Path of the file
+        content (Optional[str]): Content to parse instead of the file on disk,
+            e.g. the staged version
+
+    Returns:
+        List[FeatureAnnotation]: Annotated line ranges, ordered by their first
+            line
     """
-    raise NotImplementedError
+    if content is None:
+        with open(file, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+    return extract_annotation_ranges(content)
+
 
 # Usage: FEATURE ADD-FROM-STAGED, BLAME, STATUS
 def get_features_for_file(
@@ -90,26 +247,30 @@ def get_features_for_file(
     """
     features = []
     if use_annotations:
-        features = find_annotations_for_file(file_path)
-        return features
+        annotations = find_annotations_for_file(file_path)
+        return sorted({annotation.name for annotation in annotations})
 
     commits = get_commits_for_file(file_name=file_path, branch_name=None)
-    with branch_folder_list() as (feature_folders, _):
-        for commit in commits:
-            for feature in feature_folders:
-                feature_name = get_feature_name_from_folder(feature)
-                if commit_in_feature_folder(commit, feature_name):
-                    features.append(feature_name)
+    with repo_context() as repo:
+        index = get_feature_index(repo)
+    for feature in sorted(
+        {
+            feature
+            for commit in commits
+            for feature in index.features_of_commit(commit)
+        }
+    ):
+        features.append(get_feature_name_from_folder(feature))
     return features
 
-# Usages: FEATURE INFO
-def get_commits_for_feature(feature_uuid: str) -> list[Commit]:
 
+# Usages: FEATURE INFO
+def get_commits_for_feature(feature_uuid: str) -> list[str]:
+    """
+    Full ids of all commits with facts for the feature, sorted by id.
+    """
     with repo_context() as repo:
-        output = repo.git.ls_tree(
-            "-d", "--name-only", f"{FEATURE_BRANCH_NAME}:{feature_uuid}"
-        )
-        return [repo.commit(x) for x in output.split("\n")]
+        return get_feature_index(repo).commits_of_feature(feature_uuid)
 
 
 def commit_in_feature_folder(commit: str, feature_folder: str) -> bool:
@@ -130,25 +291,158 @@ def commit_in_feature_folder(commit: str, feature_folder: str) -> bool:
         feature_folder, str
     ), f"Expected feature_folder to be a string, but got {type(feature_folder).__name__}"
     with repo_context() as repo:
-        commit_obj =repo.commit(commit)
-    result = commit_obj.hexsha in [x.hexsha for x in get_commits_for_feature(feature_uuid=feature_folder)]
-    return result
+        commit_id = get_resolver(repo).resolve_commit(commit)
+        if commit_id is None:
+            return False
+        return get_feature_index(repo).has_feature(commit_id, feature_folder)
 
 
-def get_feature_for_hunk(file_path: str, hunk: str) -> List[str]:
+class StagedHunk(NamedTuple):
+    """
+    One hunk of git diff --cached -U0. Line ranges follow the unified diff
+    format, a count of 0 means the hunk is an insertion (old side) or a deletion
+    (new side).
+    """
+
+    path: str
+    old_path: Optional[str]  # None for added files
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+
+
+class FileFeatureIndex(NamedTuple):
+    """
+    Features of the line ranges of one staged file. Annotations are indexed by
+    the lines of the staged version, line ownership from blame by the lines of
+    the HEAD version.
+    """
+
+    annotations: IntervalIndex[str]
+    ownership: IntervalIndex[str]
+
+
+def get_staged_hunks(repo) -> List[StagedHunk]:
+    """
+    All hunks of git diff --cached -U0. Binary files and files whose mode
+    changed only have no hunks, a type change has the hunks of a removal and an
+    addition.
+    """
+    patch = repo.git.diff(
+        "--cached",
+        "-U0",
+        "--find-renames",
+        "--no-color",
+        "--no-ext-diff",
+        *PATCH_PREFIX_ARGS,
+    )
+    hunks = []
+    for old_path, new_path, section in iter_patch_files(patch):
+        # hunks of a deleted file only have an old side
+        path = old_path if new_path is None else new_path
+        for old_start, old_count, new_start, new_count in parse_hunk_headers(
+            section
+        ):
+            hunks.append(
+                StagedHunk(
+                    path, old_path, old_start, old_count, new_start, new_count
+                )
+            )
+    return hunks
+
+
+def build_file_feature_index(
+    repo, path: str, old_path: Optional[str]
+) -> FileFeatureIndex:
+    """
+    Combine the annotations of the staged version of a file and the line
+    ownership of its HEAD version into interval indexes. Consecutive lines owned
+    by the same commit form one interval.
+    """
+    try:
+        staged_content = repo.git.show(f":{path}")
+    except GitCommandError:
+        # deleted files have no staged version
+        staged_content = ""
+    annotations = IntervalIndex(
+        (annotation.start_line, annotation.end_line, annotation.name)
+        for annotation in find_annotations_for_file(path, staged_content)
+    )
+    if old_path is None:
+        return FileFeatureIndex(annotations, IntervalIndex([]))
+
+    lines, _ = blame_line_ranges(repo, old_path, revision="HEAD")
+    runs: list[list] = []  # [start, end, commit]
+    for number in sorted(lines):
+        commit = lines[number].commit
+        if runs and runs[-1][2] == commit and runs[-1][1] == number - 1:
+            runs[-1][1] = number
+        else:
+            runs.append([number, number, commit])
+    features = get_features_for_commits(repo, {commit for _, _, commit in runs})
+    ownership = IntervalIndex(
+        (start, end, feature)
+        for start, end, commit in runs
+        for feature in features[commit]
+    )
+    return FileFeatureIndex(annotations, ownership)
+
+
+def _affected_lines(start: int, count: int) -> tuple[int, int]:
+    # an empty side touches the lines around the position where the other side
+    # was inserted
+    return (start, start + count - 1) if count else (start, start + 1)
+
+
+def get_feature_for_hunk(
+    file_index: FileFeatureIndex, hunk: StagedHunk
+) -> List[str]:
     """
     Retrieves features for specific changes (hunks) in a given file.
 
     Args:
-        file_path (str): The path to the file.
-        hunk (str): The specific changes (hunks) in the file.
+        file_index (FileFeatureIndex): Index of the file the hunk belongs to
+        hunk (StagedHunk): The specific changes (hunks) in the file.
 
     Returns:
-        List[str]: A list of features associated with the specific hunks in the file.
+        List[str]: The features whose annotated or owned lines overlap the hunk.
     """
-    raise NotImplementedError()
-    # features = get_features_for_hunk(file_path, hunk)
-    # return features
+    features = set(
+        file_index.annotations.overlapping(
+            *_affected_lines(hunk.new_start, hunk.new_count)
+        )
+    )
+    if hunk.old_path is not None:
+        features.update(
+            file_index.ownership.overlapping(
+                *_affected_lines(hunk.old_start, hunk.old_count)
+            )
+        )
+    return sorted(features)
+
+
+# Usages: ADD-FROM-STAGED
+def get_features_for_staged_hunks() -> List[tuple[StagedHunk, List[str]]]:
+    """
+    Propose features for every staged hunk. Each file is indexed once.
+
+    Returns:
+        List[tuple[StagedHunk, List[str]]]: The hunks in diff order with their
+            features
+    """
+    with repo_context() as repo:
+        indexes: dict[str, FileFeatureIndex] = {}
+        result = []
+        for hunk in get_staged_hunks(repo):
+            if hunk.path not in indexes:
+                indexes[hunk.path] = build_file_feature_index(
+                    repo, hunk.path, hunk.old_path
+                )
+            result.append(
+                (hunk, get_feature_for_hunk(indexes[hunk.path], hunk))
+            )
+        return result
 
 
 def get_feature_name_from_folder(feature_folder: str) -> str:
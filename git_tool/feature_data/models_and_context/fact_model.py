@@ -57,15 +57,18 @@ class FeatureFactModel(BaseModel):
 
 
 def get_fact_from_featurefile(filename: str) -> FeatureFactModel | None:
-    print("evaluating", filename)
+    """
+    Read one fact file of the metadata branch.
+
+    Args:
+        filename (str): Path of the fact file on the metadata branch
+
+    Returns:
+        FeatureFactModel | None: The fact, None if the file is no valid fact
+    """
     with repo_context() as repo:
-        try:
-            file_content = repo.git.show(f"{FEATURE_BRANCH_NAME}:{filename}")
-            return FeatureFactModel.model_validate_json(file_content)
-        except ValidationError as e:
-            print(
-                "Validation didn't work",
-            )
-            print(e)
-        finally:
-            return None
+        file_content = repo.git.show(f"{FEATURE_BRANCH_NAME}:{filename}")
+    try:
+        return FeatureFactModel.model_validate_json(file_content)
+    except ValidationError:
+        return None
@@ -0,0 +1,540 @@
+"""
+Compact in-memory form of the feature <-> commit relation of the metadata
+branch.
+
+Commits are stored as 20 byte binary ids in one sorted bytes object, their
+position is the commit row. Feature names are interned to small integers. The
+relation is kept twice as CSR style index arrays, feature -> commit rows and
+commit row -> features, so both directions are a slice. Sets of commits are
+Python ints used as bitsets over the commit rows: union, intersection and
+difference run in C over machine words, like the branch bits of git_helper. One
+million relations need about 8 bytes plus 20 bytes per distinct commit.
+
+The index is cached per tip of the metadata branch in the tool state. When the
+branch moves, the relations added since the cached tip are read from the
+metadata diff and merged into the arrays without rebuilding the relation; if
+facts were removed, the index is rebuilt.
+"""
+
+import json
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+from operator import add
+from pathlib import Path
+from typing import Iterable, Optional
+
+import git
+
+from git_tool.feature_data.analyze_feature_data.cochange import (
+    read_changed_feature_commit_pairs,
+    read_feature_commit_pairs,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.utils.atomic_file import atomic_write
+from git_tool.feature_data.utils.object_names import get_resolver
+
+INDEX_FILE_NAME = "feature-index.bin"
+INDEX_FORMAT_VERSION = 1
+OID_SIZE = 20
+_HEADER = struct.Struct("<4sI40sIII")
+_MAGIC = b"FIDX"
+
+
+class _OidRecords:
+    """
+    Fixed width view on the packed commit ids, so bisect can search them without
+    copying.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data) // OID_SIZE
+
+    def __getitem__(self, row: int) -> bytes:
+        return self.data[row * OID_SIZE : (row + 1) * OID_SIZE]
+
+
+def _csr(rows: int, pairs: Iterable[tuple[int, int]]) -> tuple[array, array]:
+    """
+    CSR arrays of (row, column) pairs that are sorted by row.
+    """
+    offsets = array("I", [0]) * (rows + 1)
+    columns = array("I")
+    for row, column in pairs:
+        offsets[row + 1] += 1
+        columns.append(column)
+    for row in range(rows):
+        offsets[row + 1] += offsets[row]
+    return offsets, columns
+
+
+class FeatureCommitIndex:
+    def __init__(
+        self,
+        tip: str,
+        features: list[str],
+        commits: bytes,
+        commit_offsets: array,
+        commit_features: array,
+        feature_offsets: array,
+        feature_commits: array,
+    ):
+        """
+        Args:
+            tip (str): Metadata revision the relation was read from
+            features (list[str]): Sorted feature names, their position is the
+                feature id
+            commits (bytes): Sorted, concatenated 20 byte commit ids
+            commit_offsets (array): CSR offsets per commit row into
+                commit_features
+            commit_features (array): Feature ids of every commit, sorted per row
+            feature_offsets (array): CSR offsets per feature id into
+                feature_commits
+            feature_commits (array): Commit rows of every feature, sorted per
+                feature
+        """
+        self.tip = tip
+        self.features = features
+        self.feature_ids = {feature: i for i, feature in enumerate(features)}
+        self.commits = commits
+        self._records = _OidRecords(commits)
+        self.commit_offsets = commit_offsets
+        self.commit_features = commit_features
+        self.feature_offsets = feature_offsets
+        self.feature_commits = feature_commits
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def relation_count(self) -> int:
+        return len(self.commit_features)
+
+    @classmethod
+    def from_pairs(
+        cls, pairs: Iterable[tuple[str, str]], tip: str
+    ) -> "FeatureCommitIndex":
+        """
+        Build the index from (feature, full commit id) pairs.
+        """
+        feature_ids: dict[str, int] = {}
+        relation: dict[str, set[int]] = {}
+        for feature, commit in pairs:
+            feature_id = feature_ids.setdefault(feature, len(feature_ids))
+            relation.setdefault(commit.lower(), set()).add(feature_id)
+        # intern in name order, so ids do not depend on the order of the pairs
+        features = sorted(feature_ids)
+        renumber = array("I", [0]) * len(features)
+        for new_id, feature in enumerate(features):
+            renumber[feature_ids[feature]] = new_id
+        # hex ids sort like their binary form
+        ordered = sorted(relation)
+        commits = bytes.fromhex("".join(ordered))
+        rows = [
+            (row, feature_id)
+            for row, commit in enumerate(ordered)
+            for feature_id in sorted(
+                renumber[old_id] for old_id in relation[commit]
+            )
+        ]
+        commit_offsets, commit_features = _csr(len(ordered), rows)
+        # stable, rows stay sorted per feature
+        rows.sort(key=lambda row_feature: row_feature[1])
+        feature_offsets, feature_commits = _csr(
+            len(features), ((feature_id, row) for row, feature_id in rows)
+        )
+        return cls(
+            tip,
+            features,
+            commits,
+            commit_offsets,
+            commit_features,
+            feature_offsets,
+            feature_commits,
+        )
+
+    @classmethod
+    def from_metadata(
+        cls, repo: git.Repo, branch: str = FEATURE_BRANCH_NAME
+    ) -> "FeatureCommitIndex":
+        tip = get_resolver(repo).resolve(branch, object_type="commit")
+        if tip is None:
+            raise git.GitCommandError(["git", "rev-parse", branch], 128)
+        return cls.from_pairs(read_feature_commit_pairs(repo, tip), tip)
+
+    def pairs(self) -> Iterable[tuple[str, str]]:
+        for row in range(len(self)):
+            commit = self._records[row].hex()
+            for feature_id in self._feature_ids_of_row(row):
+                yield self.features[feature_id], commit
+
+    def with_pairs(
+        self, pairs: Iterable[tuple[str, str]], tip: str
+    ) -> "FeatureCommitIndex":
+        """
+        New index with additional (feature, full commit id) pairs. The new
+        relations are merged into the sorted commit ids and the CSR arrays:
+        unchanged runs of rows are copied as slices, so the cost grows with the
+        size of the arrays but not with a rebuild of the relation.
+        """
+        added: dict[bytes, set[str]] = {}
+        for feature, commit in pairs:
+            if not self.has_feature(commit, feature):
+                added.setdefault(bytes.fromhex(commit.lower()), set()).add(
+                    feature
+                )
+        if not added:
+            return FeatureCommitIndex(
+                tip,
+                self.features,
+                self.commits,
+                self.commit_offsets,
+                self.commit_features,
+                self.feature_offsets,
+                self.feature_commits,
+            )
+        new_names = {
+            f for fs in added.values() for f in fs
+        } - self.feature_ids.keys()
+        features = (
+            sorted([*self.features, *new_names]) if new_names else self.features
+        )
+        feature_ids = {feature: i for i, feature in enumerate(features)}
+        old_features = self.commit_features
+        if new_names:
+            # sorted insertion keeps the order of the old ids, so rows stay
+            # sorted
+            renumber = array(
+                "I", (feature_ids[feature] for feature in self.features)
+            )
+            old_features = array("I", map(renumber.__getitem__, old_features))
+
+        # (old row, new commit or None for an existing row) in row order
+        events = []
+        for oid in sorted(added):
+            row = bisect_left(self._records, oid)
+            exists = row < len(self) and self._records[row] == oid
+            events.append((row, None if exists else oid, oid))
+        commits = []
+        new_row_of_old = array("I")
+        commit_offsets = array("I", [0])
+        commit_features = array("I")
+        extra_rows: dict[int, list[int]] = {}
+        copied = 0
+
+        def copy_rows(end: int):
+            nonlocal copied
+            if end <= copied:
+                return
+            start_offset = self.commit_offsets[copied]
+            shift = commit_offsets[-1] - start_offset
+            commits.append(self.commits[copied * OID_SIZE : end * OID_SIZE])
+            new_start = len(commit_offsets) - 1
+            new_row_of_old.extend(range(new_start, new_start + end - copied))
+            commit_offsets.extend(
+                map(
+                    add,
+                    self.commit_offsets[copied + 1 : end + 1],
+                    repeat(shift),
+                )
+            )
+            commit_features.extend(
+                old_features[start_offset : self.commit_offsets[end]]
+            )
+            copied = end
+
+        for row, new_oid, oid in events:
+            copy_rows(row)
+            new_row = len(commit_offsets) - 1
+            new_ids = {feature_ids[feature] for feature in added[oid]}
+            for feature_id in new_ids:
+                extra_rows.setdefault(feature_id, []).append(new_row)
+            ids = set(new_ids)
+            if new_oid is None:
+                # existing commit with new features
+                new_row_of_old.append(new_row)
+                start, end = (
+                    self.commit_offsets[row],
+                    self.commit_offsets[row + 1],
+                )
+                ids.update(old_features[start:end])
+                copied = row + 1
+            commits.append(oid)
+            commit_features.extend(sorted(ids))
+            commit_offsets.append(len(commit_features))
+        copy_rows(len(self))
+
+        if len(commit_offsets) - 1 == len(self):
+            # no new commits, the rows did not move
+            rows = self.feature_commits
+        else:
+            rows = array(
+                "I", map(new_row_of_old.__getitem__, self.feature_commits)
+            )
+        feature_offsets = array("I", [0])
+        feature_commits = array("I")
+        for feature_id, feature in enumerate(features):
+            old_id = self.feature_ids.get(feature)
+            feature_rows = (
+                rows[
+                    self.feature_offsets[old_id] : self.feature_offsets[
+                        old_id + 1
+                    ]
+                ]
+                if old_id is not None
+                else array("I")
+            )
+            if feature_id in extra_rows:
+                feature_rows = sorted([*feature_rows, *extra_rows[feature_id]])
+            feature_commits.extend(feature_rows)
+            feature_offsets.append(len(feature_commits))
+        return FeatureCommitIndex(
+            tip,
+            features,
+            b"".join(commits),
+            commit_offsets,
+            commit_features,
+            feature_offsets,
+            feature_commits,
+        )
+
+    # commit rows
+
+    def row_of(self, commit: str) -> Optional[int]:
+        """
+        Row of a full or abbreviated hex commit id, None if it is unknown or
+        ambiguous.
+        """
+        commit = commit.lower()
+        if len(commit) == 2 * OID_SIZE:
+            oid = bytes.fromhex(commit)
+            row = bisect_left(self._records, oid)
+            if row < len(self) and self._records[row] == oid:
+                return row
+            return None
+        try:
+            row = bisect_left(
+                self._records, bytes.fromhex(commit[: len(commit) // 2 * 2])
+            )
+        except ValueError:
+            return None
+        matches = []
+        while row < len(self) and self._records[row].hex().startswith(commit):
+            matches.append(row)
+            row += 1
+            if len(matches) > 1:
+                return None
+        return matches[0] if matches else None
+
+    def commit_of_row(self, row: int) -> str:
+        return self._records[row].hex()
+
+    def _feature_ids_of_row(self, row: int) -> array:
+        return self.commit_features[
+            self.commit_offsets[row] : self.commit_offsets[row + 1]
+        ]
+
+    def _rows_of_feature(self, feature_id: int) -> array:
+        return self.feature_commits[
+            self.feature_offsets[feature_id] : self.feature_offsets[
+                feature_id + 1
+            ]
+        ]
+
+    # bitsets over commit rows
+
+    def mask_of_rows(self, rows: Iterable[int]) -> int:
+        bits = bytearray((len(self) + 7) // 8)
+        for row in rows:
+            bits[row >> 3] |= 1 << (row & 7)
+        return int.from_bytes(bits, "little")
+
+    def rows_of_mask(self, mask: int) -> list[int]:
+        rows = []
+        for byte_index, byte in enumerate(
+            mask.to_bytes((len(self) + 7) // 8, "little")
+        ):
+            while byte:
+                low = byte & -byte
+                rows.append(byte_index * 8 + low.bit_length() - 1)
+                byte ^= low
+        return rows
+
+    def mask_of_commits(self, commits: Iterable[str]) -> int:
+        """
+        Bitset of the given commits, commits without facts are left out.
+        """
+        return self.mask_of_rows(
+            row
+            for row in (self.row_of(commit) for commit in commits)
+            if row is not None
+        )
+
+    def commit_mask(self, feature: str) -> int:
+        """
+        Bitset of the commits with facts for a feature.
+        """
+        feature_id = self.feature_ids.get(feature)
+        if feature_id is None:
+            return 0
+        return self.mask_of_rows(self._rows_of_feature(feature_id))
+
+    def commits_of_mask(self, mask: int) -> list[str]:
+        return [self._records[row].hex() for row in self.rows_of_mask(mask)]
+
+    # queries
+
+    def commits_of_feature(self, feature: str) -> list[str]:
+        """
+        Full ids of the commits with facts for a feature, sorted by id.
+        """
+        feature_id = self.feature_ids.get(feature)
+        if feature_id is None:
+            return []
+        return [
+            self._records[row].hex()
+            for row in self._rows_of_feature(feature_id)
+        ]
+
+    def features_of_commit(self, commit: str) -> list[str]:
+        """
+        Sorted feature names with facts for a full or abbreviated commit id.
+        """
+        row = self.row_of(commit)
+        if row is None:
+            return []
+        return [
+            self.features[feature_id]
+            for feature_id in self._feature_ids_of_row(row)
+        ]
+
+    def features_of_commits(
+        self, commits: Iterable[str]
+    ) -> dict[str, list[str]]:
+        return {commit: self.features_of_commit(commit) for commit in commits}
+
+    def has_feature(self, commit: str, feature: str) -> bool:
+        row = self.row_of(commit)
+        feature_id = self.feature_ids.get(feature)
+        if row is None or feature_id is None:
+            return False
+        return feature_id in self._feature_ids_of_row(row)
+
+    def commits_with_any(self, features: Iterable[str]) -> int:
+        mask = 0
+        for feature in features:
+            mask |= self.commit_mask(feature)
+        return mask
+
+    def commits_with_all(self, features: Iterable[str]) -> int:
+        mask = (1 << len(self)) - 1
+        for feature in features:
+            mask &= self.commit_mask(feature)
+        return mask
+
+    # persistence
+
+    def save(self, path: Path):
+        features = json.dumps(self.features).encode("utf-8")
+        with atomic_write(path) as f:
+            f.write(
+                _HEADER.pack(
+                    _MAGIC,
+                    INDEX_FORMAT_VERSION,
+                    self.tip.encode("ascii"),
+                    len(features),
+                    len(self),
+                    self.relation_count,
+                )
+            )
+            f.write(features)
+            f.write(self.commits)
+            for values in (
+                self.commit_offsets,
+                self.commit_features,
+                self.feature_offsets,
+                self.feature_commits,
+            ):
+                f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureCommitIndex":
+        with path.open("rb") as f:
+            magic, version, tip, features_size, commit_count, relation_count = (
+                _HEADER.unpack(f.read(_HEADER.size))
+            )
+            if magic != _MAGIC or version != INDEX_FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} is not a feature index of this version"
+                )
+            features = json.loads(f.read(features_size).decode("utf-8"))
+            commits = f.read(commit_count * OID_SIZE)
+            arrays = []
+            for count in (
+                commit_count + 1,
+                relation_count,
+                len(features) + 1,
+                relation_count,
+            ):
+                values = array("I")
+                data = f.read(count * values.itemsize)
+                if len(data) != count * values.itemsize:
+                    raise ValueError(f"{path} is truncated")
+                values.frombytes(data)
+                arrays.append(values)
+        return cls(tip.decode("ascii"), features, commits, *arrays)
+
+
+def get_feature_index(
+    repo: git.Repo, branch: str = FEATURE_BRANCH_NAME, use_cache: bool = True
+) -> FeatureCommitIndex:
+    """
+    Feature index of the current tip of the metadata branch. The cached index is
+    reused if the branch did not move and updated with the facts added since
+    otherwise; it is rebuilt if facts were removed.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        branch (str): Metadata branch
+        use_cache (bool): Set to False to always read the whole branch
+
+    Returns:
+        FeatureCommitIndex: The index, empty if the branch does not exist
+    """
+    tip = get_resolver(repo).resolve(
+        f"refs/heads/{branch}", object_type="commit"
+    )
+    if tip is None:
+        return FeatureCommitIndex.from_pairs([], "0" * 2 * OID_SIZE)
+    cache_file = get_state_dir(repo).joinpath(INDEX_FILE_NAME)
+    index = None
+    if use_cache and cache_file.exists():
+        try:
+            index = FeatureCommitIndex.load(cache_file)
+        except (OSError, ValueError, struct.error):
+            index = None
+    if index is not None and index.tip == tip:
+        return index
+    pairs = None
+    if index is not None:
+        try:
+            pairs = read_changed_feature_commit_pairs(repo, index.tip, tip)
+        except git.GitCommandError:
+            # the cached tip is gone, e.g. after a compaction
+            pairs = None
+    if pairs is None:
+        index = FeatureCommitIndex.from_pairs(
+            read_feature_commit_pairs(repo, tip), tip
+        )
+    else:
+        index = index.with_pairs(pairs, tip)
+    if use_cache:
+        index.save(cache_file)
+    return index
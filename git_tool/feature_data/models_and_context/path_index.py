@@ -0,0 +1,168 @@
+"""
+Paths touched by the commits that have facts, so the features of many paths can
+be looked up without one git log per path. A path maps to the commits with facts
+that changed it, the features come from the feature index at query time, so new
+facts for known commits need no update. The index is cached per tip of the
+metadata branch in the tool state; when the branch moves, only the files of
+commits that are new in the feature index are listed.
+
+Unlike get_features_for_file, commits of every branch count, not only the
+history of the current branch. Commits that are not available locally are picked
+up once they are fetched and the metadata branch moves.
+"""
+
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+import git
+
+from git_tool.feature_data.models_and_context.feature_index import (
+    FeatureCommitIndex,
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.utils.atomic_file import atomic_write
+from git_tool.feature_data.utils.git_streams import iter_git_records
+from git_tool.feature_data.utils.object_names import get_resolver
+
+PATH_INDEX_FILE_NAME = "path-index.json"
+PATH_INDEX_FORMAT_VERSION = 1
+
+
+class PathFeatureIndex:
+    def __init__(
+        self, tip: str, commits: list[str], paths: dict[str, list[int]]
+    ):
+        """
+        Args:
+            tip (str): Metadata revision of the feature index the paths were
+                listed for
+            commits (list[str]): Full ids of the listed commits
+            paths (dict[str, list[int]]): Path -> positions in commits of the
+                commits changing it
+        """
+        self.tip = tip
+        self.commits = commits
+        self.paths = paths
+
+    def commits_of_path(self, path: str) -> list[str]:
+        return [self.commits[i] for i in self.paths.get(path, [])]
+
+    def features_of_path(
+        self, path: str, feature_index: FeatureCommitIndex
+    ) -> list[str]:
+        """
+        Sorted feature folders with facts for commits that changed the path.
+        """
+        return sorted(
+            {
+                feature
+                for commit in self.commits_of_path(path)
+                for feature in feature_index.features_of_commit(commit)
+            }
+        )
+
+    def with_commits(
+        self, repo: git.Repo, commits: Iterable[str], tip: str
+    ) -> "PathFeatureIndex":
+        """
+        New index that also contains the paths of the given commits. Unknown
+        commits are left out.
+        """
+        known = set(self.commits)
+        resolved = get_resolver(repo).resolve_many(
+            (commit for commit in commits if commit not in known),
+            object_type="commit",
+        )
+        all_commits = list(self.commits)
+        paths = {
+            path: list(positions) for path, positions in self.paths.items()
+        }
+        if resolved:
+            positions = {}
+            current = None
+            for token in iter_git_records(
+                repo,
+                "log",
+                "--no-walk=unsorted",
+                "-z",
+                "--name-only",
+                "--format=%H",
+                "--stdin",
+                stdin_lines=set(resolved.values()),
+            ):
+                token = token.lstrip("\n")
+                if token in resolved and token not in positions:
+                    positions[token] = current = len(all_commits)
+                    all_commits.append(token)
+                elif token and current is not None:
+                    paths.setdefault(token, []).append(current)
+        return PathFeatureIndex(tip, all_commits, paths)
+
+    def save(self, path: Path):
+        with atomic_write(path) as f:
+            f.write(
+                json.dumps(
+                    {
+                        "version": PATH_INDEX_FORMAT_VERSION,
+                        "tip": self.tip,
+                        "commits": self.commits,
+                        "paths": self.paths,
+                    },
+                    separators=(",", ":"),
+                ).encode("utf-8")
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "PathFeatureIndex":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != PATH_INDEX_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a path index of this version")
+        return cls(data["tip"], data["commits"], data["paths"])
+
+
+def get_path_index(
+    repo: git.Repo,
+    feature_index: Optional[FeatureCommitIndex] = None,
+    branch: str = FEATURE_BRANCH_NAME,
+    use_cache: bool = True,
+) -> PathFeatureIndex:
+    """
+    Path index for the current feature index, read from the cache and updated if
+    needed.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        feature_index (Optional[FeatureCommitIndex]): Current feature index,
+            read if not given
+        branch (str): Metadata branch
+        use_cache (bool): Set to False to always list the files of all commits
+
+    Returns:
+        PathFeatureIndex: The index
+    """
+    if feature_index is None:
+        feature_index = get_feature_index(repo, branch)
+    cache_file = get_state_dir(repo).joinpath(PATH_INDEX_FILE_NAME)
+    index = PathFeatureIndex("", [], {})
+    if use_cache and cache_file.exists():
+        try:
+            index = PathFeatureIndex.load(cache_file)
+        except (OSError, ValueError, KeyError):
+            index = PathFeatureIndex("", [], {})
+    if index.tip == feature_index.tip:
+        return index
+    # files of a commit never change, only commits new to the feature index are
+    # listed
+    index = index.with_commits(
+        repo,
+        (feature_index.commit_of_row(row) for row in range(len(feature_index))),
+        feature_index.tip,
+    )
+    if use_cache:
+        index.save(cache_file)
+    return index
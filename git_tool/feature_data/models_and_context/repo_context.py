@@ -1,15 +1,20 @@
 from datetime import datetime, timedelta
 import os
-import tempfile
+import subprocess
 from contextlib import contextmanager
 from functools import wraps
 from pathlib import Path
-from typing import Generator, Iterable, Tuple
+from typing import Generator, Iterable, Optional, Tuple
 
 import git
 from dotenv import load_dotenv
 import typer
 
+from git_tool.feature_data.utils.git_streams import (
+    iter_log_commits,
+    iter_tree_names,
+)
+
 load_dotenv(Path(__file__).parents[1].joinpath(".env").absolute())
 FEATURE_BRANCH_NAME = os.getenv("BRANCH_NAME", "feature-metadata")
 # FEATURE_BRANCH_NAME = "feature6-metadata"
@@ -19,6 +24,23 @@ assert FEATURE_BRANCH_NAME is not None
 assert MAIN_BRANCH_NAME is not None
 assert REPO_PATH is not None
 
+_active_repo_path = REPO_PATH
+
+
+def get_repo_path() -> str:
+    """
+    Path of the repository that repo_context opens by default. This is REPO_PATH
+    unless another repository was activated with set_repo_path, e.g. in a worker
+    process that analyses several repositories.
+    """
+    return _active_repo_path
+
+
+def set_repo_path(repo_path: str):
+    global _active_repo_path
+    _active_repo_path = repo_path
+
+
 # print(f"FEATURE_BRANCH_NAME: {FEATURE_BRANCH_NAME}")
 # print(f"MAIN_BRANCH_NAME: {MAIN_BRANCH_NAME}")
 # print(f"REPO_PATH: {REPO_PATH}")
@@ -34,87 +56,234 @@ def create_empty_branch(branch_name: str, repo: git.Repo) -> str:
         repo (git.Repo): The Git repository object.
 
     Returns:
-        str: The fast-import script as a string.
+        str: The id of the initial commit, empty if the branch could not be
+            created.
     """
+    # imported here, fast_import_utils depends on this module
+    from git_tool.feature_data.utils.fast_import_utils import FastImportWriter
+
     timestamp = int(datetime.now().timestamp())
     committer_name = os.getenv("GIT_COMMITTER_NAME", "Unknown")
     committer_email = os.getenv("GIT_COMMITTER_EMAIL", "unknown@example.com")
 
-    result = []
-    result.append(f"commit refs/heads/{branch_name}")
-    result.append(
-        f"committer {committer_name} <{committer_email}> {timestamp} +0000"
-    )
-    result.append("data <<EOM")
-    result.append(f"Initial empty commit for {branch_name}")
-    result.append("EOM")
-
-    fast_import_script = "\n".join(result)
-
     try:
-        with tempfile.NamedTemporaryFile(
-            delete=False, mode="w", encoding="utf-8", newline="\n"
-        ) as temp_file:
-            temp_file.write(fast_import_script)
-            temp_file_path = temp_file.name
-
-        with open(temp_file_path, "r", encoding="utf-8") as file:
-            repo.git.fast_import(istream=file)
-            try:
-                repo.git.push("-u", "origin", branch_name)
-            except Exception:
-                ...
-                # If origin is not defined yet, I can't set an upstream. Will need to do this manually elsewhere
+        with FastImportWriter(repo, export_marks=True) as writer:
+            mark = writer.write_commit(
+                f"refs/heads/{branch_name}",
+                f"{committer_name} <{committer_email}> {timestamp} +0000",
+                f"Initial empty commit for {branch_name}\n",
+            )
+        try:
+            repo.git.push("-u", "origin", branch_name)
+        except Exception:
+            ...
+            # If origin is not defined yet, I can't set an upstream. Will need
+            # to do this manually elsewhere
         print(f"Branch {branch_name} successfully created.")
+        return writer.marks[mark]
     except Exception as e:
         print(f"Error while creating branch: {e}")
-    finally:
-        if temp_file_path:
-            os.remove(temp_file_path)
-
-    return fast_import_script
-
-HOME_DIR = os.path.expanduser("~")
-TIMESTAMP_FILE = os.path.join(HOME_DIR, ".feature_branch_timestamp.txt")
-def get_last_execution_time():
-    if os.path.exists(TIMESTAMP_FILE):
-        with open(TIMESTAMP_FILE, 'r') as f:
-            try:
-                return datetime.fromisoformat(f.read().strip())
-            except ValueError:
-                return None  
+        return ""
+
+# Refresh policy for the metadata branch. FEATURE_METADATA_MAX_AGE is the number
+# of minutes the local copy is considered fresh. FEATURE_METADATA_REFRESH
+# decides what happens once it is stale:
+#   background -> start "git fetch" detached and continue on the local copy
+#                 (default)
+#   sync       -> fetch before the command continues
+#   never      -> never fetch automatically, e.g. when working offline
+FEATURE_METADATA_MAX_AGE = timedelta(
+    minutes=float(os.getenv("FEATURE_METADATA_MAX_AGE", "5"))
+)
+FEATURE_METADATA_REFRESH = os.getenv("FEATURE_METADATA_REFRESH", "background")
+REFRESH_MODES = ("background", "sync", "never")
+# Opt-in partial fetch of the metadata branch, e.g. "blob:none". Structure
+# queries only need trees, fact blobs are fetched in batches when they are read
+# (see partial_fetch.py).
+FEATURE_METADATA_FILTER = os.getenv("FEATURE_METADATA_FILTER", "")
+# remote for a partial fetch of the metadata branch, see metadata_fetch_args
+METADATA_REMOTE_NAME = "feature-tool-metadata"
+STATE_DIR_NAME = "feature-tool"
+TIMESTAMP_FILE_NAME = "last_metadata_fetch"
+
+
+def get_state_dir(repo: git.Repo) -> Path:
+    """
+    Directory inside the git dir that holds the internal state of this tool
+    for one repository. Worktrees share the state of their main repository.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+
+    Returns:
+        Path: Existing directory for the tool state
+    """
+    state_dir = Path(repo.common_dir).joinpath(STATE_DIR_NAME)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def get_last_execution_time(repo: git.Repo) -> datetime | None:
+    timestamp_file = get_state_dir(repo).joinpath(TIMESTAMP_FILE_NAME)
+    if timestamp_file.exists():
+        try:
+            return datetime.fromisoformat(timestamp_file.read_text().strip())
+        except ValueError:
+            return None
     return None
 
-def update_last_execution_time():
-    with open(TIMESTAMP_FILE, 'w') as f:
-        f.write(datetime.now().isoformat())
-        
+
+def update_last_execution_time(repo: git.Repo):
+    get_state_dir(repo).joinpath(TIMESTAMP_FILE_NAME).write_text(
+        datetime.now().isoformat()
+    )
+
+
+def is_metadata_stale(
+    repo: git.Repo, max_age: timedelta = FEATURE_METADATA_MAX_AGE
+) -> bool:
+    last_execution_time = get_last_execution_time(repo)
+    return last_execution_time is None or (
+        (datetime.now() - last_execution_time) > max_age
+    )
+
+
+def metadata_fetch_args(
+    repo: git.Repo,
+    remote_name: str = "origin",
+    branch: str = FEATURE_BRANCH_NAME,
+    filter_spec: str = FEATURE_METADATA_FILTER,
+) -> list[str]:
+    """
+    Arguments of git fetch that update refs/remotes/<remote_name>/<branch> from
+    the remote.
+
+    A filtered fetch makes git mark its remote as promisor and apply the filter
+    to every later fetch from it. With a filter_spec the metadata branch is
+    therefore fetched through the dedicated remote METADATA_REMOTE_NAME, which
+    has the URL of remote_name but only the metadata refspec, so fetches of code
+    from remote_name stay complete.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        remote_name (str): Remote that holds the metadata branch
+        branch (str): Metadata branch
+        filter_spec (str): Filter for a partial fetch, e.g. "blob:none", or ""
+
+    Returns:
+        list[str]: Options, remote and refspec
+    """
+    refspec = f"+refs/heads/{branch}:refs/remotes/{remote_name}/{branch}"
+    if not filter_spec:
+        return [remote_name, refspec]
+    try:
+        url = repo.git.remote("get-url", remote_name)
+    except git.GitCommandError:
+        # no such remote, the fetch fails like without a filter
+        return [remote_name, refspec]
+    section = f'remote "{METADATA_REMOTE_NAME}"'
+    # git fetch --all only fetches the code remotes
+    values = {"url": url, "fetch": refspec, "skipFetchAll": "true"}
+    reader = repo.config_reader("repository")
+    if any(
+        reader.get(section, key, fallback=None) != value
+        for key, value in values.items()
+    ):
+        # the config is only rewritten when the remote is missing or changed
+        config = repo.config_writer()
+        try:
+            for key, value in values.items():
+                config.set_value(section, key, value)
+        finally:
+            config.release()
+    return [f"--filter={filter_spec}", METADATA_REMOTE_NAME, refspec]
+
+
+def fetch_feature_branch_in_background(repo: git.Repo) -> subprocess.Popen:
+    """
+    Start "git fetch" for the metadata branch as a detached process. The
+    foreground command keeps working on the local copy and picks up the result
+    next time: besides the remote-tracking ref, the fetch fast-forwards the
+    local branch. A local branch with facts that are not pushed yet is left as
+    it is, git fetch refuses to update it without "+" in the refspec.
+    """
+    local_ref = f"refs/heads/{FEATURE_BRANCH_NAME}"
+    return subprocess.Popen(
+        [
+            "git",
+            "fetch",
+            "--quiet",
+            *metadata_fetch_args(repo),
+            f"{local_ref}:{local_ref}",
+        ],
+        cwd=repo.working_dir,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def refresh_feature_branch(
+    repo: git.Repo,
+    mode: str = FEATURE_METADATA_REFRESH,
+    max_age: timedelta = FEATURE_METADATA_MAX_AGE,
+):
+    """
+    Make sure the metadata branch exists locally and refresh it from origin
+    if the local copy is older than max_age.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        mode (str): One of REFRESH_MODES
+        max_age (timedelta): Age after which the local copy counts as stale
+    """
+    if mode not in REFRESH_MODES:
+        raise ValueError(
+            f"Unknown refresh mode {mode}. Use one of {REFRESH_MODES}"
+        )
+    if FEATURE_BRANCH_NAME not in repo.heads:
+        # Without a local branch there is nothing to read, so this part is
+        # always synchronous
+        try:
+            repo.git.branch(
+                FEATURE_BRANCH_NAME, f"origin/{FEATURE_BRANCH_NAME}"
+            )
+            typer.echo(
+                f"Branch {FEATURE_BRANCH_NAME} created locally from origin."
+            )
+        except git.GitCommandError:
+            typer.echo(
+                f"Branch {FEATURE_BRANCH_NAME} does not exist on origin. "
+                "Creating an empty branch."
+            )
+            create_empty_branch(FEATURE_BRANCH_NAME, repo)
+    if mode == "never" or not is_metadata_stale(repo, max_age):
+        return
+    update_last_execution_time(repo)
+    if mode == "background":
+        fetch_feature_branch_in_background(repo)
+        return
+    try:
+        typer.echo("Fetching new feature-metadata")
+        repo.git.fetch(*metadata_fetch_args(repo))
+    except git.GitCommandError:
+        print("Origin does not have ", FEATURE_BRANCH_NAME)
+
+
 def ensure_feature_branch(func):
     """
     Decorator to ensure that the feature branch is created if it does not exist.
-    This will only be executed once, even if the context manager is called multiple times.
+    The metadata is refreshed according to FEATURE_METADATA_REFRESH at most once
+    per FEATURE_METADATA_MAX_AGE for each repository, even if the context
+    manager is called multiple times.
     """
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        last_execution_time = get_last_execution_time()
-        repo = git.Repo(REPO_PATH)
-        current_time = datetime.now()
-        # print("Executing ensure feautre branch")
-        if last_execution_time is None or ((current_time- last_execution_time) > timedelta(minutes=5)):
-            update_last_execution_time()
-            if FEATURE_BRANCH_NAME not in repo.heads:
-                try:
-                    repo.git.branch(FEATURE_BRANCH_NAME, f"origin/{FEATURE_BRANCH_NAME}")
-                    typer.echo(f"Branch {FEATURE_BRANCH_NAME} created locally from origin.")
-                except git.GitCommandError:
-                    typer.echo(f"Branch {FEATURE_BRANCH_NAME} does not exist on origin. Creating an empty branch.")
-                    create_empty_branch(FEATURE_BRANCH_NAME, repo)
-            try:
-                typer.echo("Fetching new feature-metadata")
-                repo.git.fetch("origin", FEATURE_BRANCH_NAME)
-            except:
-                print("Origin does not have ", FEATURE_BRANCH_NAME)
+        repo_path = kwargs.get("repo_path", args[0] if args else None)
+        repo = git.Repo(repo_path or get_repo_path())
+        refresh_feature_branch(repo)
         return func(*args, **kwargs)
 
     return wrapper
@@ -122,8 +291,8 @@ def ensure_feature_branch(func):
 
 @ensure_feature_branch
 @contextmanager
-def repo_context(repo_path=REPO_PATH):
-    repo = git.Repo(repo_path)
+def repo_context(repo_path: Optional[str] = None):
+    repo = git.Repo(repo_path or get_repo_path())
     try:
         yield repo
     finally:
@@ -132,7 +301,7 @@ def repo_context(repo_path=REPO_PATH):
 
 @contextmanager
 def branch_folder_list(
-    branch: str = FEATURE_BRANCH_NAME, repo_path: str = REPO_PATH
+    branch: str = FEATURE_BRANCH_NAME, repo_path: Optional[str] = None
 ) -> Generator[Tuple[Iterable[Path], git.Repo], None, None]:
     """
     Get all folders in a branch. Standard is to list all feature folders
@@ -140,7 +309,8 @@ def branch_folder_list(
 
     Args:
         branch (str): Branch that is analysed for folders
-        repo_path (str): Path to git repo
+        repo_path (Optional[str]): Path to git repo, defaults to the active
+            repository
 
     Yields:
         Tuple[Iterable[Path], git.Repo]: A tuple where the first element is an
@@ -148,9 +318,9 @@ def branch_folder_list(
     """
     with repo_context(repo_path) as repo:
         try:
-            feature_folders = repo.git.ls_tree(
-                "-d", "--name-only", branch
-            ).split("\n")
+            feature_folders = list(
+                iter_tree_names(repo, branch, directories_only=True)
+            )
             yield feature_folders, repo
         finally:
             pass
@@ -166,7 +336,7 @@ def sync_feature_branch():
         remote_name = "origin" 
         try:
             print(f"Fetching {FEATURE_BRANCH_NAME} from {remote_name}")
-            repo.git.fetch(remote_name, FEATURE_BRANCH_NAME)
+            repo.git.fetch(*metadata_fetch_args(repo, remote_name))
         except Exception as e:
             print(f"Error fetching the branch: {e}")
             return
@@ -190,14 +360,14 @@ def get_yes_no_input(prompt: str) -> bool:
             print("Please enter 'yes' or 'no'.")
 
 
-def get_all_commits() -> list[str]:
+def get_all_commits() -> Generator[str, None, None]:
+    """
+    Ids of all commits of all refs except the metadata branch, streamed from git
+    log.
+    """
     with repo_context() as repo:
         not_string = f"^refs/heads/{FEATURE_BRANCH_NAME}"
-        all_commits = repo.git.log(
-            "--all", not_string, "--no-merges", "--pretty=format:%H"
-        )
-        commit_list = all_commits.splitlines()
-        return commit_list
+        yield from iter_log_commits(repo, "--all", not_string, "--no-merges")
 
 
 def get_commit_title(commit_id: str) -> str:
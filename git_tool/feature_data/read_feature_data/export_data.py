@@ -0,0 +1,336 @@
+"""
+Export every fact of the metadata branch into one table for offline analytics.
+
+The fact files are listed with a streamed ls-tree and read in batches through
+one long-running git cat-file --batch process. Every batch becomes one row group
+(Parquet), record batch (Arrow) or block of lines (CSV, JSONL), so memory stays
+bounded by the batch size and not by the history. Parquet and Arrow need
+pyarrow, CSV and JSONL are written gzip compressed.
+"""
+
+import csv
+import gzip
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Generator, Iterable, NamedTuple, Optional
+
+import git
+from pydantic import ValidationError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, install git_tool[analytics]
+    pa = None
+    pq = None
+
+from git_tool.feature_data.git_status_per_feature import (
+    get_feature_name_from_folder,
+)
+from git_tool.feature_data.models_and_context.fact_model import FeatureFactModel
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data.partial_fetch import (
+    prefetch_fact_blobs,
+)
+from git_tool.feature_data.utils.git_streams import (
+    BlobReader,
+    iter_git_records,
+    iter_tree_entries,
+)
+from git_tool.feature_data.utils.object_names import get_resolver
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "csv": ".csv.gz",
+    "jsonl": ".jsonl.gz",
+}
+EXPORT_COLUMNS = [
+    "commit",
+    "feature_uuid",
+    "feature_name",
+    "authors",
+    "date",
+    "change_types",
+    "files",
+]
+
+
+class ExportDependencyMissingException(Exception): ...
+
+
+class FactFile(NamedTuple):
+    oid: str
+    path: str
+
+
+class ExportResult(NamedTuple):
+    rows: int
+    skipped: int
+
+
+def default_export_format() -> str:
+    return "parquet" if pa is not None else "csv"
+
+
+def infer_export_format(
+    output: Optional[Path] = None, export_format: Optional[str] = None
+) -> str:
+    """
+    Format of an export: the given one, else the one of the file extension of
+    the output, else the default format.
+
+    Raises:
+        ValueError: The format is unknown or the extension of the output names
+            another format
+    """
+    if export_format is not None and export_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Unknown format {export_format}. Use one of "
+            f"{', '.join(EXPORT_FORMATS)}."
+        )
+    suffix_format = None
+    if output is not None:
+        suffix_format = next(
+            (
+                f
+                for f, suffix in EXPORT_FORMATS.items()
+                if output.name.endswith(suffix)
+            ),
+            None,
+        )
+    if export_format and suffix_format and export_format != suffix_format:
+        raise ValueError(
+            f"{output} has the extension of {suffix_format}, not of "
+            f"{export_format}."
+        )
+    return export_format or suffix_format or default_export_format()
+
+
+def _iter_fact_files(
+    repo: git.Repo, branch: str
+) -> Generator[FactFile, None, None]:
+    for entry in iter_tree_entries(repo, branch, recursive=True):
+        if entry.object_type == "blob" and entry.path.count("/") == 2:
+            yield FactFile(entry.oid, entry.path)
+
+
+def _batches(
+    items: Iterable[Any], size: int
+) -> Generator[list[Any], None, None]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _files_of_commits(
+    repo: git.Repo, commits: set[str]
+) -> dict[str, list[str]]:
+    """
+    Files touched by each commit, from one git log --no-walk call. Unknown
+    commits are left out.
+    """
+    resolved = get_resolver(repo).resolve_commits(commits)
+    if not resolved:
+        return {}
+    oids = set(resolved.values())
+    files: dict[str, list[str]] = {}
+    current = None
+    for token in iter_git_records(
+        repo,
+        "log",
+        "--no-walk=unsorted",
+        "-z",
+        "--name-only",
+        "--format=%H",
+        "--stdin",
+        stdin_lines=oids,
+    ):
+        token = token.lstrip("\n")
+        if token in oids:
+            current = token
+            files[current] = []
+        elif token and current is not None:
+            files[current].append(token)
+    return {name: files.get(oid, []) for name, oid in resolved.items()}
+
+
+def _fact_to_row(
+    fact: FeatureFactModel, folder: str, files: dict[str, list[str]]
+) -> dict[str, Any]:
+    return {
+        "commit": fact.commit,
+        "feature_uuid": folder,
+        "feature_name": get_feature_name_from_folder(folder),
+        "authors": list(fact.authors),
+        "date": fact.date.astimezone(timezone.utc),
+        "change_types": [
+            change.change_type.value for change in fact.changes.code_changes
+        ],
+        "files": files.get(fact.commit, []),
+    }
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ExportDependencyMissingException(
+            "Parquet and Arrow export need pyarrow. Install it with "
+            "'pip install git_tool[analytics]' or use --format csv."
+        )
+
+
+def _arrow_schema():
+    return pa.schema(
+        [
+            ("commit", pa.string()),
+            ("feature_uuid", pa.string()),
+            ("feature_name", pa.string()),
+            ("authors", pa.list_(pa.string())),
+            ("date", pa.timestamp("us", tz="UTC")),
+            ("change_types", pa.list_(pa.string())),
+            ("files", pa.list_(pa.string())),
+        ]
+    )
+
+
+def _text_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _TableWriter:
+    """
+    Writes the rows of one batch at a time in the chosen format.
+    """
+
+    def __init__(self, output: Path, export_format: str):
+        self.export_format = export_format
+        if export_format in ("parquet", "arrow"):
+            _require_pyarrow()
+            self.schema = _arrow_schema()
+            if export_format == "parquet":
+                self.writer = pq.ParquetWriter(
+                    output, self.schema, compression="zstd"
+                )
+            else:
+                self.writer = pa.ipc.new_file(str(output), self.schema)
+        else:
+            self.file: IO[str] = gzip.open(
+                output, "wt", encoding="utf-8", newline=""
+            )
+            if export_format == "csv":
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(EXPORT_COLUMNS)
+
+    def write_rows(self, rows: list[dict[str, Any]]):
+        if self.export_format == "parquet":
+            # every batch becomes one row group
+            self.writer.write_table(
+                pa.Table.from_pylist(rows, schema=self.schema)
+            )
+        elif self.export_format == "arrow":
+            self.writer.write_batch(
+                pa.RecordBatch.from_pylist(rows, schema=self.schema)
+            )
+        elif self.export_format == "csv":
+            # list columns are written as JSON arrays
+            self.writer.writerows(
+                [
+                    (
+                        json.dumps(row[c])
+                        if isinstance(row[c], list)
+                        else _text_value(row[c])
+                    )
+                    for c in EXPORT_COLUMNS
+                ]
+                for row in rows
+            )
+        else:
+            self.file.writelines(
+                json.dumps({c: _text_value(row[c]) for c in EXPORT_COLUMNS})
+                + "\n"
+                for row in rows
+            )
+
+    def close(self):
+        if self.export_format in ("parquet", "arrow"):
+            self.writer.close()
+        else:
+            self.file.close()
+
+
+def export_facts(
+    repo: git.Repo,
+    output: Path,
+    export_format: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    branch: str = FEATURE_BRANCH_NAME,
+) -> ExportResult:
+    """
+    Write one row per fact file of the metadata branch, i.e. one row per fact
+    and feature.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        output (Path): File to write
+        export_format (Optional[str]): One of EXPORT_FORMATS, defaults to the
+            format of the file extension of output, then to parquet if pyarrow
+            is installed, csv otherwise
+        batch_size (int): Facts read and written at once
+        branch (str): Metadata branch
+
+    Raises:
+        ExportDependencyMissingException: Parquet or Arrow was requested without
+            pyarrow
+        ValueError: See infer_export_format
+
+    Returns:
+        ExportResult: Number of written rows and of fact files that could not be
+            parsed
+    """
+    export_format = infer_export_format(output, export_format)
+    writer = _TableWriter(output, export_format)
+    reader = BlobReader(repo)
+    rows_written = skipped = 0
+    try:
+        for batch in _batches(_iter_fact_files(repo, branch), batch_size):
+            prefetch_fact_blobs(
+                repo, [fact_file.path for fact_file in batch], branch
+            )
+            facts = []
+            for fact_file, content in zip(
+                batch, reader.read([fact_file.oid for fact_file in batch])
+            ):
+                try:
+                    facts.append(
+                        (
+                            fact_file,
+                            FeatureFactModel.model_validate_json(
+                                content or b""
+                            ),
+                        )
+                    )
+                except ValidationError:
+                    skipped += 1
+            files = _files_of_commits(repo, {fact.commit for _, fact in facts})
+            rows = [
+                _fact_to_row(fact, fact_file.path.split("/", 1)[0], files)
+                for fact_file, fact in facts
+            ]
+            if rows:
+                writer.write_rows(rows)
+                rows_written += len(rows)
+    finally:
+        reader.close()
+        writer.close()
+    return ExportResult(rows_written, skipped)
@@ -0,0 +1,103 @@
+"""
+Changes between two revisions of the metadata branch, e.g. before and after a
+fetch or between the metadata of a base and a pull request. One git diff-tree
+call compares the trees of both revisions. Only the changed subtrees are
+visited, so the cost grows with the size of the change and not with the size of
+the branch. No fact blob is read.
+"""
+
+from typing import NamedTuple, Optional
+
+import git
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.utils.git_streams import iter_git_records
+from git_tool.feature_data.utils.object_names import get_resolver
+
+
+class FactPath(NamedTuple):
+    """
+    Location of one fact file on the metadata branch: <feature>/<commit>/<fact>
+    """
+
+    feature: str
+    commit: str
+    fact: str
+
+    @property
+    def path(self) -> str:
+        return f"{self.feature}/{self.commit}/{self.fact}"
+
+
+class MetadataDiff(NamedTuple):
+    old: str
+    new: str
+    added: list[FactPath]
+    removed: list[FactPath]
+
+    @property
+    def features(self) -> set[str]:
+        """
+        Features that gained or lost facts.
+        """
+        return {fact.feature for fact in self.added + self.removed}
+
+
+def _resolve_revision(repo: git.Repo, revision: Optional[str]) -> str:
+    if revision is None:
+        # the empty tree, i.e. a branch without any fact
+        return repo.git.hash_object("-t", "tree", "/dev/null")
+    tree = get_resolver(repo).resolve(
+        f"{revision}^{{tree}}", object_type="tree"
+    )
+    if tree is None:
+        raise git.GitCommandError(
+            ["git", "rev-parse", "--verify", f"{revision}^{{tree}}"], 128
+        )
+    return tree
+
+
+def read_metadata_diff(
+    repo: git.Repo, old: Optional[str], new: Optional[str] = FEATURE_BRANCH_NAME
+) -> MetadataDiff:
+    """
+    Facts that were added and removed between two revisions of the metadata
+    branch. A fact file whose content changed is reported as removed and added.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        old (Optional[str]): Old revision, None for a branch without facts
+        new (Optional[str]): New revision, defaults to the local metadata branch
+
+    Returns:
+        MetadataDiff: The resolved trees and the changed fact paths in path
+            order
+    """
+    old_tree = _resolve_revision(repo, old)
+    new_tree = _resolve_revision(repo, new)
+    fields = iter_git_records(
+        repo,
+        "diff-tree",
+        "-r",
+        "-z",
+        "--no-renames",
+        "--name-status",
+        "--diff-filter=ADM",
+        old_tree,
+        new_tree,
+    )
+    added, removed = [], []
+    # the same iterator twice pairs each status with the path after it
+    for status, path in zip(fields, fields):
+        parts = path.split("/", 2)
+        if len(parts) != 3:
+            # not a fact file, e.g. a readme at the root of the branch
+            continue
+        fact = FactPath(*parts)
+        if status in "AM":
+            added.append(fact)
+        if status in "DM":
+            removed.append(fact)
+    return MetadataDiff(old_tree, new_tree, added, removed)
@@ -4,16 +4,54 @@
 """
 
 import logging
-from typing import Generator, List, Optional, Set, Tuple
+import subprocess
+from itertools import islice
+from typing import List, Optional, Sequence, Set, Tuple
 
-from git import Commit
+from git import Commit, GitCommandError, Repo
 
 from git_tool.feature_data.models_and_context.fact_model import FeatureFactModel
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
 from git_tool.feature_data.models_and_context.repo_context import (
     FEATURE_BRANCH_NAME,
-    branch_folder_list,
     repo_context,
 )
+from git_tool.feature_data.sync_feature_data.partial_fetch import (
+    prefetch_fact_blobs,
+)
+from git_tool.feature_data.utils.git_streams import (
+    iter_log_commits,
+    iter_tree_names,
+)
+from git_tool.feature_data.utils.object_names import get_resolver
+
+
+# git log options that take their value as the next argument
+LOG_OPTIONS_WITH_VALUE = {
+    "-n",
+    "--max-count",
+    "--skip",
+    "--since",
+    "--after",
+    "--until",
+    "--before",
+    "--author",
+    "--committer",
+    "--grep",
+    "--exclude",
+    "--min-parents",
+    "--max-parents",
+    "-L",
+    "-S",
+    "-G",
+    "-O",
+}
+
+
+class FeatureNotFoundException(Exception): ...
+
 
 # Usages: FEATURE INFO-ALL
 def _get_feature_uuids() -> list[str]:
@@ -26,11 +64,9 @@ def _get_feature_uuids() -> list[str]:
         list[str]: UUIDs of Features
     """
     with repo_context() as repo:
-        folder_string = repo.git.ls_tree(
-            "-d", FEATURE_BRANCH_NAME, name_only=True
+        return list(
+            iter_tree_names(repo, FEATURE_BRANCH_NAME, directories_only=True)
         )
-        folders = folder_string.split()
-        return folders
 
 
 def _get_associated_files(feature_uuid: str, ref_commit: str) -> list[str]:
@@ -69,27 +105,128 @@ def get_metadata(
     return facts
 
 
-def get_feature_log(feature_uuid: str):
+def _split_log_arguments(
+    repo: Repo, log_args: Sequence[str]
+) -> Tuple[list[str], list[str]]:
+    """
+    Separate revision arguments (ranges, refs) from all other git log options.
+    Values of options like "-n 10" or "--author main" stay with their option,
+    everything after "--" is a path and stays with the options, too.
+
+    Returns:
+        Tuple[list[str], list[str]]: Resolved revisions (negative ones prefixed
+            with ^) and remaining options
+    """
+    revisions, options = [], []
+    args = iter(log_args)
+    for arg in args:
+        if arg == "--":
+            options.append(arg)
+            options.extend(args)
+            break
+        if arg in LOG_OPTIONS_WITH_VALUE:
+            options.append(arg)
+            options.extend(islice(args, 1))
+            continue
+        resolved = (
+            ""
+            if arg.startswith("-")
+            else repo.git.rev_parse("--revs-only", "--no-flags", arg)
+        )
+        if resolved:
+            revisions.extend(resolved.split())
+        else:
+            options.append(arg)
+    return revisions, options
+
+
+def get_feature_log(feature_uuid: str, log_args: Sequence[str] = ()) -> int:
     """
-    Output all commits from a feature to the command line.
-    # TODO Still need to incorpoarte all possible flags of git log somehow
+    Output all commits from a feature to the command line using git log. Commit
+    ids are streamed to "git log --no-walk --stdin", so the output goes through
+    the pager and neither the argv nor this process grows with the number of
+    commits. Revision ranges and git log options (--since, --author, -n, ...)
+    are passed through. With a revision like "main" or "v1..v2" the ids of all
+    commits of the feature are kept in a set while the commits of the range are
+    streamed, so memory grows with the history of the feature (about 100 bytes
+    per commit), not with the range.
 
     Args:
         feature_uuid (str): Reference for feature
+        log_args (Sequence[str]): Additional arguments for git log
+
+    Raises:
+        FeatureNotFoundException: The feature has no folder on the metadata
+            branch
+
+    Returns:
+        int: Exit code of git log
     """
-    commit_ids = [
-        fact.commit for fact in get_metadata(feature_uuid=feature_uuid)
-    ]
-    print(commit_ids)
     with repo_context() as repo:
-        print(
-            repo.git.log(
-                "--no-walk",
-                "--decorate",
-                "--color",
-                commit_ids,
-            )
+        if (
+            get_resolver(repo).resolve(f"{FEATURE_BRANCH_NAME}:{feature_uuid}")
+            is None
+        ):
+            raise FeatureNotFoundException(feature_uuid)
+        revisions, options = _split_log_arguments(repo, list(log_args))
+        positive = [rev for rev in revisions if not rev.startswith("^")]
+        negative = [rev for rev in revisions if rev.startswith("^")]
+        feature_commits = iter(
+            get_feature_index(repo).commits_of_feature(feature_uuid)
         )
+        if positive:
+            # Only commits reachable from the given revisions, streamed by
+            # rev-list in log order
+            wanted = {bytes.fromhex(commit) for commit in feature_commits}
+            walk = subprocess.Popen(
+                ["git", "rev-list", *revisions],
+                cwd=repo.working_dir,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            feature_commits = (
+                commit
+                for commit in (line.rstrip("\n") for line in walk.stdout)
+                if bytes.fromhex(commit) in wanted
+            )
+            no_walk = "--no-walk=unsorted"
+        else:
+            no_walk = "--no-walk"
+        log = None
+        try:
+            for commit in feature_commits:
+                if log is None:
+                    # git log without revisions would show HEAD, so it only
+                    # starts once there is a commit to show
+                    log = subprocess.Popen(
+                        [
+                            "git",
+                            "log",
+                            no_walk,
+                            "--decorate",
+                            "--stdin",
+                            *options,
+                        ],
+                        cwd=repo.working_dir,
+                        stdin=subprocess.PIPE,
+                        text=True,
+                    )
+                log.stdin.write(f"{commit}\n")
+            if log is None:
+                return 0
+            if not positive:
+                for rev in negative:
+                    log.stdin.write(f"{rev}\n")
+            log.stdin.close()
+        except BrokenPipeError:
+            # The pager was closed before all ids were written
+            pass
+        finally:
+            if positive:
+                walk.stdout.close()
+                walk.wait()
+        return log.wait()
+
 
 # Usages: compare_branches.py (potentially FEATURE BLAME)
 def get_features_touched_by_commit(commit: Commit) -> Set[str]:
@@ -102,12 +239,8 @@ def get_features_touched_by_commit(commit: Commit) -> Set[str]:
     Returns:
         Set[str]: Set of features touched by the commit.
     """
-    # Annahme: Diese Funktion wertet die Änderungen in einem Commit aus und extrahiert die Features.
-    feature_facts = extract_facts_from_commit(commit)
-    features = set()
-    for fact in feature_facts:
-        features.update(fact.features)
-    return features
+    with repo_context() as repo:
+        return set(get_feature_index(repo).features_of_commit(str(commit)))
 
 
 def get_feature_sets_for_branch(branch_name: str) -> List[Set[str]]:
@@ -121,12 +254,11 @@ def get_feature_sets_for_branch(branch_name: str) -> List[Set[str]]:
         List[Set[str]]: List of sets of features touched together in the branch.
     """
     with repo_context() as repo:
-        commits = list(repo.iter_commits(branch_name))
-        feature_sets = [
-            get_features_touched_by_commit(commit) for commit in commits
+        index = get_feature_index(repo)
+        return [
+            set(index.features_of_commit(commit))
+            for commit in iter_log_commits(repo, branch_name)
         ]
-    # TODO optimize: for each feature check for each commit if that commit is on the branch. else there will be redundant checks
-    return feature_sets
 
 
 def is_commit_compatible_with_branch(
@@ -183,20 +315,26 @@ def extract_facts_from_commit(commit: Commit) -> List[FeatureFactModel]:
         List[FeatureFactModel]: List of facts extracted from the commit.
     """
     facts = []
-    with branch_folder_list() as (features, repo):
-        for feature in features:
+    with repo_context() as repo:
+        fact_files = []
+        try:
+            # one listing of all fact files instead of one per feature
+            fact_files = [
+                path
+                for path in iter_tree_names(
+                    repo, FEATURE_BRANCH_NAME, recursive=True
+                )
+                if str(commit) in path
+            ]
+        except GitCommandError:
+            print("error")
+        # one batched fetch instead of one round-trip per fact on a partially
+        # fetched branch
+        prefetch_fact_blobs(repo, fact_files)
+        for file in fact_files:
             try:
-                commits = repo.git.ls_tree(
-                    "-r", "--name-only", FEATURE_BRANCH_NAME, feature
-                ).split()
-                associated_w_commit = [x for x in commits if str(commit) in x]
-                for file in associated_w_commit:
-                    file_content = repo.git.show(
-                        f"{FEATURE_BRANCH_NAME}:{file}"
-                    )
-                    facts.append(
-                        FeatureFactModel.model_validate_json(file_content)
-                    )
+                file_content = repo.git.show(f"{FEATURE_BRANCH_NAME}:{file}")
+                facts.append(FeatureFactModel.model_validate_json(file_content))
             except:
                 print("error")
     return facts
@@ -0,0 +1,188 @@
+"""
+Answer many queries over one warm session: the repository, the feature index,
+the path index and the object name resolver are opened once and reused for every
+query. Queries and answers are JSON objects, one per line, so scripts need
+neither one process per query nor to parse the output of the human readable
+commands.
+
+Request:  {"id": 1, "type": "features-of-commit", "commit": "HEAD~2"}
+Answer:   {"id": 1, "result": ["feature-a", "feature-b"]}
+Error:    {"id": 1, "error": "Unknown commit HEAD~2"}
+
+The indexes follow the metadata branch: its tip is checked again at most once
+per REFRESH_INTERVAL seconds, and the indexes are updated if it moved.
+"""
+
+import json
+import time
+from typing import Any, Callable, Iterable, Optional
+
+import git
+
+from git_tool.feature_data.git_status_per_feature import (
+    get_feature_name_from_folder,
+)
+from git_tool.feature_data.models_and_context.feature_index import (
+    FeatureCommitIndex,
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.path_index import (
+    PathFeatureIndex,
+    get_path_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.utils.object_names import FULL_OID, get_resolver
+
+REFRESH_INTERVAL = 1.0
+
+
+class QueryException(Exception): ...
+
+
+class QuerySession:
+    def __init__(self, repo: git.Repo, branch: str = FEATURE_BRANCH_NAME):
+        self.repo = repo
+        self.branch = branch
+        self.resolver = get_resolver(repo)
+        self._feature_index: Optional[FeatureCommitIndex] = None
+        self._path_index: Optional[PathFeatureIndex] = None
+        self._folders_by_name: Optional[dict[str, str]] = None
+        self._checked = 0.0
+        self.handlers: dict[str, Callable[[dict[str, Any]], Any]] = {
+            "features-of-commit": self._features_of_commit,
+            "commits-of-feature": self._commits_of_feature,
+            "features-of-path": self._features_of_path,
+            "name-to-uuid": self._name_to_uuid,
+            "uuid-to-name": self._uuid_to_name,
+        }
+
+    @property
+    def feature_index(self) -> FeatureCommitIndex:
+        now = time.monotonic()
+        if (
+            self._feature_index is None
+            or now - self._checked > REFRESH_INTERVAL
+        ):
+            self._checked = now
+            tip = self.resolver.resolve(
+                f"refs/heads/{self.branch}", object_type="commit"
+            )
+            if self._feature_index is None or tip != self._feature_index.tip:
+                self._feature_index = get_feature_index(self.repo, self.branch)
+                self._path_index = None
+                self._folders_by_name = None
+        return self._feature_index
+
+    @property
+    def path_index(self) -> PathFeatureIndex:
+        feature_index = self.feature_index
+        if self._path_index is None:
+            self._path_index = get_path_index(
+                self.repo, feature_index, self.branch
+            )
+        return self._path_index
+
+    @property
+    def folders_by_name(self) -> dict[str, str]:
+        feature_index = self.feature_index
+        if self._folders_by_name is None:
+            self._folders_by_name = {
+                get_feature_name_from_folder(folder): folder
+                for folder in feature_index.features
+            }
+        return self._folders_by_name
+
+    def _resolve_commit(self, name: str) -> str:
+        if FULL_OID.match(name):
+            return name
+        commit = self.resolver.resolve_commit(name)
+        if commit is None:
+            raise QueryException(f"Unknown commit {name}")
+        return commit
+
+    def _features_of_commit(self, request: dict[str, Any]) -> list[str]:
+        commit = self._resolve_commit(_field(request, "commit"))
+        return [
+            get_feature_name_from_folder(folder)
+            for folder in self.feature_index.features_of_commit(commit)
+        ]
+
+    def _commits_of_feature(self, request: dict[str, Any]) -> list[str]:
+        folder = self.folders_by_name.get(_field(request, "feature"))
+        return (
+            self.feature_index.commits_of_feature(folder)
+            if folder is not None
+            else []
+        )
+
+    def _features_of_path(self, request: dict[str, Any]) -> list[str]:
+        return [
+            get_feature_name_from_folder(folder)
+            for folder in self.path_index.features_of_path(
+                _field(request, "path"), self.feature_index
+            )
+        ]
+
+    def _name_to_uuid(self, request: dict[str, Any]) -> Optional[str]:
+        return self.folders_by_name.get(_field(request, "name"))
+
+    def _uuid_to_name(self, request: dict[str, Any]) -> Optional[str]:
+        uuid = _field(request, "uuid")
+        if uuid not in self.feature_index.feature_ids:
+            return None
+        return get_feature_name_from_folder(uuid)
+
+    def answer(self, request: Any) -> dict[str, Any]:
+        """
+        Answer one request. Errors are answered too, they never end the session.
+        """
+        if not isinstance(request, dict):
+            return {"id": None, "error": "A request must be a JSON object"}
+        answer: dict[str, Any] = {"id": request.get("id")}
+        handler = self.handlers.get(request.get("type"))
+        if handler is None:
+            answer["error"] = (
+                f"Unknown type {request.get('type')}. "
+                f"Use one of {', '.join(self.handlers)}"
+            )
+            return answer
+        try:
+            answer["result"] = handler(request)
+        except QueryException as e:
+            answer["error"] = str(e)
+        return answer
+
+
+def _field(request: dict[str, Any], name: str) -> str:
+    value = request.get(name)
+    if not isinstance(value, str):
+        raise QueryException(
+            f"{request.get('type')} needs the string field {name}"
+        )
+    return value
+
+
+def serve_queries(
+    session: QuerySession, lines: Iterable[str], write: Callable[[str], None]
+):
+    """
+    Answer JSON lines requests in order, one JSON line per request. Empty lines
+    are skipped.
+
+    Args:
+        session (QuerySession): Session that answers the requests
+        lines (Iterable[str]): Request lines, e.g. sys.stdin
+        write (Callable[[str], None]): Receives every answer line
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            answer = {"id": None, "error": f"Invalid JSON: {e}"}
+        else:
+            answer = session.answer(request)
+        write(json.dumps(answer, separators=(",", ":")))
@@ -0,0 +1,422 @@
+"""
+Watch mode for feature status. The status of every changed file and its features
+are kept in memory and only refreshed for the paths the file system reports as
+changed: git status is asked for exactly those paths. Changes of the index or
+HEAD (staging, commits, checkouts) refresh the tracked files, changes of the
+metadata branch only the feature mapping. Every change of the state is emitted
+as one JSON line.
+
+On Linux the working tree is watched with inotify, elsewhere the status is
+polled.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import socket
+import struct
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import git
+
+from git_tool.feature_data.git_status_per_feature import (
+    StatusEntry,
+    iter_status_entries,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.utils.git_streams import iter_git_records
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WORKTREE_EVENTS = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+GIT_DIR_EVENTS = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+PATHSPEC_BATCH_SIZE = 1000
+DEBOUNCE_SECONDS = 0.1
+
+
+class InotifyUnavailableException(Exception): ...
+
+
+class StatusState:
+    """
+    Status entries and features of all changed files, updated per path.
+    """
+
+    def __init__(
+        self,
+        repo: git.Repo,
+        features_for_file: Callable[[str], list[str]],
+    ):
+        self.repo = repo
+        self.features_for_file = features_for_file
+        self.entries: dict[str, StatusEntry] = {}
+        self.features: dict[str, list[str]] = {}
+
+    def _record(self, entry: StatusEntry) -> dict[str, Any]:
+        return {
+            "op": "set",
+            "path": entry.path,
+            "original_path": entry.original_path,
+            "staged": entry.staged,
+            "unstaged": entry.unstaged,
+            "untracked": entry.untracked,
+            "features": self.features[entry.path],
+        }
+
+    def _apply(
+        self, entries: Iterable[StatusEntry], covered: Callable[[str], bool]
+    ) -> list[dict[str, Any]]:
+        """
+        Merge fresh entries into the state. Known paths that are covered by the
+        query but did not come back are clean now and are removed.
+        """
+        changes = []
+        seen = set()
+        for entry in entries:
+            seen.add(entry.path)
+            if self.entries.get(entry.path) == entry:
+                continue
+            self.entries[entry.path] = entry
+            if entry.path not in self.features:
+                self.features[entry.path] = self.features_for_file(entry.path)
+            changes.append(self._record(entry))
+        for path in [p for p in self.entries if p not in seen and covered(p)]:
+            del self.entries[path]
+            self.features.pop(path, None)
+            changes.append({"op": "remove", "path": path})
+        return changes
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [self._record(entry) for entry in self.entries.values()]
+
+    def refresh_all(self, untracked: bool = True) -> list[dict[str, Any]]:
+        """
+        Full git status, used for the initial snapshot, after changes of the
+        index or HEAD and when polling.
+        """
+        return self._apply(
+            iter_status_entries(self.repo, untracked=untracked),
+            lambda path: untracked or not self.entries[path].untracked,
+        )
+
+    def refresh_paths(self, paths: set[str]) -> list[dict[str, Any]]:
+        """
+        git status for the given paths only. The cost depends on the number of
+        paths, not on the size of the working tree.
+        """
+        changes = []
+        paths = sorted(paths)
+        for start in range(0, len(paths), PATHSPEC_BATCH_SIZE):
+            batch = paths[start : start + PATHSPEC_BATCH_SIZE]
+            prefixes = tuple(f"{path}/" for path in batch)
+            wanted = set(batch)
+            changes += self._apply(
+                iter_status_entries(self.repo, paths=batch),
+                lambda path: path in wanted or path.startswith(prefixes),
+            )
+        return changes
+
+    def refresh_features(self) -> list[dict[str, Any]]:
+        """
+        Recompute the features of all changed files, e.g. after the metadata
+        branch moved.
+        """
+        changes = []
+        for path, entry in self.entries.items():
+            features = self.features_for_file(path)
+            if features != self.features.get(path):
+                self.features[path] = features
+                changes.append(self._record(entry))
+        return changes
+
+
+class InotifyWatcher:
+    """
+    Minimal inotify binding. Watches every directory of the working tree, except
+    .git and the directories git ignores, plus the git dir itself and its
+    refs/heads for index, HEAD and branch updates.
+    """
+
+    def __init__(self, repo: git.Repo, branch: str = FEATURE_BRANCH_NAME):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise InotifyUnavailableException(
+                "inotify is not available on this platform"
+            )
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyUnavailableException(os.strerror(ctypes.get_errno()))
+        self.repo = repo
+        self.worktree = Path(repo.working_dir)
+        self.git_dir = Path(repo.git_dir)
+        self.common_dir = Path(repo.common_dir)
+        self.branch = branch
+        self._directories: dict[int, Path] = {}
+        self._git_watches: set[int] = set()
+        self._watch_tree(self.worktree)
+        for directory in {
+            self.git_dir,
+            self.common_dir.joinpath("refs", "heads"),
+        }:
+            self._git_watches.add(self._watch(directory, GIT_DIR_EVENTS))
+
+    def _watch(self, directory: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd >= 0:
+            self._directories[wd] = directory
+        return wd
+
+    def _not_ignored(self, directories: list[Path]) -> list[Path]:
+        relative = [
+            d.relative_to(self.worktree).as_posix() for d in directories
+        ]
+        ignored = set(
+            iter_git_records(
+                self.repo,
+                "check-ignore",
+                "--stdin",
+                "-z",
+                stdin_lines=relative,
+                stdin_separator="\0",
+                # 1 if none of them is ignored
+                ok_codes=(0, 1),
+            )
+        )
+        return [d for d, r in zip(directories, relative) if r not in ignored]
+
+    def _watch_tree(self, top: Path):
+        """
+        Watch the directory and all directories below it that git does not
+        ignore, so node_modules or .venv cost no watches. git check-ignore runs
+        once per level. Directories that are watched already keep their watch.
+        """
+        level = [top]
+        while level:
+            subdirectories = []
+            for directory in level:
+                self._watch(directory, WORKTREE_EVENTS)
+                try:
+                    with os.scandir(directory) as entries:
+                        subdirectories += [
+                            Path(entry.path)
+                            for entry in entries
+                            if entry.name != ".git"
+                            and entry.is_dir(follow_symlinks=False)
+                        ]
+                except OSError:
+                    # removed or unreadable, like os.walk skips it
+                    continue
+            level = self._not_ignored(subdirectories) if subdirectories else []
+
+    def read_events(self) -> tuple[set[str], bool, bool, bool]:
+        """
+        Returns:
+            tuple[set[str], bool, bool, bool]: changed working tree paths,
+                whether the index or HEAD changed, whether the metadata branch
+                changed, whether the kernel dropped events because its queue
+                overflowed. After an overflow nothing is known about the
+                changes, so everything has to be refreshed.
+        """
+        paths: set[str] = set()
+        index_changed = metadata_changed = False
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return paths, False, False, False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[
+                offset
+                + EVENT_HEADER.size : offset
+                + EVENT_HEADER.size
+                + name_length
+            ].rstrip(b"\0")
+            offset += EVENT_HEADER.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                # directories created meanwhile have no watch yet
+                self._watch_tree(self.worktree)
+                return set(), True, True, True
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = directory.joinpath(os.fsdecode(name))
+            if wd in self._git_watches:
+                if path.name in (self.branch, "packed-refs"):
+                    metadata_changed = True
+                elif (
+                    path.name in ("index", "HEAD") or directory.name == "heads"
+                ):
+                    # staging, commits and checkouts
+                    index_changed = True
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # files created before the watch exists are found by the status
+                # of the directory
+                for directory in self._not_ignored([path]):
+                    self._watch_tree(directory)
+            paths.add(path.relative_to(self.worktree).as_posix())
+        return paths, index_changed, metadata_changed, False
+
+    def close(self):
+        os.close(self.fd)
+
+
+class JsonLinesPublisher:
+    """
+    Writes JSON lines to stdout and to every client of an optional unix socket.
+    New socket clients first get the current state.
+    """
+
+    def __init__(
+        self, write: Callable[[str], None], socket_path: Optional[Path] = None
+    ):
+        self.write = write
+        self.server = None
+        self.clients: list[socket.socket] = []
+        if socket_path is not None:
+            socket_path.unlink(missing_ok=True)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(str(socket_path))
+            self.server.listen()
+            self.server.setblocking(False)
+
+    def accept(self, snapshot: Callable[[], list[dict[str, Any]]]):
+        if self.server is None:
+            return
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            self.clients.append(client)
+            self._send(client, snapshot())
+
+    def _send(
+        self, client: socket.socket, records: list[dict[str, Any]]
+    ) -> bool:
+        try:
+            client.sendall(
+                "".join(json.dumps(r) + "\n" for r in records).encode()
+            )
+            return True
+        except OSError:
+            return False
+
+    def publish(self, records: list[dict[str, Any]]):
+        if not records:
+            return
+        for record in records:
+            self.write(json.dumps(record))
+        self.clients = [c for c in self.clients if self._send(c, records)]
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        if self.server is not None:
+            path = self.server.getsockname()
+            self.server.close()
+            Path(path).unlink(missing_ok=True)
+
+
+def watch_status(
+    repo: git.Repo,
+    features_for_file: Callable[[str], list[str]],
+    write: Callable[[str], None],
+    socket_path: Optional[Path] = None,
+    poll_interval: float = 2.0,
+    use_inotify: bool = True,
+):
+    """
+    Emit the status of all changed files with their features, then every change
+    of it, as JSON lines. Runs until interrupted.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        features_for_file (Callable[[str], list[str]]): Feature lookup for a
+            path
+        write (Callable[[str], None]): Receives every JSON line, e.g. typer.echo
+        socket_path (Optional[Path]): Also serve the lines on this unix socket
+        poll_interval (float): Seconds between two full status runs if inotify
+            is not available
+        use_inotify (bool): Set to False to always poll
+    """
+    state = StatusState(repo, features_for_file)
+    publisher = JsonLinesPublisher(write, socket_path)
+    watcher = None
+    if use_inotify:
+        try:
+            watcher = InotifyWatcher(repo)
+        except InotifyUnavailableException:
+            watcher = None
+
+    def revisions() -> str:
+        # branch tips and HEAD, a change means commits, checkouts or new facts
+        return repo.git.for_each_ref("--format=%(objectname)", "refs/heads") + (
+            Path(repo.git_dir).joinpath("HEAD").read_text(encoding="utf-8")
+        )
+
+    try:
+        publisher.publish(state.refresh_all())
+        known_revisions = revisions()
+        while True:
+            publisher.accept(state.snapshot)
+            if watcher is None:
+                time.sleep(poll_interval)
+                changes = state.refresh_all()
+                if revisions() != known_revisions:
+                    known_revisions = revisions()
+                    changes += state.refresh_features()
+                publisher.publish(changes)
+                continue
+            readable, _, _ = select.select([watcher.fd], [], [], 1.0)
+            if not readable:
+                continue
+            # collect the burst of events of one save or checkout
+            time.sleep(DEBOUNCE_SECONDS)
+            paths, index_changed, metadata_changed, overflowed = (
+                watcher.read_events()
+            )
+            changes = []
+            if overflowed:
+                changes += state.refresh_all()
+            elif index_changed:
+                changes += state.refresh_all(untracked=False)
+            if paths:
+                changes += state.refresh_paths(paths)
+            if index_changed or metadata_changed:
+                # a commit or a new fact can change the features of every
+                # changed file
+                changes += state.refresh_features()
+            publisher.publish(changes)
+    finally:
+        if watcher is not None:
+            watcher.close()
+        publisher.close()
@@ -0,0 +1,221 @@
+"""
+Every fact is written as its own commit, so the metadata branch has as many
+commits as facts. Compaction rewrites the old part of the history into one
+snapshot commit per period (day, week or month). A snapshot has exactly the tree
+of the last fact commit of its period, so the content of the branch stays
+identical, only the number of commits shrinks. The most recent commits are kept
+one by one on top of the snapshots.
+
+Rewriting history has to be coordinated with everybody else who pushes facts.
+Compaction holds the push lock of the outbox, first replays unpushed local facts
+onto the remote tip and then pushes the compacted branch with a lease on the
+remote tip it was built from. Other clones replay their own unpushed facts onto
+the compacted branch the next time they push.
+"""
+
+import os
+import subprocess
+from collections import namedtuple
+from datetime import datetime, timezone
+from itertools import groupby
+
+import git
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data.outbox import (
+    PushRejectedException,
+    clear_outbox,
+    fetch_remote_tip,
+    is_ancestor,
+    push_lock,
+    read_outbox,
+    rebase_fact_commits,
+)
+
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+
+HistoryEntry = namedtuple("HistoryEntry", ["commit", "tree", "timestamp"])
+CompactionResult = namedtuple(
+    "CompactionResult", ["commits_before", "commits_after", "tip"]
+)
+
+
+def _first_parent_history(repo: git.Repo, tip: str) -> list[HistoryEntry]:
+    """
+    First-parent history of the metadata branch, oldest first.
+    """
+    output = repo.git.log(
+        "--first-parent", "--reverse", "--format=%H %T %ct", tip
+    )
+    return [
+        HistoryEntry(commit, tree, int(timestamp))
+        for commit, tree, timestamp in (
+            line.split(" ") for line in output.splitlines()
+        )
+    ]
+
+
+def _period_of(entry: HistoryEntry, period: str) -> str:
+    return datetime.fromtimestamp(entry.timestamp, tz=timezone.utc).strftime(
+        PERIOD_FORMATS[period]
+    )
+
+
+def _commit_tree(
+    repo: git.Repo,
+    tree: str,
+    parent: str | None,
+    message: bytes,
+    ident: dict[str, str],
+) -> str:
+    parents = ["-p", parent] if parent else []
+    result = subprocess.run(
+        ["git", "commit-tree", tree, *parents],
+        input=message,
+        cwd=repo.working_dir,
+        env={**os.environ, **ident},
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout.decode().strip()
+
+
+def _identity_of(repo: git.Repo, commit: str) -> tuple[dict[str, str], bytes]:
+    """
+    Author, committer and message of a commit, ready to be reused with
+    commit-tree.
+    """
+    fields = repo.git.show(
+        "-s",
+        "--date=raw",
+        "--format=%an%x00%ae%x00%ad%x00%cn%x00%ce%x00%cd%x00%B",
+        commit,
+    ).split("\0", 6)
+    keys = [
+        "GIT_AUTHOR_NAME",
+        "GIT_AUTHOR_EMAIL",
+        "GIT_AUTHOR_DATE",
+        "GIT_COMMITTER_NAME",
+        "GIT_COMMITTER_EMAIL",
+        "GIT_COMMITTER_DATE",
+    ]
+    return dict(zip(keys, fields[:6])), fields[6].encode("utf-8")
+
+
+def rewrite_history(
+    repo: git.Repo, tip: str, keep_recent: int = 100, period: str = "month"
+) -> CompactionResult:
+    """
+    Build the compacted history for tip without moving any ref.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        tip (str): Tip of the metadata branch
+        keep_recent (int): Number of most recent commits that are kept as they
+            are
+        period (str): One of PERIOD_FORMATS, the time span collapsed into one
+            snapshot
+
+    Returns:
+        CompactionResult: Commit counts before and after and the new tip. The
+            new tip has the same tree as tip.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError(
+            f"Unknown period {period}. Use one of {list(PERIOD_FORMATS)}"
+        )
+    history = _first_parent_history(repo, tip)
+    split = max(len(history) - keep_recent, 0)
+    old, recent = history[:split], history[split:]
+    snapshots = [
+        list(entries)
+        for _, entries in groupby(
+            old, key=lambda entry: _period_of(entry, period)
+        )
+    ]
+    if all(len(entries) == 1 for entries in snapshots):
+        return CompactionResult(len(history), len(history), tip)
+
+    parent = None
+    for entries in snapshots:
+        ident, _ = _identity_of(repo, entries[-1].commit)
+        message = (
+            f"Snapshot of {len(entries)} fact commits from "
+            f"{_period_of(entries[0], 'day')} to "
+            f"{_period_of(entries[-1], 'day')}\n"
+        ).encode("utf-8")
+        parent = _commit_tree(repo, entries[-1].tree, parent, message, ident)
+    for entry in recent:
+        ident, message = _identity_of(repo, entry.commit)
+        parent = _commit_tree(repo, entry.tree, parent, message, ident)
+    return CompactionResult(len(history), len(snapshots) + len(recent), parent)
+
+
+def compact_metadata_branch(
+    repo: git.Repo,
+    keep_recent: int = 100,
+    period: str = "month",
+    remote_name: str = "origin",
+    branch: str = FEATURE_BRANCH_NAME,
+    max_attempts: int = 5,
+) -> CompactionResult:
+    """
+    Compact the metadata branch locally and on the remote.
+
+    Raises:
+        OutboxLockedException: A push or another compaction is running for this
+            repository
+        PushRejectedException: The remote kept moving for max_attempts rounds
+
+    Returns:
+        CompactionResult: Commit counts before and after and the new tip
+    """
+    has_remote = remote_name in [remote.name for remote in repo.remotes]
+    with push_lock(repo):
+        queued = len(read_outbox(repo))
+        for _ in range(max_attempts):
+            remote_tip = (
+                fetch_remote_tip(repo, remote_name, branch)
+                if has_remote
+                else None
+            )
+            local_tip = repo.git.rev_parse(f"refs/heads/{branch}")
+            if remote_tip is not None and not is_ancestor(
+                repo, remote_tip, local_tip
+            ):
+                try:
+                    local_tip = rebase_fact_commits(
+                        repo, remote_tip, branch, local_tip
+                    )
+                except git.GitCommandError:
+                    # a fact was written meanwhile, replay it as well
+                    continue
+            result = rewrite_history(repo, local_tip, keep_recent, period)
+            if result.tip == local_tip:
+                return result
+            if has_remote:
+                try:
+                    repo.git.push(
+                        f"--force-with-lease=refs/heads/{branch}:"
+                        f"{remote_tip or ''}",
+                        remote_name,
+                        f"{result.tip}:refs/heads/{branch}",
+                    )
+                except git.GitCommandError:
+                    continue
+            try:
+                repo.git.update_ref(
+                    f"refs/heads/{branch}", result.tip, local_tip
+                )
+            except git.GitCommandError:
+                # A fact was written while compacting. It is replayed onto the
+                # compacted branch on the next push.
+                pass
+            clear_outbox(repo, queued)
+            return result
+        raise PushRejectedException(
+            f"Remote {remote_name} rejected the compacted {branch} "
+            f"{max_attempts} times"
+        )
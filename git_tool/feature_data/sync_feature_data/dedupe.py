@@ -0,0 +1,137 @@
+"""
+Removal of duplicate facts from the metadata branch. Two fact files in the same
+<feature>/<commit> folder are duplicates if their facts have the same content
+hash, i.e. they only differ in their date or in the order of their lists. The
+oldest file is kept.
+
+Only folders with more than one file are read. The duplicates are removed with
+one commit on top of the branch, written under the metadata write lock. The
+commit is queued in the outbox like a fact. The outbox replays the removals if
+the remote moved meanwhile, and does not bring back files that the remote
+removed, so the duplicates stay removed in every clone.
+"""
+
+from typing import NamedTuple, Optional
+
+import git
+from pydantic import ValidationError
+
+from git_tool.feature_data.add_feature_data.add_data import fact_content_hash
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    MetadataWriteConflictException,
+    _branch_tip,
+    drain_write_queue,
+    metadata_write_lock,
+)
+from git_tool.feature_data.models_and_context.fact_model import FeatureFactModel
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data.outbox import queue_fact_for_push
+from git_tool.feature_data.utils.fast_import_utils import FastImportWriter
+from git_tool.feature_data.utils.git_streams import (
+    BlobReader,
+    iter_tree_entries,
+)
+
+DEDUPE_REF = "refs/feature-tool/dedupe"
+DEDUPE_BATCH_SIZE = 1000
+
+
+class DedupeResult(NamedTuple):
+    facts: int
+    duplicates: list[str]
+    tip: Optional[str]
+
+
+def find_duplicate_facts(repo: git.Repo, treeish: str) -> tuple[int, list[str]]:
+    """
+    Fact files of a metadata revision that repeat an older fact of the same
+    folder. Files that cannot be parsed are never duplicates.
+
+    Returns:
+        tuple[int, list[str]]: Number of fact files, paths of the duplicates
+    """
+    folders: dict[str, list[tuple[str, str]]] = {}
+    facts = 0
+    for entry in iter_tree_entries(repo, treeish, recursive=True):
+        folder, _, name = entry.path.rpartition("/")
+        if entry.object_type != "blob" or folder.count("/") != 1:
+            continue
+        facts += 1
+        folders.setdefault(folder, []).append((name, entry.oid))
+    # the names start with the date, so sorting puts the oldest fact first
+    candidates = [
+        (f"{folder}/{name}", oid)
+        for folder, files in folders.items()
+        if len(files) > 1
+        for name, oid in sorted(files)
+    ]
+    duplicates = []
+    seen: set[tuple[str, str]] = set()
+    reader = BlobReader(repo)
+    try:
+        for start in range(0, len(candidates), DEDUPE_BATCH_SIZE):
+            batch = candidates[start : start + DEDUPE_BATCH_SIZE]
+            for (path, _), content in zip(
+                batch, reader.read([oid for _, oid in batch])
+            ):
+                try:
+                    fact = FeatureFactModel.model_validate_json(content or b"")
+                except ValidationError:
+                    continue
+                key = (path.rpartition("/")[0], fact_content_hash(fact))
+                if key in seen:
+                    duplicates.append(path)
+                else:
+                    seen.add(key)
+    finally:
+        reader.close()
+    return facts, duplicates
+
+
+def dedupe_metadata_branch(
+    repo: git.Repo, branch: str = FEATURE_BRANCH_NAME, dry_run: bool = False
+) -> DedupeResult:
+    """
+    Remove the duplicate facts of the metadata branch with one commit.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        branch (str): Metadata branch
+        dry_run (bool): Only find the duplicates
+
+    Raises:
+        MetadataWriteConflictException: The branch was rewritten while removing
+            the duplicates
+
+    Returns:
+        DedupeResult: Number of facts before, removed duplicates and the new tip
+    """
+    with metadata_write_lock(repo):
+        drain_write_queue(repo)
+        tip = _branch_tip(repo, branch)
+        if tip is None:
+            return DedupeResult(0, [], None)
+        facts, duplicates = find_duplicate_facts(repo, tip)
+        if not duplicates or dry_run:
+            return DedupeResult(facts, duplicates, tip)
+        with FastImportWriter(repo, force=True, export_marks=True) as writer:
+            mark = writer.write_commit(
+                DEDUPE_REF,
+                repo.git.var("GIT_COMMITTER_IDENT"),
+                f"Remove {len(duplicates)} duplicate facts",
+                parent=tip,
+                removed_paths=duplicates,
+            )
+        new_tip = writer.marks[mark]
+        try:
+            repo.git.update_ref(f"refs/heads/{branch}", new_tip, tip)
+        except git.GitCommandError:
+            raise MetadataWriteConflictException(
+                f"{branch} moved while removing duplicates"
+            )
+        finally:
+            repo.git.update_ref("-d", DEDUPE_REF)
+        queue_fact_for_push(repo, new_tip)
+        return DedupeResult(facts, duplicates, new_tip)
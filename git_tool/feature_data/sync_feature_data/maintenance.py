@@ -0,0 +1,273 @@
+"""
+Maintenance of the object store for fast reads of the metadata branch.
+
+Every fact is written by its own fast-import run, and every run leaves a tiny
+pack behind; small fetches of the branch leave loose objects. Each ls-tree or
+cat-file read then looks the object up pack by pack. Maintenance
+1. writes the commit-graph with changed-path Bloom filters,
+2. packs all objects of the local and remote metadata branches into one
+   dedicated pack, kept out of git gc by a .keep file and replaced by the next
+   maintenance run,
+3. writes a multi-pack-index that prefers the dedicated pack and expires the
+   packs whose objects are all in other packs now, then removes loose objects
+   that are packed,
+4. rebuilds the feature index and the path index from scratch.
+
+Nothing is deleted that is not stored elsewhere, so maintenance can run next to
+fact writers. Read latency is measured before and after: one ls-tree of the
+whole branch and one cat-file read of a sample of its objects.
+"""
+
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator, NamedTuple, Optional
+
+import git
+
+from git_tool.feature_data.models_and_context.feature_index import (
+    INDEX_FILE_NAME,
+    get_feature_index,
+)
+from git_tool.feature_data.models_and_context.path_index import (
+    PATH_INDEX_FILE_NAME,
+    get_path_index,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.sync_feature_data.partial_fetch import (
+    is_partial_remote,
+)
+from git_tool.feature_data.utils.file_lock import (
+    FileLockedException,
+    file_lock,
+)
+from git_tool.feature_data.utils.git_streams import BlobReader, iter_tree_names
+
+MAINTENANCE_LOCK_FILE_NAME = "maintenance.lock"
+# marks the .keep file of the dedicated pack, other .keep files are left alone
+MAINTENANCE_KEEP_MESSAGE = "feature-tool maintenance\n"
+MAINTENANCE_SAMPLE_SIZE = 1000
+# the defaults of gc.autoPackLimit and gc.auto
+MAINTENANCE_AUTO_PACK_LIMIT = int(
+    os.getenv("FEATURE_MAINTENANCE_PACK_LIMIT", "50")
+)
+MAINTENANCE_AUTO_LOOSE_LIMIT = int(
+    os.getenv("FEATURE_MAINTENANCE_LOOSE_LIMIT", "6700")
+)
+
+
+class MaintenanceLockedException(Exception): ...
+
+
+class ReadLatency(NamedTuple):
+    # seconds for git ls-tree -r of the branch
+    ls_tree: float
+    # seconds for reading the sampled objects through one git cat-file --batch
+    cat_file: float
+    objects: int
+
+
+class MaintenanceResult(NamedTuple):
+    before: ReadLatency
+    after: ReadLatency
+    packed_objects: int
+    packs_before: int
+    packs_after: int
+    loose_before: int
+    loose_after: int
+
+
+def count_objects(repo: git.Repo) -> dict[str, int]:
+    """
+    Numbers of git count-objects -v, e.g. "packs" and "count" for the loose
+    objects.
+    """
+    counts = {}
+    for line in repo.git.count_objects("-v").splitlines():
+        key, _, value = line.partition(": ")
+        if value.isdigit():
+            counts[key] = int(value)
+    return counts
+
+
+def is_maintenance_due(repo: git.Repo) -> bool:
+    counts = count_objects(repo)
+    return (
+        counts.get("packs", 0) > MAINTENANCE_AUTO_PACK_LIMIT
+        or counts.get("count", 0) > MAINTENANCE_AUTO_LOOSE_LIMIT
+    )
+
+
+def _metadata_refs(repo: git.Repo, branch: str) -> list[str]:
+    return repo.git.for_each_ref(
+        "--format=%(refname)",
+        f"refs/heads/{branch}",
+        f"refs/remotes/*/{branch}",
+    ).splitlines()
+
+
+def _metadata_objects(repo: git.Repo, refs: list[str]) -> list[str]:
+    """
+    "<oid> <path>" lines of the objects reachable from the refs that exist
+    locally, as pack-objects reads them. Objects left out by a partial fetch are
+    skipped, not fetched.
+    """
+    if not refs:
+        return []
+    output = repo.git.rev_list("--objects", "--missing=print", *refs)
+    return [
+        line
+        for line in output.splitlines()
+        if line and not line.startswith("?")
+    ]
+
+
+def measure_read_latency(
+    repo: git.Repo,
+    refs: list[str],
+    objects: list[str],
+    sample_size: int = MAINTENANCE_SAMPLE_SIZE,
+) -> ReadLatency:
+    """
+    Time one ls-tree of the first metadata ref and one cat-file read of objects
+    spread over the metadata refs.
+    """
+    start = time.perf_counter()
+    if refs:
+        for _ in iter_tree_names(repo, refs[0], recursive=True):
+            pass
+    ls_tree = time.perf_counter() - start
+
+    step = max(1, len(objects) // sample_size)
+    sample = [line.partition(" ")[0] for line in objects[::step][:sample_size]]
+    start = time.perf_counter()
+    reader = BlobReader(repo)
+    try:
+        reader.read(sample)
+    finally:
+        reader.close()
+    return ReadLatency(ls_tree, time.perf_counter() - start, len(sample))
+
+
+def _pack_dir(repo: git.Repo) -> Path:
+    # relative to the working directory of git, not of this process
+    return Path(repo.working_dir).joinpath(
+        repo.git.rev_parse("--git-path", "objects/pack")
+    )
+
+
+def _write_dedicated_pack(repo: git.Repo, objects: list[str]) -> str:
+    """
+    Pack the objects into a new pack with the maintenance .keep file and release
+    the previous dedicated pack to the multi-pack-index expiry.
+
+    Returns:
+        str: File name of the new pack
+    """
+    pack_dir = _pack_dir(repo)
+    previous = [
+        keep
+        for keep in pack_dir.glob("pack-*.keep")
+        if keep.read_text(encoding="utf-8", errors="replace")
+        == MAINTENANCE_KEEP_MESSAGE
+    ]
+    result = subprocess.run(
+        [
+            "git",
+            "pack-objects",
+            "--quiet",
+            "--missing=allow-any",
+            str(pack_dir.joinpath("pack")),
+        ],
+        cwd=repo.working_dir,
+        input="".join(f"{line}\n" for line in objects).encode("utf-8"),
+        capture_output=True,
+        check=True,
+    )
+    name = f"pack-{result.stdout.decode('ascii').strip()}"
+    pack_dir.joinpath(f"{name}.keep").write_text(
+        MAINTENANCE_KEEP_MESSAGE, encoding="utf-8"
+    )
+    if is_partial_remote(repo):
+        # like git repack does it for objects of a promisor remote, the branch
+        # may miss blobs
+        pack_dir.joinpath(f"{name}.promisor").touch()
+    for keep in previous:
+        if keep.name != f"{name}.keep":
+            keep.unlink(missing_ok=True)
+    return f"{name}.pack"
+
+
+@contextmanager
+def _maintenance_lock(repo: git.Repo) -> Generator[None, None, None]:
+    try:
+        with file_lock(
+            get_state_dir(repo).joinpath(MAINTENANCE_LOCK_FILE_NAME),
+            blocking=False,
+        ):
+            yield
+    except FileLockedException as e:
+        raise MaintenanceLockedException(
+            "Another maintenance is running"
+        ) from e
+
+
+def run_maintenance(
+    repo: git.Repo, branch: str = FEATURE_BRANCH_NAME, auto: bool = False
+) -> Optional[MaintenanceResult]:
+    """
+    Repack the metadata branch and rebuild the indexes of the tool, see the
+    module description.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        branch (str): Metadata branch
+        auto (bool): Only run if there are more packs or loose objects than the
+            limits
+
+    Raises:
+        MaintenanceLockedException: Another maintenance of the repository is
+            running
+        git.GitCommandError: A git command failed, e.g. git is older than 2.32
+        subprocess.CalledProcessError: git pack-objects failed
+
+    Returns:
+        Optional[MaintenanceResult]: Latencies and object counts, None if auto
+            found nothing to do
+    """
+    if auto and not is_maintenance_due(repo):
+        return None
+    with _maintenance_lock(repo):
+        counts_before = count_objects(repo)
+        refs = _metadata_refs(repo, branch)
+        objects = _metadata_objects(repo, refs)
+        before = measure_read_latency(repo, refs, objects)
+
+        repo.git.commit_graph("write", "--reachable", "--changed-paths")
+        if objects:
+            pack = _write_dedicated_pack(repo, objects)
+            repo.git.multi_pack_index("write", f"--preferred-pack={pack}")
+            repo.git.multi_pack_index("expire")
+        repo.git.prune_packed()
+
+        state_dir = get_state_dir(repo)
+        for file_name in (INDEX_FILE_NAME, PATH_INDEX_FILE_NAME):
+            state_dir.joinpath(file_name).unlink(missing_ok=True)
+        get_path_index(repo, get_feature_index(repo, branch), branch)
+
+        counts_after = count_objects(repo)
+        after = measure_read_latency(repo, refs, objects)
+    return MaintenanceResult(
+        before,
+        after,
+        len(objects),
+        counts_before.get("packs", 0),
+        counts_after.get("packs", 0),
+        counts_before.get("count", 0),
+        counts_after.get("count", 0),
+    )
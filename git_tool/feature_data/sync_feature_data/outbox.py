@@ -0,0 +1,444 @@
+"""
+Facts are written to the local metadata branch right away, but they are only
+pushed in batches. Every written fact is queued in an outbox file inside the git
+dir. The outbox is flushed on demand (git feature push) or once it is due
+according to FEATURE_PUSH_INTERVAL and FEATURE_PUSH_BATCH_SIZE.
+
+Flushing fetches the remote tip once, replays the local fact commits on top of
+it if somebody else pushed in the meantime, and pushes everything with a single
+lease-protected push. Fact commits add files and dedupe commits remove
+duplicates, so replaying them can never conflict. Files that the remote removed
+are not replayed, and local removals are replayed, so removed duplicates stay
+removed.
+"""
+
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Generator, Iterable, NamedTuple, Optional
+
+import git
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    FEATURE_METADATA_FILTER,
+    get_state_dir,
+    metadata_fetch_args,
+)
+from git_tool.feature_data.utils.file_lock import (
+    FileLockedException,
+    file_lock,
+)
+from git_tool.feature_data.utils.git_streams import (
+    iter_git_records,
+    iter_tree_names,
+)
+
+FEATURE_PUSH_INTERVAL = timedelta(
+    minutes=float(os.getenv("FEATURE_PUSH_INTERVAL", "5"))
+)
+FEATURE_PUSH_BATCH_SIZE = int(os.getenv("FEATURE_PUSH_BATCH_SIZE", "20"))
+OUTBOX_FILE_NAME = "outbox"
+PUSH_LOCK_FILE_NAME = "push.lock"
+REBASE_REF = "refs/feature-tool/rebase"
+PATHSPEC_BATCH_SIZE = 1000
+
+
+class OutboxLockedException(Exception): ...
+
+
+class PushRejectedException(Exception): ...
+
+
+def _outbox_file(repo: git.Repo) -> Path:
+    return get_state_dir(repo).joinpath(OUTBOX_FILE_NAME)
+
+
+def queue_fact_for_push(repo: git.Repo, fact_commit: str):
+    """
+    Put a fact commit of the local metadata branch into the outbox.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        fact_commit (str): Commit on the metadata branch that holds the fact
+    """
+    with _outbox_file(repo).open(mode="a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat()} {fact_commit}\n")
+
+
+def read_outbox(repo: git.Repo) -> list[tuple[datetime, str]]:
+    """
+    Returns:
+        list[tuple[datetime, str]]: Queued entries as (queued at, fact commit),
+            oldest first
+    """
+    outbox_file = _outbox_file(repo)
+    if not outbox_file.exists():
+        return []
+    entries = []
+    for line in outbox_file.read_text(encoding="utf-8").splitlines():
+        timestamp, _, fact_commit = line.partition(" ")
+        try:
+            entries.append((datetime.fromisoformat(timestamp), fact_commit))
+        except ValueError:
+            continue
+    return entries
+
+
+def clear_outbox(repo: git.Repo, flushed: int):
+    """
+    Drop the first `flushed` entries. Entries queued while the push was running
+    stay in the outbox.
+    """
+    outbox_file = _outbox_file(repo)
+    if not outbox_file.exists():
+        return
+    remaining = outbox_file.read_text(encoding="utf-8").splitlines()[flushed:]
+    if remaining:
+        outbox_file.write_text("\n".join(remaining) + "\n", encoding="utf-8")
+    else:
+        outbox_file.unlink()
+
+
+def is_outbox_due(
+    repo: git.Repo,
+    interval: timedelta = FEATURE_PUSH_INTERVAL,
+    batch_size: int = FEATURE_PUSH_BATCH_SIZE,
+) -> bool:
+    entries = read_outbox(repo)
+    if not entries:
+        return False
+    return (
+        len(entries) >= batch_size
+        or (datetime.now() - entries[0][0]) >= interval
+    )
+
+
+@contextmanager
+def push_lock(repo: git.Repo) -> Generator[None, None, None]:
+    """
+    Exclusive lock for pushing or rewriting the remote metadata branch of this
+    repository. Fails at once if it is taken.
+
+    Raises:
+        OutboxLockedException: Another push or compaction holds the lock
+    """
+    try:
+        with file_lock(
+            get_state_dir(repo).joinpath(PUSH_LOCK_FILE_NAME), blocking=False
+        ):
+            yield
+    except FileLockedException as e:
+        raise OutboxLockedException(
+            "Another process is pushing feature information"
+        ) from e
+
+
+def fetch_remote_tip(
+    repo: git.Repo,
+    remote_name: str = "origin",
+    branch: str = FEATURE_BRANCH_NAME,
+    filter_spec: str = FEATURE_METADATA_FILTER,
+) -> str | None:
+    """
+    Fetch the metadata branch from the remote and return its tip.
+    With a filter_spec like "blob:none" only commits and trees are fetched.
+
+    Returns:
+        str | None: Object id of the remote tip or None if the remote has no
+        metadata branch
+    """
+    tracking_ref = f"refs/remotes/{remote_name}/{branch}"
+    try:
+        repo.git.fetch(
+            *metadata_fetch_args(repo, remote_name, branch, filter_spec)
+        )
+    except git.GitCommandError:
+        return None
+    return repo.git.rev_parse(tracking_ref)
+
+
+def is_ancestor(repo: git.Repo, ancestor: str, descendant: str) -> bool:
+    try:
+        repo.git.merge_base("--is-ancestor", ancestor, descendant)
+        return True
+    except git.GitCommandError:
+        return False
+
+
+def _deleted_since(
+    repo: git.Repo, base: str, tip: str, paths: Iterable[str]
+) -> set[str]:
+    """
+    The given paths that a commit in base..tip removed, e.g. duplicates removed
+    by git feature dedupe. Such files must not come back through a replay or a
+    merge.
+    """
+    paths = sorted(paths)
+    deleted = set()
+    for start in range(0, len(paths), PATHSPEC_BATCH_SIZE):
+        for token in iter_git_records(
+            repo,
+            "--literal-pathspecs",
+            "log",
+            "-z",
+            "--no-merges",
+            "--diff-filter=D",
+            "--name-only",
+            "--format=",
+            f"{base}..{tip}",
+            "--",
+            *paths[start : start + PATHSPEC_BATCH_SIZE],
+        ):
+            token = token.lstrip("\n")
+            if token:
+                deleted.add(token)
+    return deleted
+
+
+def _missing_files(
+    repo: git.Repo, onto: str, local_tip: str
+) -> dict[str, tuple[str, str]]:
+    """
+    Fact files that exist on the local branch but not in onto, as path -> (mode,
+    blob oid). Comparing the trees instead of the histories keeps this correct
+    if one side was compacted. Files that onto removed since it forked from the
+    local branch are left out.
+    """
+    fields = iter_git_records(
+        repo, "diff-tree", "-r", "-z", "--diff-filter=AM", onto, local_tip
+    )
+    missing = {}
+    for meta, path in zip(fields, fields):
+        _, mode, _, oid, _ = meta.lstrip(":").split(" ")
+        missing[path] = (mode, oid)
+    for path in _deleted_since(repo, local_tip, onto, missing):
+        del missing[path]
+    return missing
+
+
+class LocalChange(NamedTuple):
+    # None for files that cannot be attributed to a local commit
+    commit: Optional[str]
+    added: list[str]
+    removed: list[str]
+
+
+def _local_changes(
+    repo: git.Repo,
+    onto: str,
+    local_tip: str,
+    missing: dict[str, tuple[str, str]],
+) -> list[LocalChange]:
+    """
+    Assign each missing file to the oldest local commit that added it, and each
+    file of onto that a local commit removed to that commit, in commit order.
+    Files that cannot be attributed (e.g. they came in through a merge) are
+    collected in a last entry without commit.
+    """
+    tokens = iter_git_records(
+        repo,
+        "log",
+        "-z",
+        "--reverse",
+        "--no-merges",
+        "--name-status",
+        "--diff-filter=AMD",
+        "--format=%H",
+        f"{onto}..{local_tip}",
+    )
+    unassigned = set(missing)
+    changes: list[LocalChange] = []
+    status = None
+    for token in tokens:
+        token = token.lstrip("\n")
+        if not token:
+            continue
+        if status is not None:
+            if status != "D" and token in unassigned:
+                unassigned.discard(token)
+                changes[-1].added.append(token)
+            elif status == "D":
+                changes[-1].removed.append(token)
+            status = None
+        elif token in ("A", "M", "D") and changes:
+            status = token
+        else:
+            changes.append(LocalChange(token, [], []))
+    # only removals of files that onto still has are replayed
+    removed = sorted({path for change in changes for path in change.removed})
+    present = set()
+    for start in range(0, len(removed), PATHSPEC_BATCH_SIZE):
+        present.update(
+            iter_tree_names(
+                repo,
+                onto,
+                removed[start : start + PATHSPEC_BATCH_SIZE],
+                recursive=True,
+            )
+        )
+    changes = [
+        LocalChange(
+            change.commit,
+            change.added,
+            [path for path in change.removed if path in present],
+        )
+        for change in changes
+    ]
+    changes = [change for change in changes if change.added or change.removed]
+    if unassigned:
+        changes.append(LocalChange(None, sorted(unassigned), []))
+    return changes
+
+
+def _replay_script(
+    repo: git.Repo,
+    changes: list[LocalChange],
+    missing: dict[str, tuple[str, str]],
+    onto: str,
+) -> bytes:
+    """
+    Fast-import script that re-creates the given fact commits on top of onto.
+    Author, committer and message are copied from the original commits, blobs
+    are reused.
+    """
+    script = []
+    parent = f"from {onto}\n".encode()
+    for commit, added, removed in changes:
+        script.append(f"commit {REBASE_REF}\n".encode())
+        if commit is None:
+            message = f"Replay {len(added)} facts".encode()
+            script.append(
+                f"committer {repo.git.var('GIT_COMMITTER_IDENT')}\n".encode()
+            )
+        else:
+            raw = repo.git.cat_file("commit", commit, stdout_as_string=False)
+            header, _, message = raw.partition(b"\n\n")
+            for line in header.split(b"\n"):
+                if line.startswith((b"author ", b"committer ")):
+                    script.append(line + b"\n")
+        script.append(f"data {len(message)}\n".encode() + message + b"\n")
+        script.append(parent)
+        parent = b""
+        for path in removed:
+            script.append(f"D {path}\n".encode())
+        for path in added:
+            mode, oid = missing[path]
+            script.append(f"M {mode} {oid} {path}\n".encode())
+    script.append(b"done\n")
+    return b"".join(script)
+
+
+def rebase_fact_commits(
+    repo: git.Repo,
+    onto: str,
+    branch: str = FEATURE_BRANCH_NAME,
+    local_tip: Optional[str] = None,
+) -> str:
+    """
+    Replay the fact commits whose facts are only on the local metadata branch on
+    top of onto. Files removed by local commits, e.g. by git feature dedupe, are
+    removed again. Commits whose changes onto already contains are dropped, so
+    this also works after the remote history was compacted. The branch is moved
+    with a compare-and-swap update, so facts written concurrently are never
+    dropped.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        onto (str): New base, usually the remote tip
+        branch (str): Local metadata branch
+        local_tip (Optional[str]): Tip of the local branch the caller read,
+            the current one if not given
+
+    Raises:
+        git.GitCommandError: The local branch is no longer at local_tip
+
+    Returns:
+        str: The new tip of the local branch
+    """
+    local_tip = local_tip or repo.git.rev_parse(f"refs/heads/{branch}")
+    missing = _missing_files(repo, onto, local_tip)
+    changes = _local_changes(repo, onto, local_tip, missing)
+    new_tip = onto
+    if changes:
+        subprocess.run(
+            ["git", "fast-import", "--quiet", "--force"],
+            input=_replay_script(repo, changes, missing, onto),
+            cwd=repo.working_dir,
+            check=True,
+        )
+        new_tip = repo.git.rev_parse(REBASE_REF)
+        repo.git.update_ref("-d", REBASE_REF)
+    repo.git.update_ref(f"refs/heads/{branch}", new_tip, local_tip)
+    return new_tip
+
+
+def flush_outbox(
+    repo: git.Repo,
+    remote_name: str = "origin",
+    branch: str = FEATURE_BRANCH_NAME,
+    max_attempts: int = 5,
+) -> int:
+    """
+    Push all queued facts with one push. If the lease is rejected because
+    another developer pushed in the meantime, the local fact commits are rebased
+    onto the new remote tip and the push is retried.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        remote_name (str): Remote to push to
+        branch (str): Metadata branch
+        max_attempts (int): Number of fetch/rebase/push rounds before giving up
+
+    Raises:
+        OutboxLockedException: Another flush is running for this repository
+        PushRejectedException: The remote kept moving for max_attempts rounds
+
+    Returns:
+        int: Number of outbox entries that were pushed
+    """
+    with push_lock(repo):
+        queued = len(read_outbox(repo))
+        for _ in range(max_attempts):
+            remote_tip = fetch_remote_tip(repo, remote_name, branch)
+            local_tip = repo.git.rev_parse(f"refs/heads/{branch}")
+            try:
+                if remote_tip is not None and not is_ancestor(
+                    repo, remote_tip, local_tip
+                ):
+                    # fails if a fact is written meanwhile, the next round
+                    # replays it as well
+                    local_tip = rebase_fact_commits(
+                        repo, remote_tip, branch, local_tip
+                    )
+                repo.git.push(
+                    f"--force-with-lease=refs/heads/{branch}:"
+                    f"{remote_tip or ''}",
+                    remote_name,
+                    f"{local_tip}:refs/heads/{branch}",
+                )
+            except git.GitCommandError:
+                continue
+            clear_outbox(repo, queued)
+            return queued
+        raise PushRejectedException(
+            f"Remote {remote_name} rejected {branch} {max_attempts} times"
+        )
+
+
+def flush_outbox_in_background(repo: git.Repo) -> subprocess.Popen:
+    """
+    Run "git feature push" as a detached process so the current command does not
+    wait for the network.
+    """
+    return subprocess.Popen(
+        [sys.executable, "-m", "git_tool", "push", "--quiet"],
+        cwd=repo.working_dir,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
@@ -0,0 +1,128 @@
+"""
+Support for a partially fetched metadata branch
+(FEATURE_METADATA_FILTER=blob:none).
+
+In this mode only commits and trees of the metadata branch are fetched, through
+the dedicated promisor remote METADATA_REMOTE_NAME (see metadata_fetch_args).
+Structure queries like listing features or the commits of a feature read trees
+only and never need a blob. When fact contents are read, git would fetch every
+missing blob in its own round-trip. The helpers here find the missing blobs
+below the trees that are about to be read and fetch them in batches instead.
+"""
+
+import posixpath
+import subprocess
+from typing import Iterable
+
+import git
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    METADATA_REMOTE_NAME,
+)
+from git_tool.feature_data.utils.git_streams import iter_tree_entries
+
+BLOB_BATCH_SIZE = 1000
+
+
+def is_partial_remote(
+    repo: git.Repo, remote_name: str = METADATA_REMOTE_NAME
+) -> bool:
+    """
+    Whether objects of the remote may be missing locally, i.e. it is a promisor
+    remote.
+    """
+    try:
+        return (
+            repo.git.config("--get", f"remote.{remote_name}.promisor") == "true"
+        )
+    except git.GitCommandError:
+        return False
+
+
+def missing_blobs(repo: git.Repo, treeishes: Iterable[str]) -> list[str]:
+    """
+    Object ids of all blobs below the given trees that are not available
+    locally. Listing them does not trigger any fetch.
+    """
+    treeishes = list(treeishes)
+    if not treeishes:
+        return []
+    output = repo.git.rev_list("--objects", "--missing=print", *treeishes)
+    return [line[1:] for line in output.splitlines() if line.startswith("?")]
+
+
+def fetch_blobs(
+    repo: git.Repo,
+    oids: list[str],
+    remote_name: str = METADATA_REMOTE_NAME,
+    batch_size: int = BLOB_BATCH_SIZE,
+):
+    """
+    Fetch the given objects from the promisor remote, batch_size objects per
+    round-trip. This is the same request git sends for a single lazily fetched
+    object.
+    """
+    for start in range(0, len(oids), batch_size):
+        batch = oids[start : start + batch_size]
+        subprocess.run(
+            [
+                "git",
+                "-c",
+                "fetch.negotiationAlgorithm=noop",
+                "fetch",
+                "--quiet",
+                "--no-tags",
+                "--no-write-fetch-head",
+                "--recurse-submodules=no",
+                "--filter=blob:none",
+                "--stdin",
+                remote_name,
+            ],
+            input="\n".join(batch) + "\n",
+            cwd=repo.working_dir,
+            text=True,
+            check=True,
+        )
+
+
+def prefetch_fact_blobs(
+    repo: git.Repo,
+    paths: Iterable[str],
+    branch: str = FEATURE_BRANCH_NAME,
+    remote_name: str = METADATA_REMOTE_NAME,
+) -> int:
+    """
+    Make sure all fact files below the given folders or files of the metadata
+    branch can be read without further round-trips. Does nothing if the metadata
+    branch was fetched completely.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        paths (Iterable[str]): Paths on the metadata branch, e.g.
+            <feature>/<commit> or fact files
+        branch (str): Metadata branch
+        remote_name (str): Promisor remote to fetch from
+
+    Returns:
+        int: Number of fetched blobs
+    """
+    paths = list(paths)
+    if not paths or not is_partial_remote(repo, remote_name):
+        return 0
+    # ls-tree only needs trees, so it works on a partially fetched branch
+    wanted = {
+        entry.oid: entry.path
+        for entry in iter_tree_entries(repo, branch, paths, recursive=True)
+        if entry.object_type == "blob"
+    }
+    # rev-list only accepts trees as starting points, so look at the folders of
+    # the files
+    folders = {posixpath.dirname(path) for path in wanted.values()}
+    treeishes = [
+        f"{branch}:{folder}" if folder else f"{branch}^{{tree}}"
+        for folder in folders
+    ]
+    oids = [oid for oid in missing_blobs(repo, treeishes) if oid in wanted]
+    fetch_blobs(repo, oids, remote_name)
+    return len(oids)
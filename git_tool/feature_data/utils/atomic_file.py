@@ -0,0 +1,37 @@
+"""
+Files that readers see either completely or not at all. The content is written
+to a temporary file next to the target and renamed over it, so a concurrent
+reader or a crash never leaves a half written file behind.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Generator
+
+
+@contextmanager
+def atomic_write(path: Path) -> Generator[BinaryIO, None, None]:
+    """
+    Open a temporary file in the directory of path for binary writing and move
+    it to path when the block ends without an exception.
+
+    Args:
+        path (Path): The file to replace
+
+    Yields:
+        BinaryIO: The temporary file
+    """
+    fd, temp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
@@ -6,14 +6,18 @@ Here, all the boilerplate code goes that creates the commit meta data and makes
 that the content is added as expected
 """
 
+import itertools
+import os
+import subprocess
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Iterable, List, Optional
 
-from git import GitCommandError
+import git
 from pydantic import BaseModel, EmailStr
 
 from git_tool.feature_data.models_and_context import repo_context
+from git_tool.feature_data.utils.object_names import get_resolver
 
 
 class FastImportCommitData(BaseModel):
@@ -68,7 +72,9 @@ class AccumulatedCommitData(BaseModel):
         sign = "+" if total_minutes >= 0 else "-"
         return f"{sign}{hours:02}{minutes:02}"
 
-    def to_partial_fast_import_format(self) -> str:
+    def to_partial_fast_import_format(
+        self, parent: Optional[str] = None, ref: Optional[str] = None
+    ) -> str:
         """
         This function returns the string as expected for one change to the branch.
         Please note that this is not a fully viable fast import text strig, as it
@@ -81,27 +87,40 @@ class AccumulatedCommitData(BaseModel):
         - From: Indicates the parent commit reference (if it exists). Done by using the repo context and looking for the last commit on the branch
         - File changes: Specifies the permissions, path, and content of the files being added/modified.
 
+        Args:
+            parent (Optional[str]): Parent commit. Looking up the branch tip
+                here is racy with concurrent writers, metadata_writer passes the
+                tip it checks with its compare-and-swap update instead.
+            ref (Optional[str]): Ref written by fast-import instead of the
+                branch. If given without parent, the commit continues the chain
+                of the previous commit to that ref in the same fast-import run.
+
         Returns:
             str: Fast-import compatible format. Still lacking info. Needs to be used with
             to_fast_import_format
         """
         result = []
-        result.append(f"commit refs/heads/{self.branch_name}")
+        result.append(f"commit {ref or f'refs/heads/{self.branch_name}'}")
         result.append(
-            f"committer {self.committer_name} <{self.committer_email}> {self.timestamp} {self.timezone}"
+            f"committer {self.committer_name} <{self.committer_email}> "
+            f"{self.timestamp} {self.timezone}"
         )
         result.append(f"data {self.message_length}")
         result.append(self.message)
-        with repo_context.repo_context() as repo:
-            try:
-                from_message: str = (
-                    f"from {repo.git.rev_parse(f'refs/heads/{self.branch_name}')}"
-                )
-                result.append(from_message)
-            except GitCommandError:
-                print(
-                    "This will be the first commit on the feature data branch"
+        if parent is not None:
+            result.append(f"from {parent}")
+        elif ref is None:
+            with repo_context.repo_context() as repo:
+                tip = get_resolver(repo).resolve(
+                    f"refs/heads/{self.branch_name}"
                 )
+                if tip is not None:
+                    result.append(f"from {tip}")
+                else:
+                    print(
+                        "This will be the first commit on the feature data "
+                        "branch"
+                    )
         for change in self.add_files:
             result.append(f"M {change.permissions} inline {change.file_path}")
             # print(
@@ -125,6 +144,228 @@ def to_fast_import_format(commits: list[AccumulatedCommitData]) -> str:
     return "\n".join(result) + "\n"
 
 
+class FastImportException(Exception): ...
+
+
+class FastImportWriter:
+    """
+    Streams commits into the stdin pipe of one git fast-import process. Every
+    commit is encoded to bytes once and written at once, so neither the script
+    is held in memory nor written to a file first. With export_marks,
+    fast-import reports the ids of the written commits at the end, so no
+    rev-parse is needed to learn them. A long-running writer can publish what it
+    wrote so far with checkpoint.
+
+    Use it as a context manager: if the block raises, fast-import is stopped
+    before the done command and no ref is updated.
+    """
+
+    _marks_files = itertools.count()
+
+    def __init__(
+        self, repo: git.Repo, force: bool = False, export_marks: bool = False
+    ):
+        self._marks_file: Optional[Path] = None
+        args = ["git", "fast-import", "--quiet", "--done"]
+        if force:
+            args.append("--force")
+        if export_marks:
+            self._marks_file = repo_context.get_state_dir(repo).joinpath(
+                f"fast-import-{os.getpid()}-{next(self._marks_files)}.marks"
+            )
+            args.append(f"--export-marks={self._marks_file}")
+        # stdout only carries the answers to get-mark
+        self._process = subprocess.Popen(
+            args,
+            cwd=repo.working_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._next_mark = 1
+        self.marks: dict[str, str] = {}
+
+    def _write(self, *parts: bytes):
+        try:
+            self._process.stdin.write(b"".join(parts))
+        except BrokenPipeError:
+            self._process.wait()
+            raise FastImportException(
+                f"git fast-import exited with {self._process.returncode}"
+            )
+
+    def _mark(self) -> str:
+        mark = f":{self._next_mark}"
+        self._next_mark += 1
+        return mark
+
+    def write_commit(
+        self,
+        ref: str,
+        committer: str,
+        message: str,
+        parent: Optional[str] = None,
+        files: Iterable[tuple[str, str, bytes]] = (),
+        merges: Iterable[str] = (),
+        existing_files: Iterable[tuple[str, str, str]] = (),
+        removed_paths: Iterable[str] = (),
+    ) -> str:
+        """
+        Write one commit with inline file contents.
+
+        Args:
+            ref (str): Ref that points to the commit afterwards
+            committer (str): "<name> <<email>> <timestamp> <timezone>"
+            message (str): Commit message
+            parent (Optional[str]): Parent commit or mark. Without parent the
+                commit continues the previous commit to ref in this run, or
+                starts a new history.
+            files (Iterable[tuple[str, str, bytes]]): (mode, path, content) of
+                the added files
+            merges (Iterable[str]): Further parents, commits or marks
+            existing_files (Iterable[tuple[str, str, str]]): (mode, blob oid,
+                path) of added files whose blobs already exist
+            removed_paths (Iterable[str]): Files of the parent that are removed
+
+        Returns:
+            str: Mark of the commit, resolved in marks after close if
+                export_marks is set
+        """
+        mark = self._mark()
+        encoded_message = message.encode("utf-8")
+        parts = [
+            f"commit {ref}\nmark {mark}\ncommitter {committer}\n".encode(
+                "utf-8"
+            ),
+            b"data %d\n" % len(encoded_message),
+            encoded_message,
+            b"\n",
+        ]
+        if parent is not None:
+            parts.append(f"from {parent}\n".encode("utf-8"))
+        for merge in merges:
+            parts.append(f"merge {merge}\n".encode("utf-8"))
+        for mode, oid, path in existing_files:
+            parts.append(f"M {mode} {oid} {path}\n".encode("utf-8"))
+        for path in removed_paths:
+            parts.append(f"D {path}\n".encode("utf-8"))
+        for mode, path, content in files:
+            parts += [
+                f"M {mode} inline {path}\n".encode("utf-8"),
+                b"data %d\n" % len(content),
+                content,
+                b"\n",
+            ]
+        self._write(*parts)
+        return mark
+
+    def add_commit(
+        self,
+        commit: AccumulatedCommitData,
+        parent: Optional[str] = None,
+        ref: Optional[str] = None,
+    ) -> str:
+        """
+        Write an AccumulatedCommitData, see write_commit.
+        """
+        return self.write_commit(
+            ref or f"refs/heads/{commit.branch_name}",
+            f"{commit.committer_name} <{commit.committer_email}> "
+            f"{commit.timestamp} {commit.timezone}",
+            commit.message,
+            parent,
+            [
+                (
+                    change.permissions,
+                    str(change.file_path),
+                    change.content.encode("utf-8"),
+                )
+                for change in commit.add_files
+            ],
+        )
+
+    def checkpoint(self, mark: str) -> str:
+        """
+        Write the pack and the refs of everything streamed so far, so other git
+        processes see it, and wait until fast-import is done with that.
+
+        Args:
+            mark (str): Mark of a written commit
+
+        Raises:
+            FastImportException: fast-import failed
+
+        Returns:
+            str: Commit id of the mark
+        """
+        # commands run in order, the answer to get-mark comes after the
+        # checkpoint finished
+        self._write(f"checkpoint\nget-mark {mark}\n".encode("utf-8"))
+        try:
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            pass
+        oid = self._process.stdout.readline().decode("ascii").strip()
+        if not oid:
+            self._process.wait()
+            raise FastImportException(
+                f"git fast-import exited with {self._process.returncode}"
+            )
+        self.marks[mark] = oid
+        return oid
+
+    def close(self) -> dict[str, str]:
+        """
+        Finish the stream and wait until fast-import has updated the refs.
+
+        Raises:
+            FastImportException: fast-import failed, no ref was updated
+
+        Returns:
+            dict[str, str]: Commit id of every mark if export_marks is set
+        """
+        self._write(b"done\n")
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process.stdout.close()
+        if self._process.wait() != 0:
+            if self._marks_file is not None:
+                self._marks_file.unlink(missing_ok=True)
+            raise FastImportException(
+                f"git fast-import exited with {self._process.returncode}"
+            )
+        if self._marks_file is not None:
+            for line in self._marks_file.read_text(
+                encoding="utf-8"
+            ).splitlines():
+                mark, _, oid = line.partition(" ")
+                self.marks[mark] = oid
+            self._marks_file.unlink()
+        return self.marks
+
+    def abort(self):
+        self._process.kill()
+        self._process.wait()
+        if self._process.stdin is not None:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self._process.stdout.close()
+        if self._marks_file is not None:
+            self._marks_file.unlink(missing_ok=True)
+
+    def __enter__(self) -> "FastImportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
 # Example Code. This cannot be executed in this context
 if __name__ == "__main__":
     commit_change = FastImportCommitData(
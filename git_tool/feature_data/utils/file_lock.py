@@ -0,0 +1,79 @@
+"""
+Exclusive file locks that work on POSIX (flock) and on Windows (msvcrt). The
+operating system releases the lock when its holder dies, so a crashed writer
+never blocks the next one.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+class FileLockedException(Exception): ...
+
+
+def _try_lock(fd: int) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    # msvcrt locks bytes from the current position, always the first one
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(
+    lock_file: Path, blocking: bool = True
+) -> Generator[None, None, None]:
+    """
+    Exclusive lock on the lock file, which is created if it does not exist.
+
+    Args:
+        lock_file (Path): File to lock
+        blocking (bool): Wait until the lock is free instead of failing
+
+    Raises:
+        FileLockedException: Another process holds the lock and blocking is
+            False
+    """
+    fd = os.open(lock_file, os.O_CREAT | os.O_RDWR)
+    try:
+        if blocking and fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            while not _try_lock(fd):
+                if not blocking:
+                    raise FileLockedException(f"{lock_file} is locked")
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
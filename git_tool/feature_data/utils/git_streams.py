@@ -0,0 +1,216 @@
+"""
+Streaming readers for list outputs of git. git is run with -z, so records are
+separated by NUL and paths come verbatim, including spaces and newlines. The
+records are parsed from the pipe chunk by chunk, so memory stays constant no
+matter how long the output is. Stopping the iteration early stops git. If git
+fails, GitCommandError is raised once its output is exhausted, like repo.git
+does. BlobReader reads the blobs such lists point to through one cat-file
+process.
+"""
+
+import subprocess
+import threading
+from typing import IO, Generator, Iterable, NamedTuple, Optional
+
+import git
+
+CHUNK_SIZE = 65536
+
+
+class TreeEntry(NamedTuple):
+    mode: str
+    object_type: str
+    oid: str
+    path: str
+
+
+def iter_nul_separated(
+    stream: IO[bytes], chunk_size: int = CHUNK_SIZE
+) -> Generator[str, None, None]:
+    """
+    Records of a NUL separated byte stream. Paths that are not valid UTF-8
+    survive as surrogates.
+    """
+    rest = b""
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        *records, rest = (rest + chunk).split(b"\0")
+        for record in records:
+            yield record.decode("utf-8", errors="surrogateescape")
+    if rest:
+        yield rest.decode("utf-8", errors="surrogateescape")
+
+
+def _write_input(
+    stream: IO[bytes], lines: Iterable[str], separator: str = "\n"
+):
+    try:
+        for line in lines:
+            stream.write(
+                f"{line}{separator}".encode("utf-8", errors="surrogateescape")
+            )
+        stream.close()
+    except BrokenPipeError:
+        # git stopped reading, e.g. because the iteration was stopped early
+        pass
+
+
+def iter_git_records(
+    repo: git.Repo,
+    *args: str,
+    stdin_lines: Optional[Iterable[str]] = None,
+    ok_codes: Iterable[int] = (0,),
+    stdin_separator: str = "\n",
+) -> Generator[str, None, None]:
+    """
+    Run git with the given arguments and yield its NUL separated output records.
+    The arguments must make git separate its output with NUL, usually with -z.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        *args (str): git command and arguments, e.g. "ls-tree", "-z", "HEAD"
+        stdin_lines (Optional[Iterable[str]]): Lines for commands reading
+            --stdin. They are written from a thread, so git never blocks on a
+            full output pipe.
+        ok_codes (Iterable[int]): Exit codes that are no error, e.g. (0, 1) for
+            git grep
+        stdin_separator (str): Written after every line, NUL for commands that
+            read NUL separated input with -z
+
+    Raises:
+        git.GitCommandError: git exited with an error
+
+    Yields:
+        str: Output records without empty ones
+    """
+    command = ["git", *args]
+    process = subprocess.Popen(
+        command,
+        cwd=repo.working_dir,
+        stdin=(
+            subprocess.PIPE if stdin_lines is not None else subprocess.DEVNULL
+        ),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    writer = None
+    if stdin_lines is not None:
+        writer = threading.Thread(
+            target=_write_input,
+            args=(process.stdin, stdin_lines, stdin_separator),
+            daemon=True,
+        )
+        writer.start()
+    finished = False
+    try:
+        for record in iter_nul_separated(process.stdout):
+            if record:
+                yield record
+        finished = True
+    finally:
+        process.stdout.close()
+        if not finished and process.poll() is None:
+            process.kill()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        process.wait()
+        if writer is not None:
+            writer.join()
+    if process.returncode not in ok_codes:
+        raise git.GitCommandError(command, process.returncode, stderr)
+
+
+def iter_tree_entries(
+    repo: git.Repo,
+    treeish: str,
+    paths: Iterable[str] = (),
+    recursive: bool = False,
+    directories_only: bool = False,
+) -> Generator[TreeEntry, None, None]:
+    """
+    Entries of git ls-tree -z.
+
+    Args:
+        repo (git.Repo): The Git repository object.
+        treeish (str): Tree, commit or branch to list
+        paths (Iterable[str]): Only list these paths
+        recursive (bool): Descend into subtrees (-r)
+        directories_only (bool): Only list trees (-d), with recursive also the
+            nested ones
+    """
+    options = ["-r"] if recursive else []
+    if directories_only:
+        options.append("-d")
+    for record in iter_git_records(
+        repo, "ls-tree", "-z", *options, treeish, "--", *paths
+    ):
+        meta, _, path = record.partition("\t")
+        mode, object_type, oid = meta.split(" ")
+        yield TreeEntry(mode, object_type, oid, path)
+
+
+def iter_tree_names(
+    repo: git.Repo,
+    treeish: str,
+    paths: Iterable[str] = (),
+    recursive: bool = False,
+    directories_only: bool = False,
+) -> Generator[str, None, None]:
+    """
+    Paths of git ls-tree -z --name-only, see iter_tree_entries.
+    """
+    options = ["-r"] if recursive else []
+    if directories_only:
+        options.append("-d")
+    yield from iter_git_records(
+        repo, "ls-tree", "-z", "--name-only", *options, treeish, "--", *paths
+    )
+
+
+def iter_log_commits(repo: git.Repo, *args: str) -> Generator[str, None, None]:
+    """
+    Full ids of the commits git log lists for the given revisions, options and
+    pathspecs.
+    """
+    yield from iter_git_records(repo, "log", "-z", "--format=%H", *args)
+
+
+class BlobReader:
+    """
+    Reads many blobs through one git cat-file --batch process.
+    """
+
+    def __init__(self, repo: git.Repo):
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo.working_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, oids: list[str]) -> list[Optional[bytes]]:
+        # written from a thread, cat-file may block on a full stdout before
+        # reading all of stdin
+        writer = threading.Thread(
+            target=self._write_request,
+            args=("".join(f"{oid}\n" for oid in oids),),
+        )
+        writer.start()
+        contents = []
+        for _ in oids:
+            header = self._process.stdout.readline().split()
+            if len(header) != 3:  # "<oid> missing"
+                contents.append(None)
+                continue
+            contents.append(self._process.stdout.read(int(header[2])))
+            self._process.stdout.read(1)
+        writer.join()
+        return contents
+
+    def _write_request(self, request: str):
+        self._process.stdin.write(request.encode())
+        self._process.stdin.flush()
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process.wait()
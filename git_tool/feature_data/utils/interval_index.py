@@ -0,0 +1,59 @@
+"""
+Static interval tree for line ranges. The intervals are sorted by start and
+stored as an implicit balanced binary tree over that array: the node of the
+slice [lo, hi) is its middle element and knows the largest end below it.
+Building is O(n log n), an overlap query is O(log n + k) for k hits.
+"""
+
+from typing import Generic, Hashable, Iterable, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class IntervalIndex(Generic[T]):
+    def __init__(self, intervals: Iterable[tuple[int, int, T]]):
+        """
+        Args:
+            intervals (Iterable[tuple[int, int, T]]): (start, end, value) with
+                inclusive bounds
+        """
+        self._intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._max_end = [0] * len(self._intervals)
+        self._build(0, len(self._intervals))
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def _build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return -1
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(
+            self._intervals[mid][1],
+            self._build(lo, mid),
+            self._build(mid + 1, hi),
+        )
+        return self._max_end[mid]
+
+    def overlapping(self, start: int, end: int) -> list[T]:
+        """
+        Values of all intervals that share at least one line with [start, end].
+        """
+        found: list[T] = []
+        self._query(0, len(self._intervals), start, end, found)
+        return found
+
+    def _query(self, lo: int, hi: int, start: int, end: int, found: list[T]):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            return
+        self._query(lo, mid, start, end, found)
+        interval_start, interval_end, value = self._intervals[mid]
+        if interval_start > end:
+            # everything right of mid starts even later
+            return
+        if interval_end >= start:
+            found.append(value)
+        self._query(mid + 1, hi, start, end, found)
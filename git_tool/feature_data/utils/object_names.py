@@ -0,0 +1,166 @@
+"""
+Shared resolution of object names. Abbreviated ids, refs and revision
+expressions like "main~2" or "<branch>:<path>" are resolved through one
+long-running git cat-file --batch-check process per repository instead of one
+rev-parse process per name. Only names that start with a full object id, like
+"<oid>" or "<oid>:<path>", are kept in an LRU cache, as they mean the same
+object forever. Refs and abbreviated ids are asked again on every call, so a
+moved ref is never answered from the cache.
+"""
+
+import atexit
+import os
+import re
+import subprocess
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+import git
+
+RESOLVE_CACHE_SIZE = 65536
+RESOLVE_BATCH_SIZE = 512
+FULL_OID = re.compile(r"^[0-9a-f]{40}$")
+# a full id, optionally followed by a suffix like ^{commit}, ~2 or :<path>
+IMMUTABLE_NAME = re.compile(r"^[0-9a-f]{40}(?:[~^:]|$)")
+
+
+class ObjectName(NamedTuple):
+    oid: str
+    object_type: str
+
+
+class ObjectNameResolver:
+    def __init__(self, repo: git.Repo, cache_size: int = RESOLVE_CACHE_SIZE):
+        self.repo = repo
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Optional[ObjectName]] = OrderedDict()
+        self._process: Optional[subprocess.Popen] = None
+        self._pid = None
+
+    def _batch_check(self, names: list[str]) -> list[Optional[ObjectName]]:
+        if self._process is None or self._pid != os.getpid():
+            # a process inherited through fork shares its pipes with the parent
+            self._process = subprocess.Popen(
+                [
+                    "git",
+                    "cat-file",
+                    "--batch-check=%(objectname) %(objecttype)",
+                ],
+                cwd=self.repo.working_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            self._pid = os.getpid()
+        results = []
+        for start in range(0, len(names), RESOLVE_BATCH_SIZE):
+            batch = names[start : start + RESOLVE_BATCH_SIZE]
+            self._process.stdin.write("".join(f"{name}\n" for name in batch))
+            self._process.stdin.flush()
+            for _ in batch:
+                # "<oid> <type>", or "<name> missing" / "<name> ambiguous"
+                oid, _, object_type = (
+                    self._process.stdout.readline().rstrip("\n").rpartition(" ")
+                )
+                if object_type in ("missing", "ambiguous"):
+                    results.append(None)
+                else:
+                    results.append(ObjectName(oid, object_type))
+        return results
+
+    def lookup_many(
+        self, names: Iterable[str]
+    ) -> dict[str, Optional[ObjectName]]:
+        """
+        Resolve many names with one round-trip for all names that are not
+        cached.
+
+        Returns:
+            dict[str, Optional[ObjectName]]: name -> object, None for unknown or
+                ambiguous names
+        """
+        found: dict[str, Optional[ObjectName]] = {}
+        misses = []
+        for name in names:
+            if name in found:
+                continue
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                found[name] = self._cache[name]
+            elif "\n" in name or not name:
+                found[name] = None
+            else:
+                found[name] = None
+                misses.append(name)
+        for name, value in zip(misses, self._batch_check(misses)):
+            found[name] = value
+            # a missing object may still be written later
+            if value is not None and IMMUTABLE_NAME.match(name):
+                self._cache[name] = value
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return found
+
+    def resolve_many(
+        self, names: Iterable[str], object_type: Optional[str] = None
+    ) -> dict[str, str]:
+        """
+        Full object ids of the given names. Unknown names and, with object_type,
+        objects of other types are left out.
+        """
+        return {
+            name: value.oid
+            for name, value in self.lookup_many(names).items()
+            if value is not None and object_type in (None, value.object_type)
+        }
+
+    def resolve(
+        self, name: str, object_type: Optional[str] = None
+    ) -> Optional[str]:
+        return self.resolve_many([name], object_type).get(name)
+
+    def resolve_commits(self, names: Iterable[str]) -> dict[str, str]:
+        """
+        Commit ids of the given names, tags are peeled like rev-parse
+        <name>^{commit} does.
+        """
+        names = list(names)
+        resolved = self.resolve_many(
+            (f"{name}^{{commit}}" for name in names), object_type="commit"
+        )
+        return {
+            name: resolved[f"{name}^{{commit}}"]
+            for name in names
+            if f"{name}^{{commit}}" in resolved
+        }
+
+    def resolve_commit(self, name: str) -> Optional[str]:
+        return self.resolve_commits([name]).get(name)
+
+    def close(self):
+        if self._process is not None and self._pid == os.getpid():
+            self._process.stdin.close()
+            self._process.stdout.close()
+            self._process.wait()
+        self._process = None
+
+
+_resolvers: dict[str, ObjectNameResolver] = {}
+
+
+def get_resolver(repo: git.Repo) -> ObjectNameResolver:
+    """
+    The shared resolver of a repository, one per git dir and process.
+    """
+    key = os.path.realpath(repo.git_dir)
+    resolver = _resolvers.get(key)
+    if resolver is None:
+        resolver = _resolvers[key] = ObjectNameResolver(repo)
+    return resolver
+
+
+@atexit.register
+def close_resolvers():
+    for resolver in _resolvers.values():
+        resolver.close()
+    _resolvers.clear()
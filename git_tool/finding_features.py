@@ -10,6 +10,13 @@ class FeatureMatches:
     code: str
 
 
+@dataclass
+class FeatureAnnotation:
+    name: str
+    start_line: int
+    end_line: int
+
+
 def extract_features_from_annotation(text: str) -> list[FeatureMatches]:
     """Extract Features as well as information about their location in code depending on
     &begin[] und &end[] Tags.
@@ -34,6 +41,37 @@ def extract_features_from_annotation(text: str) -> list[FeatureMatches]:
     return feature_list
 
 
+def extract_annotation_ranges(text: str) -> list[FeatureAnnotation]:
+    """Find the line ranges enclosed by &begin[] and &end[] tags, including the
+    tag lines. Unlike extract_features_from_annotation this also finds
+    annotations nested in other ones. Tags without counterpart are ignored.
+
+    @param text: content from which annotations are extracted
+    """
+    tag_pattern = r"&(?P<Tag>begin|end)\[(?P<FeatureName>.*?)\]"
+    open_tags: list[tuple[str, int]] = []
+    annotations = []
+    line = 1
+    position = 0
+    for match in re.finditer(tag_pattern, text):
+        line += text.count("\n", position, match.start())
+        position = match.start()
+        name = match.group("FeatureName")
+        if match.group("Tag") == "begin":
+            open_tags.append((name, line))
+            continue
+        for index in range(len(open_tags) - 1, -1, -1):
+            if open_tags[index][0] == name:
+                annotations.append(
+                    FeatureAnnotation(
+                        name=name, start_line=open_tags[index][1], end_line=line
+                    )
+                )
+                del open_tags[index]
+                break
+    return sorted(annotations, key=lambda annotation: annotation.start_line)
+
+
 def get_features_for_diff(diff: Diff) -> list[FeatureMatches]:
     str_diff = (
         diff.diff.decode("utf-8") if isinstance(diff.diff, bytes) else diff.diff
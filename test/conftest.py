@@ -1 +1,2 @@
-from fixtures.git_test_repo import git_repo
+from fixtures.git_test_repo import git_repo, repo
+from fixtures.metadata_repo import remote_repo
@@ -1,18 +1,66 @@
+import os
 import shutil
+from typing import Optional
 
 import pytest
 from git import Repo
 
 
-@pytest.fixture(scope="module")
-def git_repo(tmp_path_factory):
-    repo_path = tmp_path_factory.mktemp("git_repo")
-    repo = Repo.init(repo_path)
+def set_test_identity(repo: Repo) -> Repo:
     repo.config_writer().set_value("user", "name", "Test User").release()
     repo.config_writer().set_value(
         "user", "email", "test@example.com"
     ).release()
+    return repo
+
+
+def init_repo(path, **kwargs) -> Repo:
+    """
+    New repository with the test identity, for tests that need more than one.
+    """
+    return set_test_identity(Repo.init(path, **kwargs))
+
+
+def commit_files(
+    repo: Repo,
+    files: dict[str, str],
+    message: str = "change",
+    timestamp: Optional[int] = None,
+) -> str:
+    """
+    Write the files into the working tree and commit them with git commit.
+
+    Returns:
+        str: Full id of the new commit
+    """
+    for path, content in files.items():
+        file = os.path.join(repo.working_dir, path)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+    repo.git.add("--", *files)
+    env = {}
+    if timestamp is not None:
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = (
+            f"{timestamp} +0000"
+        )
+    repo.git.commit("-m", message, env=env)
+    return repo.head.commit.hexsha
+
+
+@pytest.fixture(scope="module")
+def git_repo(tmp_path_factory):
+    repo_path = tmp_path_factory.mktemp("git_repo")
+    repo = init_repo(repo_path)
 
     yield repo
 
     shutil.rmtree(repo_path)
+
+
+@pytest.fixture
+def repo(tmp_path) -> Repo:
+    """
+    Empty repository with the test identity in the tmp_path of the test.
+    """
+    return init_repo(tmp_path)
@@ -0,0 +1,57 @@
+import subprocess
+
+import pytest
+from git import Repo
+
+from fixtures.git_test_repo import set_test_identity
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+
+
+def clone_repo(remote: Repo, path) -> Repo:
+    return set_test_identity(Repo.clone_from(remote.working_dir, path))
+
+
+def write_fact(
+    repo: Repo,
+    path: str,
+    timestamp: int = 1700000000,
+    content: bytes | None = None,
+) -> str:
+    """
+    Append one fact commit to the local metadata branch, like
+    add_fact_to_metadata_branch does.
+    """
+    content = content or f'{{"fact": "{path}"}}'.encode()
+    script = [
+        f"commit refs/heads/{FEATURE_BRANCH_NAME}".encode(),
+        f"committer Test User <test@example.com> {timestamp} +0000".encode(),
+        b"data 4",
+        b"fact",
+    ]
+    if FEATURE_BRANCH_NAME in repo.heads:
+        script.append(f"from refs/heads/{FEATURE_BRANCH_NAME}^0".encode())
+    script += [
+        f"M 644 inline {path}".encode(),
+        f"data {len(content)}".encode(),
+        content,
+        b"done",
+        b"",
+    ]
+    subprocess.run(
+        ["git", "fast-import", "--quiet"],
+        input=b"\n".join(script),
+        cwd=repo.working_dir,
+        check=True,
+    )
+    return repo.git.rev_parse(FEATURE_BRANCH_NAME)
+
+
+def metadata_files(repo: Repo, ref: str = FEATURE_BRANCH_NAME) -> set[str]:
+    return set(repo.git.ls_tree("-r", "--name-only", ref).splitlines())
+
+
+@pytest.fixture
+def remote_repo(tmp_path) -> Repo:
+    return Repo.init(tmp_path / "remote.git", bare=True)
@@ -0,0 +1,40 @@
+from fixtures.git_test_repo import commit_files
+from fixtures.metadata_repo import metadata_files, write_fact
+
+from git_tool.feature_data.add_feature_data.backfill import backfill_facts
+from git_tool.feature_data.models_and_context.feature_index import (
+    get_feature_index,
+)
+
+
+def test_backfill_derives_features_from_changed_annotations(repo):
+    first = commit_files(repo, {"a.c": "x\n// &begin[foo]\n1\n// &end[foo]\n"})
+    second = commit_files(
+        repo,
+        {
+            "a.c": "x\n// &begin[foo]\n1\n// &end[foo]\n"
+            "// &begin[bar]\n2\n// &end[bar]\n"
+        },
+    )
+    third = commit_files(repo, {"b.txt": "no annotations\n"})
+    write_fact(repo, "other/0000000000000000000000000000000000000000/fact")
+
+    written = []
+
+    def write_concurrently(progress):
+        # another writer moves the branch while the backfill runs
+        written.append(write_fact(repo, f"other/{progress.analysed}/fact"))
+
+    result = backfill_facts(
+        repo, ["HEAD"], jobs=2, chunk_size=1, progress=write_concurrently
+    )
+
+    assert (result.analysed, result.facts) == (3, 2)
+    index = get_feature_index(repo)
+    assert index.features_of_commit(first) == ["foo"]
+    assert index.features_of_commit(second) == ["bar"]
+    assert index.features_of_commit(third) == []
+    assert {f"other/{i}/fact" for i in (1, 2, 3)} <= metadata_files(repo)
+
+    again = backfill_facts(repo, ["HEAD"], jobs=1)
+    assert (again.analysed, again.skipped) == (0, 3)
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from git_tool.feature_data.analyze_feature_data.cochange import CoChangeMatrix
+
+C1 = "11" * 20
+C2 = "22" * 19 + "00"
+C3 = "33" * 20
+
+
+def _as_dict(
+    matrix: CoChangeMatrix, cochange=None
+) -> dict[tuple[str, str], int]:
+    cochange = (matrix.cochange if cochange is None else cochange).tocoo()
+    return {
+        (matrix.features[r], matrix.features[c]): int(v)
+        for r, c, v in zip(cochange.row, cochange.col, cochange.data)
+    }
+
+
+def test_cochange_counts_commits_touching_both_features():
+    matrix = CoChangeMatrix.from_pairs(
+        [("a", C1), ("b", C1), ("a", C2), ("c", C3)], tip="tip"
+    )
+
+    counts = _as_dict(matrix)
+
+    assert counts[("a", "a")] == 2
+    assert counts[("a", "b")] == counts[("b", "a")] == 1
+    assert ("a", "c") not in counts
+
+
+def test_incremental_update_matches_rebuild():
+    initial = [("a", C1), ("b", C1), ("a", C2)]
+    added = [("c", C2), ("b", C3), ("a", C1)]
+    matrix = CoChangeMatrix.from_pairs(initial, tip="old")
+
+    matrix.add_pairs(added, tip="new")
+
+    rebuilt = CoChangeMatrix.from_pairs(list(set(initial + added)), tip="new")
+    assert _as_dict(matrix) == _as_dict(rebuilt)
+
+
+def test_restrict_to_commits():
+    matrix = CoChangeMatrix.from_pairs(
+        [("a", C1), ("b", C1), ("a", C2), ("b", C2)], tip="tip"
+    )
+
+    counts = _as_dict(matrix, matrix.restrict_to_commits([C2]))
+
+    assert counts[("a", "b")] == 1
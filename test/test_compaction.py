@@ -0,0 +1,55 @@
+from fixtures.metadata_repo import clone_repo, metadata_files, write_fact
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data import outbox
+from git_tool.feature_data.sync_feature_data.compaction import (
+    compact_metadata_branch,
+)
+
+DAY = 24 * 60 * 60
+JAN_2024 = 1704067200
+
+
+def _commit_count(repo, ref=FEATURE_BRANCH_NAME) -> int:
+    return int(repo.git.rev_list("--count", ref))
+
+
+def test_compaction_keeps_tree_and_collapses_history(remote_repo, tmp_path):
+    repo = clone_repo(remote_repo, tmp_path / "dev")
+    # 20 facts in January, 20 in March, 5 recent ones in June
+    for i in range(20):
+        write_fact(repo, f"f/jan{i}/fact", JAN_2024 + i * DAY)
+    for i in range(20):
+        write_fact(repo, f"f/mar{i}/fact", JAN_2024 + 60 * DAY + i * DAY)
+    for i in range(5):
+        write_fact(repo, f"f/jun{i}/fact", JAN_2024 + 160 * DAY + i * DAY)
+    tree_before = repo.git.rev_parse(f"{FEATURE_BRANCH_NAME}^{{tree}}")
+
+    result = compact_metadata_branch(repo, keep_recent=5, period="month")
+
+    assert (result.commits_before, result.commits_after) == (45, 7)
+    assert repo.git.rev_parse(f"{FEATURE_BRANCH_NAME}^{{tree}}") == tree_before
+    assert _commit_count(remote_repo) == 7
+    assert remote_repo.git.rev_parse(FEATURE_BRANCH_NAME) == result.tip
+
+
+def test_other_clone_replays_only_its_new_facts_after_compaction(
+    remote_repo, tmp_path
+):
+    alice = clone_repo(remote_repo, tmp_path / "alice")
+    for i in range(10):
+        write_fact(alice, f"f/a{i}/fact", JAN_2024 + i * DAY)
+    outbox.flush_outbox(alice)
+    bob = clone_repo(remote_repo, tmp_path / "bob")
+    bob.git.branch(FEATURE_BRANCH_NAME, f"origin/{FEATURE_BRANCH_NAME}")
+
+    compact_metadata_branch(alice, keep_recent=0, period="month")
+    outbox.queue_fact_for_push(bob, write_fact(bob, "f/b1/fact"))
+    outbox.flush_outbox(bob)
+
+    assert _commit_count(remote_repo) == 2
+    assert metadata_files(remote_repo) == {
+        f"f/a{i}/fact" for i in range(10)
+    } | {"f/b1/fact"}
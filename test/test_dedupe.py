@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from fixtures.metadata_repo import clone_repo, metadata_files, write_fact
+from git_tool.feature_data.add_feature_data.add_data import (
+    find_recorded_facts,
+    generate_fact_file_path,
+)
+from git_tool.feature_data.models_and_context.fact_model import (
+    ChangeHolder,
+    FeatureFactModel,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data import outbox
+from git_tool.feature_data.sync_feature_data.dedupe import (
+    dedupe_metadata_branch,
+)
+
+COMMIT = "a" * 40
+
+
+def make_fact(minute: int, authors: list[str]) -> FeatureFactModel:
+    return FeatureFactModel(
+        commit=COMMIT,
+        authors=authors,
+        date=datetime(2024, 1, 1, 12, minute),
+        features=["core"],
+        changes=ChangeHolder(
+            code_changes=[], name_change=None, constraint_changes=[]
+        ),
+    )
+
+
+def test_same_fact_written_later_is_recorded(repo):
+    first = make_fact(0, ["A", "B"])
+    [path] = generate_fact_file_path(first, first.features)
+    write_fact(repo, path, content=first.model_dump_json().encode())
+
+    again = make_fact(5, ["B", "A"])
+    [path_again] = generate_fact_file_path(again, again.features)
+    other = make_fact(5, ["C"])
+    [other_path] = generate_fact_file_path(other, other.features)
+
+    assert path_again != path and path_again[-7:] == path[-7:]
+    assert find_recorded_facts(repo, [path_again, other_path]) == {path_again}
+
+
+def test_dedupe_removes_later_copies_of_a_fact(repo):
+    for minute, authors in [(0, ["A"]), (1, ["B"]), (2, ["A"])]:
+        fact = make_fact(minute, authors)
+        write_fact(
+            repo,
+            f"core/{COMMIT}/2024-01-01T12-0{minute}-old{minute}",
+            content=fact.model_dump_json().encode(),
+        )
+    write_fact(repo, f"core/{COMMIT}/unparsable")
+    write_fact(
+        repo,
+        f"other/{COMMIT}/2024-01-01T12-02-old2",
+        content=make_fact(2, ["A"]).model_dump_json().encode(),
+    )
+
+    assert dedupe_metadata_branch(repo, dry_run=True).duplicates == [
+        f"core/{COMMIT}/2024-01-01T12-02-old2"
+    ]
+    result = dedupe_metadata_branch(repo)
+
+    assert result.facts == 5
+    assert metadata_files(repo) == {
+        f"core/{COMMIT}/2024-01-01T12-00-old0",
+        f"core/{COMMIT}/2024-01-01T12-01-old1",
+        f"core/{COMMIT}/unparsable",
+        f"other/{COMMIT}/2024-01-01T12-02-old2",
+    }
+    assert dedupe_metadata_branch(repo).duplicates == []
+
+
+def test_removed_duplicates_stay_removed_on_the_remote(remote_repo, tmp_path):
+    alice = clone_repo(remote_repo, tmp_path / "alice")
+    for minute in (0, 5):
+        fact = make_fact(minute, ["A"])
+        path = f"core/{COMMIT}/2024-01-01T12-0{minute}-old{minute}"
+        write_fact(alice, path, content=fact.model_dump_json().encode())
+    outbox.flush_outbox(alice)
+    bob = clone_repo(remote_repo, tmp_path / "bob")
+    bob.git.branch(FEATURE_BRANCH_NAME, f"origin/{FEATURE_BRANCH_NAME}")
+    duplicate = f"core/{COMMIT}/2024-01-01T12-05-old5"
+
+    # the remote moves between alice's dedupe and her push
+    assert dedupe_metadata_branch(alice).duplicates == [duplicate]
+    outbox.queue_fact_for_push(bob, write_fact(bob, "core/b1/fact"))
+    outbox.flush_outbox(bob)
+    outbox.flush_outbox(alice)
+    assert duplicate not in metadata_files(remote_repo)
+
+    # bob still has the duplicate locally and must not push it again
+    outbox.queue_fact_for_push(bob, write_fact(bob, "core/b2/fact"))
+    outbox.flush_outbox(bob)
+    assert metadata_files(remote_repo) == {
+        f"core/{COMMIT}/2024-01-01T12-00-old0",
+        "core/b1/fact",
+        "core/b2/fact",
+    }
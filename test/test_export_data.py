@@ -0,0 +1,64 @@
+import gzip
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from fixtures.git_test_repo import commit_files
+from fixtures.metadata_repo import write_fact
+
+from git_tool.feature_data.models_and_context.fact_model import (
+    ChangeHolder,
+    FeatureFactModel,
+)
+from git_tool.feature_data.read_feature_data.export_data import (
+    default_export_format,
+    export_facts,
+    infer_export_format,
+)
+
+
+def test_export_streams_facts_in_batches(repo, tmp_path):
+    commits = []
+    for i in range(3):
+        commits.append(
+            commit_files(repo, {f"file{i}.py": "pass\n"}, f"commit {i}")
+        )
+        fact = FeatureFactModel(
+            commit=commits[-1],
+            authors=["Test User"],
+            date=datetime(2024, 1, 1, 12, i),
+            features=["core"],
+            changes=ChangeHolder(
+                code_changes=[], name_change=None, constraint_changes=[]
+            ),
+        )
+        write_fact(
+            repo,
+            f"core/{commits[-1]}/fact",
+            content=fact.model_dump_json().encode(),
+        )
+    write_fact(repo, "core/unparsable/fact")
+
+    output = tmp_path / "facts.jsonl.gz"
+    result = export_facts(repo, output, batch_size=2)
+
+    with gzip.open(output, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert (result.rows, result.skipped) == (3, 1)
+    assert {row["commit"]: row["files"] for row in rows} == {
+        commit: [f"file{i}.py"] for i, commit in enumerate(commits)
+    }
+    assert {row["feature_name"] for row in rows} == {"core"}
+
+
+def test_export_format_follows_the_output_extension():
+    assert infer_export_format(Path("out.jsonl.gz")) == "jsonl"
+    assert infer_export_format(Path("out.csv.gz"), "csv") == "csv"
+    assert infer_export_format(Path("out.dat"), "arrow") == "arrow"
+    assert infer_export_format(Path("out.dat")) == default_export_format()
+    with pytest.raises(ValueError):
+        infer_export_format(Path("out.jsonl.gz"), "parquet")
+    with pytest.raises(ValueError):
+        infer_export_format(None, "xlsx")
@@ -0,0 +1,75 @@
+import pytest
+
+from git_tool.feature_data.models_and_context.feature_index import (
+    FeatureCommitIndex,
+)
+
+C1 = "11" * 20
+C2 = "22" * 19 + "00"
+C3 = "33" * 20
+
+
+def test_both_directions_of_the_relation():
+    index = FeatureCommitIndex.from_pairs(
+        [("b", C3), ("a", C1), ("b", C1), ("a", C2), ("a", C1)], tip="0" * 40
+    )
+
+    assert index.features == ["a", "b"]
+    assert index.relation_count == 4
+    assert index.commits_of_feature("a") == [C1, C2]
+    assert index.features_of_commit(C1) == ["a", "b"]
+    assert index.features_of_commit(C2[:7]) == ["a"]
+    assert index.features_of_commit("44" * 20) == []
+    assert index.has_feature(C3, "b") and not index.has_feature(C3, "a")
+
+
+def test_commit_sets(tmp_path):
+    index = FeatureCommitIndex.from_pairs(
+        [("a", C1), ("b", C1), ("a", C2), ("b", C3)], tip="0" * 40
+    )
+    index.save(tmp_path / "index.bin")
+    index = FeatureCommitIndex.load(tmp_path / "index.bin")
+
+    assert index.commits_of_mask(index.commits_with_all(["a", "b"])) == [C1]
+    assert index.commits_of_mask(index.commits_with_any(["a", "b"])) == [
+        C1,
+        C2,
+        C3,
+    ]
+    only_a = index.commit_mask("a") & ~index.commit_mask("b")
+    assert index.commits_of_mask(only_a) == [C2]
+    assert index.commits_of_mask(index.mask_of_commits([C3, "44" * 20])) == [C3]
+
+
+def test_added_pairs_are_merged_like_a_rebuild():
+    base = [("b", C1), ("b", C3)]
+    added = [("a", C2), ("c", C1), ("b", C3), ("a", "00" * 20)]
+    merged = FeatureCommitIndex.from_pairs(base, tip="0" * 40).with_pairs(
+        added, "1" * 40
+    )
+    rebuilt = FeatureCommitIndex.from_pairs(base + added, tip="1" * 40)
+
+    for attribute in (
+        "features",
+        "commits",
+        "commit_offsets",
+        "commit_features",
+        "feature_offsets",
+        "feature_commits",
+    ):
+        assert getattr(merged, attribute) == getattr(rebuilt, attribute)
+    assert merged.features_of_commit(C1) == ["b", "c"]
+
+
+def test_failed_save_keeps_the_previous_index(tmp_path, monkeypatch):
+    old = FeatureCommitIndex.from_pairs([("a", C1)], tip="0" * 40)
+    old.save(tmp_path / "index.bin")
+    new = FeatureCommitIndex.from_pairs([("b", C2)], tip="1" * 40)
+    # fail after the header has been written
+    monkeypatch.setattr(new, "commit_offsets", None)
+
+    with pytest.raises(AttributeError):
+        new.save(tmp_path / "index.bin")
+
+    assert FeatureCommitIndex.load(tmp_path / "index.bin").tip == "0" * 40
+    assert [p.name for p in tmp_path.iterdir()] == ["index.bin"]
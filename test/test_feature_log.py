@@ -0,0 +1,57 @@
+import pytest
+
+from fixtures.git_test_repo import commit_files
+from fixtures.metadata_repo import write_fact
+from git_tool.feature_data.models_and_context.repo_context import (
+    get_repo_path,
+    set_repo_path,
+    update_last_execution_time,
+)
+from git_tool.feature_data.read_feature_data.parse_data import (
+    FeatureNotFoundException,
+    get_feature_log,
+)
+
+
+@pytest.fixture
+def feature_repo(repo):
+    for i, feature in enumerate(["foo", "bar", "foo"]):
+        commit = commit_files(
+            repo, {f"c{i}": ""}, f"c{i}", timestamp=1700000000 + i * 60
+        )
+        write_fact(repo, f"{feature}/{commit}/fact")
+    # the metadata branch is fresh, so repo_context does not fetch
+    update_last_execution_time(repo)
+    previous = get_repo_path()
+    set_repo_path(repo.working_dir)
+    yield repo
+    set_repo_path(previous)
+
+
+def _log(capfd, *args: str) -> list[str]:
+    capfd.readouterr()
+    assert get_feature_log("foo", ["--format=%s", *args]) == 0
+    return capfd.readouterr().out.splitlines()
+
+
+def test_log_shows_the_commits_of_a_feature(feature_repo, capfd):
+    assert _log(capfd) == ["c2", "c0"]
+    # git log options are passed through
+    assert _log(capfd, "-n1") == ["c2"]
+
+
+def test_log_keeps_option_values_that_name_revisions(feature_repo, capfd):
+    feature_repo.create_head("nobody")
+    assert _log(capfd, "--author", "nobody") == []
+    assert _log(capfd, "--author", "Test User", "-n", "1") == ["c2"]
+
+
+def test_log_limits_the_commits_to_revision_ranges(feature_repo, capfd):
+    assert _log(capfd, "HEAD~1") == ["c0"]
+    assert _log(capfd, "HEAD~2..HEAD") == ["c2"]
+    assert _log(capfd, "HEAD~1..HEAD~1") == []
+
+
+def test_feature_without_facts_is_not_found(feature_repo):
+    with pytest.raises(FeatureNotFoundException):
+        get_feature_log("unknown")
@@ -0,0 +1,39 @@
+import pytest
+
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.add_feature_data.backfill import backfill_facts
+from git_tool.feature_data.feature_repository import (
+    FeatureRepository,
+    UnknownRevisionException,
+)
+
+
+def test_feature_repository_answers_from_one_session_without_output(
+    repo, capfd
+):
+    first = commit_files(
+        repo, {"a.c": "// &begin[foo]\nx\n// &end[foo]\n"}, "add a"
+    )
+    second = commit_files(
+        repo, {"b.c": "// &begin[bar]\ny\n// &end[bar]\n"}, "add b"
+    )
+    backfill_facts(repo, ["HEAD"], jobs=1)
+    capfd.readouterr()
+
+    with FeatureRepository(repo.working_dir) as features:
+        assert list(features.features()) == ["bar", "foo"]
+        assert list(features.commits_of_feature("foo")) == [first]
+        assert list(features.features_of_commit("HEAD")) == ["bar"]
+        assert list(features.features_of_path("a.c")) == ["foo"]
+        assert features.feature_uuid("foo") == "foo"
+        assert [fact.commit for fact in features.facts(revision="HEAD~1")] == [
+            first
+        ]
+        assert sorted(fact.commit for fact in features.facts()) == sorted(
+            [first, second]
+        )
+        assert [entry.path for entry in features.status()] == []
+        with pytest.raises(UnknownRevisionException):
+            list(features.features_of_commit("unknown"))
+
+    assert capfd.readouterr() == ("", "")
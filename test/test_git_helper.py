@@ -0,0 +1,31 @@
+from fixtures.git_test_repo import init_repo
+from git_tool.feature_data.git_helper import branches_containing
+
+
+def test_branch_containment_matches_git_branch_contains(tmp_path):
+    repo = init_repo(tmp_path, initial_branch="main")
+
+    def commit(message: str) -> str:
+        repo.git.commit("--allow-empty", "-m", message)
+        return repo.head.commit.hexsha
+
+    commits = [commit("base")]
+    repo.git.checkout("-b", "topic")
+    commits += [commit("topic 1"), commit("topic 2")]
+    repo.git.checkout("main")
+    commits.append(commit("main 1"))
+    repo.git.branch("release")
+    repo.git.merge("--no-ff", "-m", "merge topic", "topic")
+    commits.append(repo.head.commit.hexsha)
+    repo.git.checkout("-b", "empty", commits[0])
+    repo.git.checkout("main")
+
+    containment = branches_containing(repo, commits + [commits[1][:10]])
+
+    for commit_id in commits:
+        expected = {
+            branch.strip()
+            for branch in repo.git.branch("--contains", commit_id).splitlines()
+        }
+        assert containment[commit_id] == expected
+    assert containment[commits[1][:10]] == containment[commits[1]]
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pytest
+
+from fixtures.git_test_repo import commit_files
+from fixtures.metadata_repo import write_fact
+from git_tool.feature_data.git_status_per_feature import iter_status_entries
+from git_tool.feature_data.status_watch import (
+    InotifyUnavailableException,
+    InotifyWatcher,
+    StatusState,
+)
+
+
+def test_status_entries_keep_special_paths_and_renames(repo, tmp_path):
+    commit_files(
+        repo, {"old name.txt": "content\n" * 10, "tracked.txt": "a\n"}, "init"
+    )
+
+    repo.git.mv("old name.txt", "new name.txt")
+    tmp_path.joinpath("tracked.txt").write_text("b\n")
+    tmp_path.joinpath("line\nbreak ä.txt").write_text("new\n")
+
+    entries = {entry.path: entry for entry in iter_status_entries(repo)}
+
+    renamed = entries["new name.txt"]
+    assert renamed.kind == "renamed"
+    assert renamed.original_path == "old name.txt"
+    assert renamed.staged and not renamed.unstaged
+    assert entries["tracked.txt"].unstaged and not entries["tracked.txt"].staged
+    assert entries["line\nbreak ä.txt"].untracked
+    assert [e.path for e in iter_status_entries(repo, untracked=False)] == [
+        "new name.txt",
+        "tracked.txt",
+    ]
+
+
+def test_status_state_refreshes_only_given_paths(repo, tmp_path):
+    commit_files(repo, {"a.txt": "a\n", "b.txt": "a\n"}, "init")
+    state = StatusState(repo, lambda path: [f"feature-of-{path}"])
+    assert state.refresh_all() == []
+
+    tmp_path.joinpath("a.txt").write_text("changed\n")
+    tmp_path.joinpath("b.txt").write_text("changed\n")
+    changes = state.refresh_paths({"a.txt"})
+
+    assert [(c["op"], c["path"], c["features"]) for c in changes] == [
+        ("set", "a.txt", ["feature-of-a.txt"])
+    ]
+    tmp_path.joinpath("a.txt").write_text("a\n")
+    assert state.refresh_paths({"a.txt"}) == [{"op": "remove", "path": "a.txt"}]
+
+
+def _drain(watcher: InotifyWatcher) -> tuple[set[str], bool, bool, bool]:
+    paths: set[str] = set()
+    flags = [False, False, False]
+    while True:
+        changed, *changed_flags = watcher.read_events()
+        if not changed and not any(changed_flags):
+            return paths, *flags
+        paths |= changed
+        flags = [a or b for a, b in zip(flags, changed_flags)]
+
+
+def test_inotify_watcher_skips_ignored_directories(repo, tmp_path):
+    tmp_path.joinpath(".gitignore").write_text("node_modules/\n")
+    for directory in ("src/core", "node_modules/left-pad"):
+        tmp_path.joinpath(directory).mkdir(parents=True)
+    try:
+        watcher = InotifyWatcher(repo)
+    except InotifyUnavailableException:
+        pytest.skip("inotify is not available")
+    try:
+        tmp_path.joinpath("src/core/a.py").write_text("a\n")
+        tmp_path.joinpath("node_modules/left-pad/index.js").write_text("a\n")
+        assert _drain(watcher) == ({"src/core/a.py"}, False, False, False)
+
+        # a new directory is watched as soon as its creation is read
+        tmp_path.joinpath("src/new").mkdir()
+        assert _drain(watcher)[0] == {"src/new"}
+        tmp_path.joinpath("src/new/b.py").write_text("b\n")
+        assert _drain(watcher)[0] == {"src/new/b.py"}
+
+        repo.git.add("src")
+        assert _drain(watcher)[1]
+        write_fact(repo, "core/fact")
+        assert _drain(watcher)[2]
+    finally:
+        watcher.close()
+
+
+def test_inotify_watcher_reports_overflows(repo, tmp_path):
+    limit = Path("/proc/sys/fs/inotify/max_queued_events")
+    if not limit.exists() or int(limit.read_text()) > 100000:
+        pytest.skip("the inotify queue is too long to fill")
+    tmp_path.joinpath("flood").mkdir()
+    try:
+        watcher = InotifyWatcher(repo)
+    except InotifyUnavailableException:
+        pytest.skip("inotify is not available")
+    try:
+        for i in range(int(limit.read_text()) + 1):
+            tmp_path.joinpath("flood", str(i)).touch()
+        # its creation is dropped with the rest of the full queue
+        tmp_path.joinpath("late").mkdir()
+
+        # after an overflow nothing is known, everything is refreshed
+        assert _drain(watcher)[1:] == (True, True, True)
+        # directories created while events were dropped get their watches
+        tmp_path.joinpath("late/c.py").write_text("c\n")
+        assert _drain(watcher) == ({"late/c.py"}, False, False, False)
+    finally:
+        watcher.close()
@@ -0,0 +1,48 @@
+import git
+import pytest
+from git import Repo
+
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.utils.git_streams import (
+    iter_git_records,
+    iter_log_commits,
+    iter_tree_entries,
+    iter_tree_names,
+)
+
+
+@pytest.fixture
+def repo(repo) -> Repo:
+    for name in [
+        "plain.txt",
+        "with space.txt",
+        "new\nline.txt",
+        "dir/nested.txt",
+    ]:
+        commit_files(repo, {name: name}, f"add {name}")
+    return repo
+
+
+def test_paths_are_returned_verbatim(repo):
+    assert set(iter_tree_names(repo, "HEAD", recursive=True)) == {
+        "plain.txt",
+        "with space.txt",
+        "new\nline.txt",
+        "dir/nested.txt",
+    }
+    assert [
+        entry.path
+        for entry in iter_tree_entries(repo, "HEAD", directories_only=True)
+    ] == ["dir"]
+    assert list(iter_log_commits(repo, "--", "with space.txt")) == [
+        repo.git.rev_parse("HEAD~2")
+    ]
+
+
+def test_early_stop_and_errors(repo):
+    commits = iter_log_commits(repo, "HEAD")
+    assert next(commits) == repo.head.commit.hexsha
+    commits.close()
+
+    with pytest.raises(git.GitCommandError):
+        list(iter_git_records(repo, "ls-tree", "-z", "does-not-exist"))
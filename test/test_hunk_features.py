@@ -0,0 +1,73 @@
+import random
+
+from fixtures.git_test_repo import commit_files
+from fixtures.metadata_repo import write_fact
+
+from git_tool.feature_data.git_status_per_feature import (
+    build_file_feature_index,
+    get_feature_for_hunk,
+    get_staged_hunks,
+)
+from git_tool.feature_data.utils.interval_index import IntervalIndex
+
+
+def test_interval_index_matches_linear_scan():
+    rng = random.Random(7)
+    intervals = []
+    for value in range(300):
+        start = rng.randint(1, 1000)
+        intervals.append((start, start + rng.randint(0, 50), value))
+    index = IntervalIndex(intervals)
+
+    for _ in range(200):
+        start = rng.randint(1, 1050)
+        end = start + rng.randint(0, 20)
+        expected = {v for s, e, v in intervals if s <= end and e >= start}
+        assert set(index.overlapping(start, end)) == expected
+
+
+def test_staged_hunks_resolve_annotations_and_ownership(repo, tmp_path):
+    path = tmp_path.joinpath("main.py")
+    owned = commit_files(
+        repo,
+        {"main.py": "".join(f"line {i}\n" for i in range(1, 11))},
+        "owned by core",
+    )
+    write_fact(repo, f"core/{owned}/fact")
+
+    lines = path.read_text().splitlines()
+    lines[2] = "changed 3"
+    lines += ["# &begin[export]", "def export(): ...", "# &end[export]"]
+    path.write_text("\n".join(lines) + "\n")
+    repo.git.add("main.py")
+
+    hunks = get_staged_hunks(repo)
+    index = build_file_feature_index(repo, "main.py", "main.py")
+
+    assert [(h.new_start, h.new_count) for h in hunks] == [(3, 1), (11, 3)]
+    assert get_feature_for_hunk(index, hunks[0]) == ["core"]
+    # an insertion touches the owned line before it
+    assert get_feature_for_hunk(index, hunks[1]) == ["core", "export"]
+
+
+def test_staged_hunks_take_paths_from_their_own_headers(repo, tmp_path):
+    commit_files(
+        repo,
+        {"link": "a\n", "sp ace.py": "a\n", "ü.py": "a\n"},
+        "base",
+    )
+    tmp_path.joinpath("link").unlink()
+    tmp_path.joinpath("link").symlink_to("sp ace.py")
+    tmp_path.joinpath("sp ace.py").write_text("a\ndiff --git a/x b/x\n")
+    tmp_path.joinpath("ü.py").write_text("b\n")
+    repo.git.add("--all")
+
+    hunks = get_staged_hunks(repo)
+
+    # the type change is a removal and an addition
+    assert [(h.path, h.old_path, h.new_start) for h in hunks] == [
+        ("link", "link", 0),
+        ("link", None, 1),
+        ("sp ace.py", "sp ace.py", 2),
+        ("ü.py", "ü.py", 1),
+    ]
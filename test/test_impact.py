@@ -0,0 +1,32 @@
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.add_feature_data.backfill import backfill_facts
+from git_tool.feature_data.analyze_feature_data.impact import (
+    ImpactedFile,
+    get_impact,
+)
+
+
+def test_impact_reports_annotated_lines_and_history(repo):
+    commit_files(repo, {"a.c": "x\n// &begin[foo]\n1\n2\n// &end[foo]\ny\n"})
+    base = commit_files(repo, {"b.c": "// &begin[bar]\nb\n// &end[bar]\n"})
+    backfill_facts(repo, [base], jobs=1)
+    head = commit_files(
+        repo,
+        {
+            "a.c": "x\n// &begin[foo]\n1\nchanged\n// &end[foo]\ny\n",
+            "b.c": "// &begin[bar]\nb\n// &end[bar]\nunannotated\n",
+            "c.txt": "new\n",
+        },
+    )
+
+    impact = {
+        entry.feature: entry.files
+        for entry in get_impact(repo, f"{base}..{head}")
+    }
+
+    assert impact == {
+        "foo": [ImpactedFile("a.c", [(4, 4)], True)],
+        "bar": [ImpactedFile("b.c", [], True)],
+    }
+    without_history = get_impact(repo, f"{base}..{head}", use_history=False)
+    assert [entry.feature for entry in without_history] == ["foo"]
@@ -0,0 +1,38 @@
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.analyze_feature_data.line_attribution import (
+    blame_line_ranges,
+    get_file_attribution,
+)
+
+
+def _text(lines: list[str]) -> str:
+    return "".join(f"{line}\n" for line in lines)
+
+
+def test_changed_file_reuses_unchanged_lines(repo, tmp_path):
+    path = tmp_path.joinpath("file.txt")
+    commit_files(
+        repo, {"file.txt": _text([f"line {i}" for i in range(10)])}, "first"
+    )
+    lines = [f"line {i}" for i in range(10)]
+    lines[2:2] = ["second a", "second b"]
+    commit_files(repo, {"file.txt": _text(lines)}, "second")
+
+    objects = repo.git.count_objects()
+    get_file_attribution(repo, "file.txt")
+    # uncommitted edits: one line changed, two removed, one appended
+    lines[5] = "edited"
+    del lines[8:10]
+    lines.append("appended")
+    path.write_text(_text(lines))
+
+    attribution = get_file_attribution(repo, "file.txt")
+
+    full, _ = blame_line_ranges(repo, "file.txt")
+    assert attribution.lines == [full[n] for n in sorted(full)]
+    assert set(attribution.commits) >= {
+        line.commit for line in attribution.lines
+    }
+    assert get_file_attribution(repo, "file.txt") == attribution
+    # the contents are hashed, not written as loose objects
+    assert repo.git.count_objects() == objects
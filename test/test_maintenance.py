@@ -0,0 +1,46 @@
+import pytest
+
+from fixtures.metadata_repo import metadata_files, write_fact
+from git_tool.feature_data.models_and_context.feature_index import (
+    INDEX_FILE_NAME,
+)
+from git_tool.feature_data.models_and_context.repo_context import get_state_dir
+from git_tool.feature_data.sync_feature_data.maintenance import (
+    MAINTENANCE_KEEP_MESSAGE,
+    MAINTENANCE_LOCK_FILE_NAME,
+    MaintenanceLockedException,
+    count_objects,
+    run_maintenance,
+)
+from git_tool.feature_data.utils.file_lock import file_lock
+
+
+def test_maintenance_packs_the_metadata_branch_into_one_kept_pack(
+    repo, tmp_path
+):
+    for i in range(30):
+        write_fact(repo, f"core/{i:040x}/fact", timestamp=1700000000 + i)
+    files = metadata_files(repo)
+
+    result = run_maintenance(repo)
+    # running again replaces the dedicated pack instead of adding one
+    run_maintenance(repo)
+
+    # a commit, three trees and a blob per fact
+    assert result.packed_objects == 30 * 5
+    assert result.loose_after == 0
+    assert count_objects(repo)["packs"] == 1
+    pack_dir = tmp_path / ".git" / "objects" / "pack"
+    [keep] = pack_dir.glob("pack-*.keep")
+    assert keep.read_text() == MAINTENANCE_KEEP_MESSAGE
+    assert (pack_dir / "multi-pack-index").exists()
+    assert metadata_files(repo) == files
+    assert get_state_dir(repo).joinpath(INDEX_FILE_NAME).exists()
+    repo.git.fsck()
+    assert run_maintenance(repo, auto=True) is None
+
+
+def test_maintenance_does_not_wait_for_a_running_maintenance(repo):
+    with file_lock(get_state_dir(repo).joinpath(MAINTENANCE_LOCK_FILE_NAME)):
+        with pytest.raises(MaintenanceLockedException):
+            run_maintenance(repo)
@@ -0,0 +1,28 @@
+from fixtures.metadata_repo import write_fact
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.read_feature_data.metadata_diff import (
+    FactPath,
+    read_metadata_diff,
+)
+
+
+def test_metadata_diff_lists_added_facts(repo):
+    write_fact(repo, "core/c1/fact1")
+    old = repo.git.rev_parse(FEATURE_BRANCH_NAME)
+    write_fact(repo, "core/c2/fact2")
+    write_fact(repo, "export/c1/fact3")
+
+    diff = read_metadata_diff(repo, old)
+
+    assert diff.added == [
+        FactPath("core", "c2", "fact2"),
+        FactPath("export", "c1", "fact3"),
+    ]
+    assert diff.removed == []
+    assert read_metadata_diff(repo, None).features == {"core", "export"}
+    assert (
+        read_metadata_diff(repo, FEATURE_BRANCH_NAME, old).removed == diff.added
+    )
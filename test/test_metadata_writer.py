@@ -0,0 +1,121 @@
+import multiprocessing
+
+import pytest
+
+from fixtures.metadata_repo import metadata_files
+from git import Repo
+
+from git_tool.feature_data.add_feature_data.metadata_writer import (
+    FAILED_FILE_NAME,
+    IN_FLIGHT_FILE_NAME,
+    MetadataWriteFailedException,
+    drain_write_queue,
+    enqueue_fact_commits,
+    metadata_write_lock,
+    write_fact_commits,
+)
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+    get_state_dir,
+)
+from git_tool.feature_data.utils.fast_import_utils import (
+    AccumulatedCommitData,
+    FastImportCommitData,
+    FastImportWriter,
+)
+from git_tool.feature_data.utils.file_lock import (
+    FileLockedException,
+    file_lock,
+)
+
+
+def _fact_commit(path: str) -> AccumulatedCommitData:
+    return AccumulatedCommitData(
+        branch_name=FEATURE_BRANCH_NAME,
+        committer_name="Test User",
+        committer_email="test@example.com",
+        message=f"Generate fact {path}",
+        add_files=[FastImportCommitData(file_path=path, content=path)],
+    )
+
+
+def _writer(repo_path: str, shard: int, count: int):
+    repo = Repo(repo_path)
+    for i in range(count):
+        write_fact_commits(
+            repo, [_fact_commit(f"feature/shard{shard}-{i}/fact")]
+        )
+
+
+def test_parallel_writers_lose_no_facts(repo, tmp_path):
+    context = multiprocessing.get_context("fork")
+    writers = [
+        context.Process(target=_writer, args=(str(tmp_path), shard, 10))
+        for shard in range(4)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert all(writer.exitcode == 0 for writer in writers)
+    assert metadata_files(repo) == {
+        f"feature/shard{shard}-{i}/fact"
+        for shard in range(4)
+        for i in range(10)
+    }
+    assert len(repo.git.rev_list(FEATURE_BRANCH_NAME).splitlines()) == 40
+
+
+def test_rejected_fact_commits_are_moved_aside(repo):
+    # fast-import rejects the empty path component
+    enqueue_fact_commits(
+        repo,
+        [_fact_commit("feature/a/fact"), _fact_commit("feature//broken")],
+    )
+    write_fact_commits(repo, [_fact_commit("feature/b/fact")])
+
+    assert metadata_files(repo) == {"feature/a/fact", "feature/b/fact"}
+    state_dir = get_state_dir(repo)
+    assert not state_dir.joinpath(IN_FLIGHT_FILE_NAME).exists()
+    assert "feature//broken" in state_dir.joinpath(FAILED_FILE_NAME).read_text(
+        encoding="utf-8"
+    )
+
+    tip = repo.git.rev_parse(FEATURE_BRANCH_NAME)
+    with pytest.raises(MetadataWriteFailedException):
+        write_fact_commits(repo, [_fact_commit("feature//also-broken")])
+    assert repo.git.rev_parse(FEATURE_BRANCH_NAME) == tip
+    with metadata_write_lock(repo):
+        assert drain_write_queue(repo).tips == {}
+    assert repo.git.rev_parse(FEATURE_BRANCH_NAME) == tip
+
+
+def test_fast_import_writer_streams_commits_and_exports_marks(repo):
+    with FastImportWriter(repo, export_marks=True) as writer:
+        first = writer.add_commit(_fact_commit("feature/a/fact"))
+        second = writer.add_commit(_fact_commit("feature/b/f\u00e4ct"))
+
+    assert writer.marks[second] == repo.git.rev_parse(FEATURE_BRANCH_NAME)
+    assert writer.marks[first] == repo.git.rev_parse(f"{FEATURE_BRANCH_NAME}~1")
+    assert (
+        repo.git.show(f"{FEATURE_BRANCH_NAME}:feature/b/f\u00e4ct")
+        == "feature/b/f\u00e4ct"
+    )
+
+    tip = writer.marks[second]
+    with pytest.raises(RuntimeError):
+        with FastImportWriter(repo) as writer:
+            writer.add_commit(_fact_commit("feature/c/fact"))
+            raise RuntimeError()
+    assert repo.git.rev_parse(FEATURE_BRANCH_NAME) == tip
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_file = tmp_path.joinpath("metadata.lock")
+    with file_lock(lock_file):
+        with pytest.raises(FileLockedException):
+            with file_lock(lock_file, blocking=False):
+                pass
+    with file_lock(lock_file, blocking=False):
+        pass
@@ -0,0 +1,26 @@
+from fixtures.metadata_repo import clone_repo, write_fact
+
+from git_tool.feature_data.analyze_feature_data.multi_repo import (
+    run_multi_repository_query,
+)
+
+
+def test_results_of_all_repositories_are_merged(remote_repo, tmp_path):
+    first = clone_repo(remote_repo, tmp_path / "first")
+    second = clone_repo(remote_repo, tmp_path / "second")
+    write_fact(first, "payment/" + "1" * 40 + "/fact")
+    write_fact(first, "search/" + "2" * 40 + "/fact")
+    write_fact(second, "payment/" + "3" * 40 + "/fact")
+
+    report = run_multi_repository_query(
+        [first.working_dir, second.working_dir, str(tmp_path / "missing")],
+        "info-all",
+        jobs=2,
+    )
+
+    assert [r.result for r in report.repositories[:2]] == [
+        ["payment", "search"],
+        ["payment"],
+    ]
+    assert report.repositories[2].error is not None
+    assert report.merged == {"payment": 2, "search": 1}
@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.utils.object_names import ObjectNameResolver
+
+
+def test_resolves_names_in_one_batch_and_follows_ref_updates(repo):
+    first = commit_files(repo, {"a": "a"})
+    resolver = ObjectNameResolver(repo)
+
+    resolved = resolver.resolve_many([first[:7], "HEAD", "HEAD:a", "missing"])
+    assert resolved == {
+        first[:7]: first,
+        "HEAD": first,
+        "HEAD:a": repo.git.rev_parse("HEAD:a"),
+    }
+    assert resolver.resolve("HEAD:a", object_type="commit") is None
+    repo.git.tag("-a", "v1", "-m", "v1")
+    assert resolver.resolve_commit("v1") == first
+
+    second = commit_files(repo, {"b": "b"})
+    # the branch moved, HEAD must not come from the cache
+    assert resolver.resolve("HEAD") == second
+    assert resolver.resolve(first) == first
+    resolver.close()
+
+
+def test_ref_update_that_keeps_the_ref_directory_mtime_is_seen(repo):
+    first = commit_files(repo, {"a": "a"})
+    second = commit_files(repo, {"b": "b"})
+    repo.git.update_ref("refs/heads/moving", first)
+    resolver = ObjectNameResolver(repo)
+    assert resolver.resolve("moving") == first
+
+    heads = Path(repo.git_dir, "refs", "heads")
+    stat = heads.stat()
+    repo.git.update_ref("refs/heads/moving", second)
+    os.utime(heads, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert resolver.resolve("moving") == second
+    assert resolver.resolve(f"{first}:a") == repo.git.rev_parse(f"{first}:a")
+    resolver.close()
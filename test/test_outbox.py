@@ -0,0 +1,91 @@
+import pytest
+
+from fixtures.metadata_repo import clone_repo, metadata_files, write_fact
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data import outbox
+
+
+def _write_and_queue(repo, path: str):
+    outbox.queue_fact_for_push(repo, write_fact(repo, path))
+
+
+def test_facts_are_pushed_in_one_batch(remote_repo, tmp_path):
+    repo = clone_repo(remote_repo, tmp_path / "dev")
+    for i in range(3):
+        _write_and_queue(repo, f"feature/commit{i}/fact")
+
+    assert outbox.is_outbox_due(repo, batch_size=3)
+    assert outbox.flush_outbox(repo) == 3
+
+    assert outbox.read_outbox(repo) == []
+    assert metadata_files(remote_repo) == {
+        f"feature/commit{i}/fact" for i in range(3)
+    }
+
+
+def test_rejected_lease_rebases_fact_commits(remote_repo, tmp_path):
+    alice = clone_repo(remote_repo, tmp_path / "alice")
+    bob = clone_repo(remote_repo, tmp_path / "bob")
+
+    _write_and_queue(alice, "feature/a1/fact")
+    outbox.flush_outbox(alice)
+    # bob has never seen alice's branch and created his own root
+    _write_and_queue(bob, "feature/b1/fact")
+    _write_and_queue(bob, "feature/b2/fact")
+    _write_and_queue(alice, "feature/a2/fact")
+    outbox.flush_outbox(alice)
+
+    assert outbox.flush_outbox(bob) == 2
+
+    assert metadata_files(remote_repo) == {
+        "feature/a1/fact",
+        "feature/a2/fact",
+        "feature/b1/fact",
+        "feature/b2/fact",
+    }
+    remote_log = remote_repo.git.log(
+        "--format=%an", FEATURE_BRANCH_NAME
+    ).splitlines()
+    assert len(remote_log) == 4
+
+
+def test_fact_written_during_the_push_is_replayed(
+    remote_repo, tmp_path, monkeypatch
+):
+    alice = clone_repo(remote_repo, tmp_path / "alice")
+    bob = clone_repo(remote_repo, tmp_path / "bob")
+    _write_and_queue(alice, "feature/a1/fact")
+    outbox.flush_outbox(alice)
+    _write_and_queue(bob, "feature/b1/fact")
+
+    is_ancestor = outbox.is_ancestor
+    late_facts = ["feature/b2/fact"]
+
+    def write_during_push(repo, ancestor, descendant):
+        # a fact commit lands after the push read the local tip, so the
+        # compare-and-swap update of the rebase fails once
+        if late_facts:
+            write_fact(repo, late_facts.pop())
+        return is_ancestor(repo, ancestor, descendant)
+
+    monkeypatch.setattr(outbox, "is_ancestor", write_during_push)
+
+    assert outbox.flush_outbox(bob) == 1
+    assert metadata_files(remote_repo) == {
+        "feature/a1/fact",
+        "feature/b1/fact",
+        "feature/b2/fact",
+    }
+
+
+def test_flush_fails_while_another_push_holds_the_lock(remote_repo, tmp_path):
+    repo = clone_repo(remote_repo, tmp_path / "dev")
+    _write_and_queue(repo, "feature/a/fact")
+
+    with outbox.push_lock(repo):
+        with pytest.raises(outbox.OutboxLockedException):
+            outbox.flush_outbox(repo)
+    assert outbox.flush_outbox(repo) == 1
@@ -0,0 +1,46 @@
+from fixtures.metadata_repo import clone_repo, write_fact
+from git import Repo
+
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+from git_tool.feature_data.sync_feature_data.outbox import (
+    fetch_remote_tip,
+    flush_outbox,
+)
+from git_tool.feature_data.sync_feature_data.partial_fetch import (
+    is_partial_remote,
+    missing_blobs,
+    prefetch_fact_blobs,
+)
+
+
+def test_blobs_are_loaded_on_demand(remote_repo, tmp_path):
+    remote_repo.git.config("uploadpack.allowFilter", "true")
+    writer = clone_repo(remote_repo, tmp_path / "writer")
+    for i in range(5):
+        write_fact(writer, f"feature/{i:040d}/fact")
+    flush_outbox(writer)
+    reader = Repo.init(tmp_path / "reader")
+    reader.create_remote("origin", f"file://{remote_repo.working_dir}")
+
+    tip = fetch_remote_tip(reader, filter_spec="blob:none")
+    reader.git.branch(FEATURE_BRANCH_NAME, tip)
+    # only the metadata branch is partial, fetches of code from origin stay
+    # complete
+    assert not is_partial_remote(reader, "origin")
+    assert is_partial_remote(reader)
+
+    # structure is available without blobs
+    assert reader.git.ls_tree(
+        "-d", "--name-only", f"{FEATURE_BRANCH_NAME}:feature"
+    )
+    assert len(missing_blobs(reader, [f"{FEATURE_BRANCH_NAME}^{{tree}}"])) == 5
+
+    assert (
+        prefetch_fact_blobs(
+            reader, [f"feature/{1:040d}", f"feature/{2:040d}/fact"]
+        )
+        == 2
+    )
+    assert len(missing_blobs(reader, [f"{FEATURE_BRANCH_NAME}^{{tree}}"])) == 3
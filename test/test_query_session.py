@@ -0,0 +1,39 @@
+import json
+
+from fixtures.git_test_repo import commit_files
+from git_tool.feature_data.add_feature_data.backfill import backfill_facts
+from git_tool.feature_data.read_feature_data.query_session import (
+    QuerySession,
+    serve_queries,
+)
+
+
+def test_batch_queries_answer_every_line_in_order(repo):
+    commit = commit_files(
+        repo, {"a.c": "// &begin[foo]\nx\n// &end[foo]\n"}, "add a"
+    )
+    backfill_facts(repo, ["HEAD"], jobs=1)
+
+    requests = [
+        {"id": 1, "type": "features-of-commit", "commit": "HEAD"},
+        {"id": 2, "type": "commits-of-feature", "feature": "foo"},
+        {"id": 3, "type": "features-of-path", "path": "a.c"},
+        {"id": 4, "type": "name-to-uuid", "name": "foo"},
+        {"id": 5, "type": "features-of-commit", "commit": "unknown"},
+        {"id": 6, "type": "features-of-path"},
+    ]
+    answers = []
+    serve_queries(
+        QuerySession(repo),
+        [json.dumps(request) for request in requests] + ["", "not json"],
+        lambda line: answers.append(json.loads(line)),
+    )
+
+    assert answers[:4] == [
+        {"id": 1, "result": ["foo"]},
+        {"id": 2, "result": [commit]},
+        {"id": 3, "result": ["foo"]},
+        {"id": 4, "result": "foo"},
+    ]
+    assert [answer["id"] for answer in answers[4:]] == [5, 6, None]
+    assert all("error" in answer for answer in answers[4:])
@@ -0,0 +1,77 @@
+from datetime import timedelta
+from pathlib import Path
+
+from git import Repo
+
+from fixtures.git_test_repo import init_repo
+from fixtures.metadata_repo import clone_repo, write_fact
+from git_tool.feature_data.models_and_context import repo_context
+from git_tool.feature_data.models_and_context.repo_context import (
+    FEATURE_BRANCH_NAME,
+)
+
+
+def test_refresh_state_is_stored_per_repository(tmp_path):
+    first = init_repo(tmp_path / "first")
+    second = init_repo(tmp_path / "second")
+
+    repo_context.refresh_feature_branch(first, mode="sync")
+
+    assert repo_context.FEATURE_BRANCH_NAME in first.heads
+    assert not repo_context.is_metadata_stale(first, timedelta(minutes=5))
+    assert repo_context.is_metadata_stale(second, timedelta(minutes=5))
+    assert repo_context.get_state_dir(first).is_relative_to(first.git_dir)
+
+
+def test_never_mode_does_not_touch_refresh_state(tmp_path):
+    repo = init_repo(tmp_path / "offline")
+
+    repo_context.refresh_feature_branch(repo, mode="never")
+
+    assert repo_context.FEATURE_BRANCH_NAME in repo.heads
+    assert repo_context.get_last_execution_time(repo) is None
+
+
+def test_background_refresh_returns_before_fetch_finishes(tmp_path):
+    remote = Repo.init(tmp_path / "remote.git", bare=True)
+    repo = init_repo(tmp_path / "local")
+    repo.create_remote("origin", remote.working_dir)
+
+    repo_context.refresh_feature_branch(repo, mode="background")
+
+    assert repo_context.get_last_execution_time(repo) is not None
+
+
+def test_background_fetch_fast_forwards_only_behind_branches(tmp_path):
+    remote = Repo.init(tmp_path / "remote.git", bare=True)
+    writer = clone_repo(remote, tmp_path / "writer")
+    write_fact(writer, "feature/first")
+    writer.git.push("origin", FEATURE_BRANCH_NAME)
+    reader = clone_repo(remote, tmp_path / "reader")
+    reader.git.branch(FEATURE_BRANCH_NAME, f"origin/{FEATURE_BRANCH_NAME}")
+    pushed = write_fact(writer, "feature/second")
+    writer.git.push("origin", FEATURE_BRANCH_NAME)
+
+    repo_context.fetch_feature_branch_in_background(reader).wait()
+    assert reader.git.rev_parse(FEATURE_BRANCH_NAME) == pushed
+
+    # local facts that are not pushed yet are kept
+    local = write_fact(reader, "feature/local")
+    write_fact(writer, "feature/third")
+    writer.git.push("origin", FEATURE_BRANCH_NAME)
+    repo_context.fetch_feature_branch_in_background(reader).wait()
+    assert reader.git.rev_parse(FEATURE_BRANCH_NAME) == local
+
+
+def test_metadata_remote_config_is_written_once(tmp_path):
+    remote = Repo.init(tmp_path / "remote.git", bare=True)
+    repo = init_repo(tmp_path / "local")
+    repo.create_remote("origin", remote.working_dir)
+    config_file = Path(repo.git_dir, "config")
+
+    repo_context.metadata_fetch_args(repo, filter_spec="blob:none")
+    written = config_file.stat()
+    repo_context.metadata_fetch_args(repo, filter_spec="blob:none")
+
+    assert config_file.stat().st_ino == written.st_ino
+    assert config_file.stat().st_mtime_ns == written.st_mtime_ns